@@ -0,0 +1,185 @@
+# benchmarks/run.py
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+
+# Запуск как скрипта: python benchmarks/run.py
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from benchmarks.synthetic import SyntheticMarket, FakeExchange
+from detectors.brush_detector import check_brush_pattern, find_local_extrema, BRUSH_LOOKBACK_CANDLES
+from detectors.ladder_detector import check_ladder_pattern
+from detectors.registry import detector_registry
+from utils.candle_buffer import CandleBufferStore
+from utils.candle_store import CandleStore
+from utils.fetch_scheduler import FetchScheduler
+from utils.pattern_store import PatternStore
+
+# --- НАСТРОЙКИ БЕНЧМАРКОВ ---
+BENCH_SIZES = (10, 500, 5000)     # Количество символов
+BENCH_REPEAT = 5                  # Повторов каждого замера (в отчет идут min/median)
+BENCH_SEED = 42
+BENCH_REGRESSION_THRESHOLD = 0.10 # Медиана медленнее базовой больше чем на 10% - регрессия
+BENCH_OUTPUT_JSON = 'benchmark_results.json'
+# -----------------------------
+
+def measure(func, repeat: int, setup=None) -> dict:
+    """Выполняет func() repeat раз (setup() - перед каждым запуском, вне замера). Время в секундах."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None: setup()
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return {'min': min(times), 'median': statistics.median(times), 'mean': statistics.fmean(times), 'repeat': repeat}
+
+def bench_detectors(market: SyntheticMarket, repeat: int) -> dict:
+    """Скалярные детекторы и поиск экстремумов по каждому символу (как в старом цикле сканирования)."""
+    frames = list(market.frames(main.CANDLES_TO_FETCH).values())
+    closes = [np.asarray(frame.close[-BRUSH_LOOKBACK_CANDLES:]) for frame in frames]
+    return {
+        'check_brush_pattern': measure(lambda: [check_brush_pattern(f) for f in frames], repeat),
+        'check_ladder_pattern': measure(lambda: [check_ladder_pattern(f) for f in frames], repeat),
+        'find_local_extrema': measure(lambda: [find_local_extrema(c) for c in closes], repeat),
+    }
+
+def bench_store(market: SyntheticMarket, repeat: int, workdir: str) -> dict:
+    """
+    Запись в историю паттернов: по одной записи на символ (записи взяты из реальных срабатываний).
+    add - время, которое цикл сканирования тратит на постановку в очередь; add_flush - вместе с записью на диск.
+    """
+    detection_time = datetime.now(timezone.utc)
+    entries = []
+    for symbol, frame in market.frames(main.CANDLES_TO_FETCH).items():
+        brush_entry, ladder_entry = main.pattern_entries(symbol, detector_registry.run(symbol, frame), detection_time)
+        if brush_entry: entries.append(brush_entry)
+    if not entries:
+        return {}
+    entries = [dict(entries[i % len(entries)]) for i in range(len(market.symbols))]
+    store = PatternStore(os.path.join(workdir, 'patterns.db'), flush_seconds=0.01)
+
+    def add_flush():
+        store.add('brush', entries)
+        store.flush()
+    try:
+        return {'pattern_store_add': measure(lambda: store.add('brush', entries), repeat, store.flush),
+                'pattern_store_add_flush': measure(add_flush, repeat)}
+    finally:
+        store.close()
+
+def bench_scan_cycle(market: SyntheticMarket, repeat: int, workdir: str) -> dict:
+    """
+    Полный run_one_scan_cycle против FakeExchange: холодный цикл (полная загрузка свечей)
+    и теплый (после закрытия новой свечи - только догрузка). Лимиты планировщика сняты,
+    хранилище свечей - во временной папке.
+    """
+    exchange = FakeExchange(market)
+    main.ohlcv_scheduler = FetchScheduler(weight_per_second=1e9, burst_weight=1e9)
+    main.resampled_buffers = {}
+    symbols = market.symbols
+
+    def cold_setup():
+        exchange.now = market.now_ms
+        main.candle_buffers = CandleBufferStore(main.CANDLES_TO_FETCH)
+        main.candle_store = CandleStore(tempfile.mkdtemp(dir=workdir))
+
+    def run_cycle():
+        with contextlib.redirect_stdout(io.StringIO()): # Логи цикла в отчет бенчмарка не нужны
+            asyncio.run(main.run_one_scan_cycle(symbols, exchange=exchange))
+
+    cold = measure(run_cycle, repeat, cold_setup)
+    # Теплые циклы идут подряд по одним и тем же буферам, каждый раз закрывается новая свеча
+    cold_setup()
+    run_cycle()
+    repeat = min(repeat, market.future)
+    warm = measure(run_cycle, repeat, lambda: exchange.advance())
+    return {'run_one_scan_cycle_cold': cold, 'run_one_scan_cycle_warm': warm}
+
+def run_benchmarks(sizes=BENCH_SIZES, repeat: int = BENCH_REPEAT, seed: int = BENCH_SEED, only: list = None) -> dict:
+    """Все замеры по размерам вселенной. Ключи результатов - 'имя[символов]'."""
+    results = {}
+    groups = {'detectors': bench_detectors, 'store': bench_store, 'scan_cycle': bench_scan_cycle}
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            for size in sizes:
+                market = SyntheticMarket(size, history=main.CANDLES_TO_FETCH + 50, seed=seed)
+                for group, bench in groups.items():
+                    if only and group not in only: continue
+                    stats = bench(market, repeat) if group == 'detectors' else bench(market, repeat, workdir)
+                    for name, values in stats.items():
+                        values['symbols'] = size
+                        values['per_symbol_us'] = values['median'] / size * 1e6
+                        results[f"{name}[{size}]"] = values
+                        print(f"{name}[{size}]: медиана {values['median'] * 1000:.2f} мс, "
+                              f"{values['per_symbol_us']:.1f} мкс/символ")
+        finally:
+            main.detection_executor.shutdown()
+    return {'meta': environment(seed, repeat), 'results': results}
+
+def environment(seed: int, repeat: int) -> dict:
+    """Окружение запуска - чтобы сравнивать результаты только с сопоставимой базой."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {'created_utc': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'), 'commit': commit,
+            'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'seed': seed, 'repeat': repeat}
+
+def compare(current: dict, baseline: dict, threshold: float = BENCH_REGRESSION_THRESHOLD) -> list:
+    """Сравнивает медианы с базовым прогоном. Возвращает имена замеров, ставших медленнее порога."""
+    regressions = []
+    print(f"\nСравнение с базой (коммит {baseline.get('meta', {}).get('commit')}):")
+    for name, values in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            print(f"  {name}: нет в базе")
+            continue
+        ratio = values['median'] / base['median'] if base['median'] else float('inf')
+        mark = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            mark = '  <-- РЕГРЕССИЯ'
+        print(f"  {name}: {base['median'] * 1000:.2f} -> {values['median'] * 1000:.2f} мс (x{ratio:.2f}){mark}")
+    return regressions
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Бенчмарки детекторов, записи истории паттернов и цикла сканирования.")
+    parser.add_argument('--sizes', default=','.join(map(str, BENCH_SIZES)), help="Размеры вселенной через запятую")
+    parser.add_argument('--repeat', type=int, default=BENCH_REPEAT)
+    parser.add_argument('--seed', type=int, default=BENCH_SEED)
+    parser.add_argument('--only', default='', help="Группы через запятую: detectors, store, scan_cycle")
+    parser.add_argument('--output', default=BENCH_OUTPUT_JSON, help="Куда сохранить результаты (JSON)")
+    parser.add_argument('--baseline', default='', help="JSON прошлого прогона для сравнения")
+    parser.add_argument('--threshold', type=float, default=BENCH_REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    only = [g.strip() for g in args.only.split(',') if g.strip()] or None
+    current = run_benchmarks(sizes, args.repeat, args.seed, only)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(current, f, indent=2)
+    print(f"Результаты сохранены в {args.output}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(current, json.load(f), args.threshold)
+        if regressions:
+            print(f"Регрессии: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main_cli()
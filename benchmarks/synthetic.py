@@ -0,0 +1,156 @@
+# benchmarks/synthetic.py
+import asyncio
+import numpy as np
+
+from utils.candle_frame import CandleFrame
+
+# --- НАСТРОЙКИ ГЕНЕРАТОРА ---
+SYNTHETIC_START_MS = 1_700_000_000_000 # Начало истории (UTC, кратно минуте)
+SYNTHETIC_BRUSH_SHARE = 0.10   # Доля символов с "ёршиком" в конце истории
+SYNTHETIC_LADDER_SHARE = 0.05  # Доля символов с "лесенкой" в конце истории
+SYNTHETIC_GAP_SHARE = 0.05     # Доля символов с пропусками свечей
+SYNTHETIC_GAP_PROBABILITY = 0.01 # Вероятность пропуска отдельной свечи у таких символов
+SYNTHETIC_NOISE = 0.002        # Шум цены (стандартное отклонение доходности за свечу)
+# -----------------------------
+
+class SyntheticMarket:
+    """
+    Детерминированный генератор свечей: одинаковые seed и параметры дают побитово те же свечи
+    независимо от порядка запросов (у каждого символа свой генератор от (seed, номер символа)).
+    В конец истории символа можно "посадить" ёршик или лесенку, часть символов получает пропуски свечей.
+    history - свечей до текущего момента, future - свечей "в будущем" для имитации новых свечей.
+    """
+
+    def __init__(self, n_symbols: int, history: int = 500, future: int = 50, seed: int = 42,
+                 timeframe_ms: int = 60 * 1000, brush_share: float = SYNTHETIC_BRUSH_SHARE,
+                 ladder_share: float = SYNTHETIC_LADDER_SHARE, gap_share: float = SYNTHETIC_GAP_SHARE,
+                 noise: float = SYNTHETIC_NOISE):
+        self.history = history
+        self.future = future
+        self.seed = seed
+        self.timeframe_ms = timeframe_ms
+        self.noise = noise
+        self.symbols = [f"SYN{i:05d}/USDT" for i in range(n_symbols)]
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        # Вид символа тоже детерминирован: первые доли - паттерны, остальные - случайное блуждание
+        kinds_rng = np.random.default_rng([seed, n_symbols])
+        order = kinds_rng.permutation(n_symbols)
+        n_brush, n_ladder = int(n_symbols * brush_share), int(n_symbols * ladder_share)
+        self.kinds = {}
+        for rank, i in enumerate(order):
+            self.kinds[self.symbols[i]] = 'brush' if rank < n_brush else 'ladder' if rank < n_brush + n_ladder else 'walk'
+        self.gapped = {self.symbols[i] for i in kinds_rng.permutation(n_symbols)[:int(n_symbols * gap_share)]}
+        self._frames = {}
+
+    @property
+    def now_ms(self) -> int:
+        """Момент "сейчас": идет последняя свеча истории."""
+        return SYNTHETIC_START_MS + (self.history - 1) * self.timeframe_ms + 1
+
+    def frame(self, symbol: str) -> CandleFrame:
+        """Все свечи символа (история + будущее). Генерируются при первом запросе и кэшируются."""
+        frame = self._frames.get(symbol)
+        if frame is None:
+            frame = self._frames[symbol] = self._generate(self._index[symbol], self.kinds[symbol], symbol in self.gapped)
+        return frame
+
+    def frames(self, n_candles: int = None) -> dict:
+        """{символ: последние n_candles свечей истории} - готовые входы для детекторов."""
+        result = {}
+        for symbol in self.symbols:
+            frame = self.frame(symbol)
+            frame = frame[frame.timestamp < self.now_ms]
+            result[symbol] = frame.tail(n_candles) if n_candles else frame
+        return result
+
+    def _generate(self, index: int, kind: str, gapped: bool) -> CandleFrame:
+        rng = np.random.default_rng([self.seed, index])
+        n = self.history + self.future
+        base = 10 ** rng.uniform(-4, 2)
+        returns = rng.normal(0, self.noise, n)
+        close = base * np.exp(np.cumsum(returns))
+        end = self.history # Паттерн заканчивается на последней закрытой свече истории
+        if kind == 'brush':
+            close[:end] = plant_brush(rng, close[end - 150], 150, close[:end])
+        elif kind == 'ladder':
+            close[:end] = plant_ladder(rng, close[end - 80], 80, close[:end])
+        if end < n:
+            # Будущее продолжает цену с конца истории
+            close[end:] = close[end - 1] * np.exp(np.cumsum(returns[end:]))
+        open_ = np.empty(n)
+        open_[0] = close[0]
+        open_[1:] = close[:-1]
+        wick = np.abs(rng.normal(0, self.noise / 2, (2, n)))
+        high = np.maximum(open_, close) * (1 + wick[0])
+        low = np.minimum(open_, close) * (1 - wick[1])
+        if kind == 'ladder':
+            # У свечи падения low = цена после падения (фитиль вниз не добавляем, иначе ratio "плывет")
+            drop = end - 1
+            low[drop] = close[drop]
+        timestamps = SYNTHETIC_START_MS + np.arange(n, dtype=np.int64) * self.timeframe_ms
+        volume = rng.lognormal(3, 1, n)
+        frame = CandleFrame(timestamps, open_, high, low, close, volume)
+        if gapped:
+            keep = rng.random(n) >= SYNTHETIC_GAP_PROBABILITY
+            keep[-1] = True
+            frame = frame[keep]
+        return frame
+
+def plant_brush(rng, level: float, length: int, close: np.ndarray, amplitude: float = 0.004) -> np.ndarray:
+    """Последние length свечей - частые колебания вокруг плоской средней (ёршик)."""
+    close = close.copy()
+    t = np.arange(length)
+    period = rng.uniform(4, 10)
+    swing = amplitude * np.sin(2 * np.pi * t / period + rng.uniform(0, np.pi))
+    close[-length:] = level * (1 + swing + rng.normal(0, amplitude / 10, length))
+    return close
+
+def plant_ladder(rng, level: float, length: int, close: np.ndarray, rise_candles: int = 30,
+                 step: float = 0.002) -> np.ndarray:
+    """
+    Последние length свечей: полка, ровный рост rise_candles свечей (в основном зеленые свечи)
+    и последняя свеча - падение примерно на величину роста (лесенка).
+    """
+    close = close.copy()
+    flat = length - rise_candles - 1
+    # Полка слегка снижается, чтобы долина была прямо перед ростом
+    shelf = level * (1 - step / 4 * np.arange(flat) + rng.normal(0, step / 10, flat))
+    moves = np.where(rng.random(rise_candles) < 0.85, step, -step / 3)
+    moves[-1] = step # Пик - последняя свеча роста, за ней сразу падение
+    rise = shelf[-1] * np.exp(np.cumsum(moves))
+    peak, valley = rise.max(), min(shelf.min(), rise.min())
+    drop = peak * (1 - (peak - valley) / valley * rng.uniform(0.8, 1.2))
+    close[-length:] = np.concatenate((shelf, rise, [drop]))
+    return close
+
+class FakeExchange:
+    """
+    Заменитель ccxt-биржи для бенчмарков цикла сканирования: отдает свечи SyntheticMarket
+    по виртуальному времени (advance() "закрывает" следующую свечу). latency - задержка ответа (сек).
+    Реализует только то, что использует цикл: fetch_ohlcv и milliseconds.
+    """
+
+    def __init__(self, market: SyntheticMarket, latency: float = 0.0):
+        self.market = market
+        self.latency = latency
+        self.now = market.now_ms
+        self.requests = 0
+
+    def milliseconds(self) -> int:
+        return self.now
+
+    def advance(self, candles: int = 1):
+        self.now += candles * self.market.timeframe_ms
+
+    async def fetch_ohlcv(self, symbol: str, timeframe: str = '1m', since: int = None, limit: int = None, params=None):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        frame = self.market.frame(symbol)
+        frame = frame[frame.timestamp < self.now] # Последняя свеча еще формируется, как на бирже
+        if since is not None:
+            frame = frame[frame.timestamp >= since]
+            if limit: frame = frame[:limit]
+        elif limit:
+            frame = frame.tail(limit)
+        return frame.to_ohlcv()
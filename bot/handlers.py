@@ -1,12 +1,12 @@
 import asyncio
 from aiogram import Router, F, Bot
-from aiogram.types import Message, FSInputFile # Добавляем FSInputFile обратно
-from aiogram.filters import CommandStart, StateFilter
+from aiogram.types import Message, BufferedInputFile # PNG графика отправляется из памяти
+from aiogram.filters import CommandStart, Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 # Импорты функций и констант
-import sys, os, csv, datetime, pathlib, traceback, tempfile
+import sys, os, csv, datetime, pathlib, logging, tempfile
 from datetime import timezone, timedelta # Уточним импорт timedelta
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -14,13 +14,16 @@ if project_root not in sys.path: sys.path.insert(0, project_root)
 
 try:
     from utils.find_tokens import find_and_filter_symbols, OUTPUT_CSV_FILE as ALL_SYMBOLS_CSV # CSV со всеми отфильтрованными
-    from utils.chart_generator import generate_mexc_chart_image, CHART_TIMEFRAME as GENERATED_CHART_TIMEFRAME # Берем ТФ из генератора
-    from main import run_one_scan_cycle # Импортируем новую функцию сканера
+    from utils.chart_generator import generate_mexc_chart_image, generate_chart_images, CHART_TIMEFRAME as GENERATED_CHART_TIMEFRAME, CHART_CANDLES_LIMIT # Берем ТФ из генератора
+    from main import run_one_scan_cycle, candle_snapshot, filter_new_patterns # Сканер, свечи из его буферов, кулдаун оповещений
+    from utils.metrics import metrics, TELEGRAM_SEND_SECONDS, record_error # Метрики конвейера
 except ImportError as e:
     print(f"Ошибка импорта в bot/handlers.py: {e}"); exit(1)
 
 from .keyboards import get_main_keyboard
 
+logger = logging.getLogger(__name__)
+
 # Создаем Router
 router = Router()
 
@@ -37,7 +40,7 @@ def create_temp_csv(data: list, base_filename: str) -> str | None:
         # Создаем временный файл
         temp_file = tempfile.NamedTemporaryFile(mode='w', suffix=".csv", delete=False, encoding='utf-8', newline='')
         filename = temp_file.name
-        print(f"Создание временного CSV: {filename}")
+        logger.info("Создание временного CSV: %s", filename)
 
         fieldnames = list(data[0].keys())
         writer = csv.DictWriter(temp_file, fieldnames=fieldnames, extrasaction='ignore')
@@ -46,7 +49,7 @@ def create_temp_csv(data: list, base_filename: str) -> str | None:
         temp_file.close() # Закрываем файл, чтобы он сохранился
         return filename
     except Exception as e:
-        print(f"Ошибка создания временного CSV {base_filename}: {e}")
+        logger.error("Ошибка создания временного CSV %s: %s", base_filename, e)
         if 'temp_file' in locals() and not temp_file.closed: temp_file.close()
         return None
 # ----------------------------------------------------
@@ -61,7 +64,7 @@ async def handle_start(message: Message):
 @router.message(F.text == "🔎 Запустить сканирование")
 async def handle_scan_request(message: Message, bot: Bot):
     user_id = message.from_user.id
-    print(f"[{user_id}] Получен запрос на ЗАПУСК СКАНИРОВАНИЯ")
+    logger.info("[%s] Получен запрос на ЗАПУСК СКАНИРОВАНИЯ", user_id)
     processing_message = await message.answer("⏳ Начинаю поиск и фильтрацию токенов...")
 
     try:
@@ -76,6 +79,10 @@ async def handle_scan_request(message: Message, bot: Bot):
 
         # 2. Запускаем ОДИН цикл анализа паттернов
         brush_results, ladder_results = await run_one_scan_cycle(symbols_to_scan)
+        # Повторы в пределах кулдауна этого чата не рисуются и не отправляются
+        found_count = len(brush_results) + len(ladder_results)
+        brush_results, ladder_results = await filter_new_patterns(brush_results, ladder_results, scope=message.chat.id)
+        repeated_count = found_count - len(brush_results) - len(ladder_results)
 
         # 3. Собираем уникальные символы с найденными паттернами
         found_symbols_details = {} # Словарь: {'SYMBOL': 'Тип Паттерна'}
@@ -89,29 +96,31 @@ async def handle_scan_request(message: Message, bot: Bot):
             sorted_symbols = sorted(list(found_symbols_details.keys()))
             await bot.edit_message_text(f"✅ Сканирование завершено. Найдено паттернов: {len(sorted_symbols)}. Генерирую графики...", chat_id=message.chat.id, message_id=processing_message.message_id)
 
+            # Все графики рисуются одной пачкой параллельно; свечи уже загружены сканером - без повторных запросов к бирже
+            logger.info("[%s] Генерация %d графиков...", user_id, len(sorted_symbols))
+            charts = await generate_chart_images(
+                [(symbol, candle_snapshot(symbol, GENERATED_CHART_TIMEFRAME, CHART_CANDLES_LIMIT)) for symbol in sorted_symbols])
+
             sent_count = 0
-            for symbol in sorted_symbols:
+            for symbol, png in zip(sorted_symbols, charts):
                 pattern_type = found_symbols_details[symbol]
-                print(f"[{user_id}] Генерация графика для {symbol} ({pattern_type})...")
-                filepath = await generate_mexc_chart_image(symbol) # Используем символ с '/'
-                if filepath and os.path.exists(filepath):
+                if png:
                     try:
-                        chart_image = FSInputFile(filepath)
-                        await message.answer_photo(chart_image, caption=f"{symbol} - Найден паттерн: {pattern_type} (ТФ: {GENERATED_CHART_TIMEFRAME})")
+                        chart_image = BufferedInputFile(png, filename=f"{symbol.replace('/', '_')}.png")
+                        with TELEGRAM_SEND_SECONDS.time():
+                            await message.answer_photo(chart_image, caption=f"{symbol} - Найден паттерн: {pattern_type} (ТФ: {GENERATED_CHART_TIMEFRAME})")
                         sent_count += 1
                     except Exception as e_send:
-                        print(f"Ошибка отправки графика {filepath}: {e_send}")
+                        record_error('telegram', e_send)
+                        logger.error("Ошибка отправки графика %s: %s", symbol, e_send)
                         await message.answer(f"Не удалось отправить график для {symbol}")
-                    finally:
-                        # Удаляем временный файл в любом случае (если он был создан)
-                        try: os.remove(filepath)
-                        except OSError as e_del: print(f"Не удалось удалить файл графика {filepath}: {e_del}")
                 else:
-                    print(f"Не удалось сгенерировать график для {symbol}")
+                    logger.warning("Не удалось сгенерировать график для %s", symbol)
                     await message.answer(f"Не удалось сгенерировать график для {symbol}")
                 await asyncio.sleep(1) # Небольшая пауза между отправками, чтобы не попасть под лимиты
 
             final_message = f"📊 Отправлено {sent_count} из {len(sorted_symbols)} графиков."
+            if repeated_count: final_message += f" Повторов в пределах кулдауна: {repeated_count}."
             # Удаляем сообщение "Генерирую графики..."
             try: await bot.delete_message(chat_id=message.chat.id, message_id=processing_message.message_id)
             except: pass
@@ -119,7 +128,9 @@ async def handle_scan_request(message: Message, bot: Bot):
             await message.answer(final_message, reply_markup=get_main_keyboard())
 
         else:
-            await bot.edit_message_text("ℹ️ Сканирование завершено. Активных паттернов не найдено.", chat_id=message.chat.id, message_id=processing_message.message_id)
+            no_patterns_text = (f"ℹ️ Сканирование завершено. Новых паттернов нет (повторов в пределах кулдауна: {repeated_count})."
+                                if repeated_count else "ℹ️ Сканирование завершено. Активных паттернов не найдено.")
+            await bot.edit_message_text(no_patterns_text, chat_id=message.chat.id, message_id=processing_message.message_id)
             # Возвращаем клавиатуру
             await message.answer("Используйте кнопки для новых команд.", reply_markup=get_main_keyboard())
 
@@ -133,12 +144,11 @@ async def handle_scan_request(message: Message, bot: Bot):
         # --------------------------------------------
 
     except Exception as e:
-        print(f"Ошибка при выполнении сканирования по запросу: {e}")
+        logger.exception("Ошибка при выполнении сканирования по запросу: %s", e)
         try: # Пытаемся отредактировать сообщение об ошибке
              await bot.edit_message_text("❌ Произошла ошибка во время сканирования.", chat_id=message.chat.id, message_id=processing_message.message_id)
         except: # Если не удалось отредактировать, просто отправляем новое
             await message.answer("❌ Произошла ошибка во время сканирования.")
-        traceback.print_exc()
 
 
 # -----------------------------
@@ -153,7 +163,7 @@ async def handle_screenshot_request(message: Message, state: FSMContext):
 async def handle_symbol_for_screenshot(message: Message, state: FSMContext, bot: Bot):
     symbol = message.text.strip().upper()
     user_id = message.from_user.id
-    print(f"Получен символ '{symbol}' для генерации ГРАФИКА от пользователя {user_id}")
+    logger.info("Получен символ '%s' для генерации ГРАФИКА от пользователя %s", symbol, user_id)
 
     if '/' not in symbol or len(symbol.split('/')) != 2:
         await message.answer("Неверный формат. Введите 'BASE/QUOTE':")
@@ -164,32 +174,36 @@ async def handle_symbol_for_screenshot(message: Message, state: FSMContext, bot:
     processing_message = await message.answer(f"⏳ Генерирую график для {symbol}...")
 
     try:
-        # Вызываем новую функцию генерации графика
-        filepath = await generate_mexc_chart_image(symbol)
-
-        if filepath and os.path.exists(filepath):
-            print(f"Отправка графика {filepath} пользователю {user_id}")
-            chart_image = FSInputFile(filepath)
-            await message.answer_photo(chart_image, caption=f"График {symbol} ({GENERATED_CHART_TIMEFRAME})")
-            # Удаляем временный файл после отправки
-            try: os.remove(filepath)
-            except OSError as e_del: print(f"Не удалось удалить временный файл графика {filepath}: {e_del}")
+        # Если символ недавно сканировался - берем свечи из буфера сканера, иначе генератор запросит их с биржи
+        candles = candle_snapshot(symbol, GENERATED_CHART_TIMEFRAME, CHART_CANDLES_LIMIT)
+        png = await generate_mexc_chart_image(symbol, candles)
+
+        if png:
+            logger.info("Отправка графика %s пользователю %s", symbol, user_id)
+            chart_image = BufferedInputFile(png, filename=f"{symbol.replace('/', '_')}.png")
+            with TELEGRAM_SEND_SECONDS.time():
+                await message.answer_photo(chart_image, caption=f"График {symbol} ({GENERATED_CHART_TIMEFRAME})")
         else:
-            print(f"Функция generate_mexc_chart_image не вернула путь или файл не найден для {symbol}.")
+            logger.warning("Функция generate_mexc_chart_image не вернула график для %s.", symbol)
             await message.answer(f"❌ Не удалось сгенерировать график для {symbol}.")
 
         # Удаляем сообщение "Генерирую график..."
         await bot.delete_message(chat_id=message.chat.id, message_id=processing_message.message_id)
 
     except Exception as e:
-        print(f"Ошибка при вызове generate_mexc_chart_image для {symbol}: {e}")
+        logger.exception("Ошибка при вызове generate_mexc_chart_image для %s: %s", symbol, e)
         await message.answer(f"❌ Ошибка при генерации графика для {symbol}.")
         if processing_message: # Удаляем сообщение о процессе, если оно еще есть
              try: await bot.delete_message(chat_id=message.chat.id, message_id=processing_message.message_id)
              except: pass # Игнорируем ошибки удаления
-        traceback.print_exc()
 
 
+# --- Сводка метрик конвейера ---
+@router.message(Command("metrics"))
+@router.message(F.text == "📊 Метрики")
+async def handle_metrics_request(message: Message):
+    await message.answer(metrics.summary(), parse_mode=None, reply_markup=get_main_keyboard())
+
 # --- Обработчик неизвестного текста (без изменений) ---
 @router.message(F.text)
 async def handle_unknown_text(message: Message):
@@ -5,6 +5,7 @@ def get_main_keyboard() -> ReplyKeyboardMarkup:
         keyboard=[
             [KeyboardButton(text="🔎 Запустить сканирование")], # <-- Надпись
             [KeyboardButton(text="📈 Получить график")],
+            [KeyboardButton(text="📊 Метрики")],
         ],
         resize_keyboard=True,
         one_time_keyboard=False
@@ -11,6 +11,11 @@ dotenv.load_dotenv()
 
 # Импортируем router из handlers
 from bot.handlers import router as main_router
+from utils.exchange_pool import close_exchange
+from main import detection_executor # Пул процессов детекции сканера
+from utils.metrics import start_metrics_server # Эндпоинт /metrics для Prometheus
+from utils.log import setup_logging
+from utils.chart_renderer import chart_renderer # Пул процессов отрисовки графиков
 
 # --- НАСТРОЙКИ БОТА ---
 # Лучше вынести токен в переменные окружения или config файл
@@ -19,7 +24,7 @@ BOT_TOKEN = os.getenv("BOT_TOKEN") # !!! ЗАМЕНИТЕ НА СВОЙ ТОКЕ
 
 async def main():
     """Основная функция запуска бота."""
-    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    setup_logging() # Неблокирующий вывод: запись через очередь, форматирование в фоновом потоке
     logger = logging.getLogger(__name__)
     logger.info("Запуск Telegram бота...")
 
@@ -38,6 +43,9 @@ async def main():
     dp = Dispatcher(storage=storage)
 
     dp.include_router(main_router)
+    metrics_server = await start_metrics_server()
+    # Воркеры отрисовки поднимаются в фоне, пока бот подключается к Telegram
+    warm_up_task = asyncio.create_task(chart_renderer.warm_up())
 
     try:
         await bot.delete_webhook(drop_pending_updates=True)
@@ -46,12 +54,17 @@ async def main():
     finally:
         logger.info("Остановка бота...")
         await bot.session.close()
+        if metrics_server is not None: await metrics_server.cleanup()
+        warm_up_task.cancel()
+        detection_executor.shutdown() # Останавливаем процессы детекции
+        chart_renderer.shutdown() # Останавливаем процессы отрисовки графиков
+        await close_exchange() # Закрываем общий пул соединений с MEXC
         logger.info("Бот остановлен.")
 
 if __name__ == '__main__':
     try:
         asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
-        logging.info("Завершение работы бота по команде пользователя.")
+        logging.getLogger(__name__).info("Завершение работы бота по команде пользователя.")
     except Exception as e:
-         logging.critical(f"Критическая ошибка при запуске бота: {e}", exc_info=True)
\ No newline at end of file
+         logging.getLogger(__name__).critical("Критическая ошибка при запуске бота: %s", e, exc_info=True)
\ No newline at end of file
@@ -1,8 +1,10 @@
 # detectors/brush_detector.py
+import logging
 import numpy as np
-import traceback
 from datetime import timedelta
 
+from detectors.features import FeatureCache, feature, rolling_sma
+
 # --- НАСТРОЙКИ ПАТТЕРНА "ЁРШИК" ---
 BRUSH_LOOKBACK_CANDLES = 120 # N: Анализируем последние 2 часа (120 мин)
 BRUSH_SMA_PERIOD = 20      # P: Период для расчета SMA
@@ -10,14 +12,16 @@ BRUSH_MIN_DEVIATION_PERCENT = 0.1 # X: Минимальное откл. от SMA
 BRUSH_MIN_CROSSINGS = 5      # C: Минимальное кол-во пересечений SMA
 
 # --- НОВЫЕ НАСТРОЙКИ ---
-# Макс. время между соседними локальными пиком и впадиной (в минутах)
-MAX_ZIGZAG_DURATION_MINUTES = 20
+# Макс. расстояние между соседними локальными пиком и впадиной (в свечах; на 1m - минуты)
+MAX_ZIGZAG_DURATION_CANDLES = 20
 # Макс. стандартное отклонение SMA в % от среднего значения SMA (показатель "плоскости")
 SMA_MAX_STD_DEV_PERCENT = 0.15 # Например, не более 0.15% волатильности у SMA
-# Максимально допустимый разрыв между таймстемпами соседних свечей (в минутах)
-MAX_ALLOWED_GAP_MINUTES = 1.5 # Допускаем пропуск не более ~1 минуты
+# Максимально допустимый разрыв между таймстемпами соседних свечей (в свечах таймфрейма)
+MAX_ALLOWED_GAP_CANDLES = 1.5 # Шаг больше полутора свечей - значит, как минимум одна свеча пропущена
 # ---------------------------
 
+logger = logging.getLogger(__name__)
+
 def find_local_extrema(prices: np.ndarray):
     """Находит индексы локальных минимумов и максимумов."""
     # Добавляем NaN по краям для упрощения сравнения на границах
@@ -30,55 +34,47 @@ def find_local_extrema(prices: np.ndarray):
     extrema_indices = np.sort(np.concatenate((low_indices, high_indices)))
     return extrema_indices
 
-def check_brush_pattern(ohlcv_data: list):
+@feature('local_extrema')
+def _local_extrema_feature(cache: FeatureCache, column: str, lookback: int):
+    return find_local_extrema(cache.get('window', column, lookback))
+
+def check_brush_pattern(ohlcv_data, features: FeatureCache = None):
     """
-    Проверяет наличие паттерна 'Ёршик' на основе списка OHLCV свечей
-    с учетом новых критериев.
+    Проверяет наличие паттерна 'Ёршик' на основе свечей OHLCV
+    (CandleFrame или список свечей ccxt) с учетом новых критериев.
+    features - общий кэш признаков символа (если детекторы запускаются через реестр).
     Возвращает: (bool, dict) - (найден ли паттерн, детали паттерна или пустой dict)
     """
     # 1. Проверка достаточного количества данных
     if len(ohlcv_data) < BRUSH_LOOKBACK_CANDLES:
         return False, {}
 
-    # Берем только последние N свечей
-    relevant_ohlcv = ohlcv_data[-BRUSH_LOOKBACK_CANDLES:]
-
-    # 2. Извлечение данных и проверка на валидность
+    # 2. Берем только последние N свечей (колонки уже разобраны, без копирования)
     try:
-        timestamps_ms = [int(candle[0]) for candle in relevant_ohlcv] # Таймстемп (мс)
-        close_prices = np.array([float(candle[4]) for candle in relevant_ohlcv]) # Цены закрытия
-        # Проверка, что данные корректно извлеклись
-        if len(timestamps_ms) != BRUSH_LOOKBACK_CANDLES or len(close_prices) != BRUSH_LOOKBACK_CANDLES:
-             # print("Debug: Не удалось извлечь полные данные")
+        if features is None: features = FeatureCache(ohlcv_data)
+        timestamps_ms = features.get('window', 'timestamp', BRUSH_LOOKBACK_CANDLES) # Таймстемп (мс)
+        close_prices = features.get('window', 'close', BRUSH_LOOKBACK_CANDLES) # Цены закрытия
+        if len(timestamps_ms) != BRUSH_LOOKBACK_CANDLES:
              return False, {}
     except (ValueError, TypeError, IndexError) as e:
-        print(f"Ошибка извлечения данных из OHLCV: {e}")
+        logger.warning("Ошибка извлечения данных из OHLCV: %s", e)
         return False, {}
 
     # 3. ПРОВЕРКА НА ПРОПУСКИ В ДАННЫХ (НОВЫЙ КРИТЕРИЙ)
-    max_allowed_gap_ms = MAX_ALLOWED_GAP_MINUTES * 60 * 1000
-    for i in range(1, len(timestamps_ms)):
-        time_diff_ms = timestamps_ms[i] - timestamps_ms[i-1]
-        if time_diff_ms > max_allowed_gap_ms:
-            # print(f"Debug: Обнаружен пропуск данных > {MAX_ALLOWED_GAP_MINUTES} мин ({time_diff_ms / 60000:.1f} мин)")
-            return False, {} # Есть недопустимый пропуск
+    max_allowed_gap_ms = MAX_ALLOWED_GAP_CANDLES * features.timeframe_ms
+    if np.any(features.get('diff', 'timestamp', BRUSH_LOOKBACK_CANDLES) > max_allowed_gap_ms):
+        return False, {} # Есть недопустимый пропуск
 
     # 4. Расчет SMA и базовых метрик (как раньше)
     try:
         if len(close_prices) < BRUSH_SMA_PERIOD: return False, {}
-        sma = np.convolve(close_prices, np.ones(BRUSH_SMA_PERIOD)/BRUSH_SMA_PERIOD, mode='valid')
+        sma = features.get('sma', 'close', BRUSH_SMA_PERIOD, BRUSH_LOOKBACK_CANDLES)
         prices_for_comparison = close_prices[BRUSH_SMA_PERIOD-1:]
         if len(prices_for_comparison) != len(sma): return False, {} # Ошибка длины
 
-        # Пересечения
-        crossings = 0
-        if len(prices_for_comparison) > 0 and len(sma) > 0:
-            price_above_sma = prices_for_comparison[0] > sma[0]
-            for i in range(1, len(prices_for_comparison)):
-                current_price_above_sma = prices_for_comparison[i] > sma[i]
-                if current_price_above_sma != price_above_sma:
-                    crossings += 1
-                    price_above_sma = current_price_above_sma
+        # Пересечения: смена стороны цены относительно SMA
+        price_above_sma = prices_for_comparison > sma
+        crossings = int(np.count_nonzero(price_above_sma[1:] != price_above_sma[:-1]))
 
         # Отклонения
         safe_sma = np.where(sma <= 0, 1e-10, sma) # Проверка на <= 0
@@ -88,8 +84,7 @@ def check_brush_pattern(ohlcv_data: list):
         max_dev_down = np.min(deviations_percent)
 
     except Exception as e:
-        print(f"Ошибка в расчетах SMA/отклонений: {e}")
-        traceback.print_exc()
+        logger.exception("Ошибка в расчетах SMA/отклонений: %s", e)
         return False, {}
 
     # 5. ПРОВЕРКА "ПЛОСКОСТИ" SMA (НОВЫЙ КРИТЕРИЙ)
@@ -110,17 +105,17 @@ def check_brush_pattern(ohlcv_data: list):
 
 
     # 6. ПРОВЕРКА ВРЕМЕНИ ЗИГЗАГА (НОВЫЙ КРИТЕРИЙ)
-    extrema_indices = find_local_extrema(close_prices)
+    extrema_indices = features.get('local_extrema', 'close', BRUSH_LOOKBACK_CANDLES)
     if len(extrema_indices) >= 2: # Нужно хотя бы два экстремума для проверки
         max_duration_found = 0
         for i in range(len(extrema_indices) - 1):
             duration = extrema_indices[i+1] - extrema_indices[i]
             if duration > max_duration_found:
                  max_duration_found = duration
-            if duration > MAX_ZIGZAG_DURATION_MINUTES:
-                # print(f"Debug: Слишком длинный зигзаг ({duration} мин > {MAX_ZIGZAG_DURATION_MINUTES} мин)")
+            if duration > MAX_ZIGZAG_DURATION_CANDLES:
+                # print(f"Debug: Слишком длинный зигзаг ({duration} свечей > {MAX_ZIGZAG_DURATION_CANDLES} свечей)")
                 return False, {} # Найдено слишком большое расстояние между экстремумами
-        # print(f"Debug: Макс. длительность зигзага: {max_duration_found} мин")
+        # print(f"Debug: Макс. длительность зигзага: {max_duration_found} свечей")
     else:
         # print("Debug: Недостаточно экстремумов для проверки зигзага")
         return False, {} # Недостаточно экстремумов для формирования зигзага
@@ -146,4 +141,84 @@ def check_brush_pattern(ohlcv_data: list):
         }
         return True, details
     else:
-        return False, {}
\ No newline at end of file
+        return False, {}
+
+# --- ПАКЕТНАЯ (ВЕКТОРНАЯ) ВЕРСИЯ ДЕТЕКТОРА ---
+def find_local_extrema_batch(prices: np.ndarray) -> np.ndarray:
+    """Булева маска локальных экстремумов (n, L) для матрицы цен. Крайние точки экстремумами не считаются."""
+    mask = np.zeros(prices.shape, dtype=bool)
+    mid, left, right = prices[:, 1:-1], prices[:, :-2], prices[:, 2:]
+    mask[:, 1:-1] = ((mid < left) & (mid < right)) | ((mid > left) & (mid > right))
+    return mask
+
+def check_brush_pattern_batch(close_matrix: np.ndarray, timestamp_matrix: np.ndarray, timeframe_ms: int = 60 * 1000,
+                              features: FeatureCache = None):
+    """
+    Проверяет паттерн 'Ёршик' сразу для многих символов.
+    close_matrix, timestamp_matrix - матрицы (n_symbols, >= BRUSH_LOOKBACK_CANDLES), берутся последние N колонок.
+    features - кэш признаков по этим матрицам (из реестра): окна, разности таймстемпов и SMA берутся из него.
+    Возвращает: (mask, details) - булева маска найденных паттернов и dict массивов
+    crossings / max_dev_up_pct / max_dev_down_pct (значения совпадают с check_brush_pattern).
+    """
+    if features is not None:
+        close_matrix = features.get('window', 'close', BRUSH_LOOKBACK_CANDLES)
+    closes = np.asarray(close_matrix, dtype=np.float64)[:, -BRUSH_LOOKBACK_CANDLES:]
+    timestamps = np.asarray(timestamp_matrix)[:, -BRUSH_LOOKBACK_CANDLES:]
+    n = closes.shape[0]
+    if closes.shape[1] < BRUSH_LOOKBACK_CANDLES or n == 0:
+        empty = np.zeros(n, dtype=bool)
+        return empty, {'crossings': np.zeros(n, dtype=np.int64), 'max_dev_up_pct': np.zeros(n), 'max_dev_down_pct': np.zeros(n)}
+
+    # Пропуски в данных
+    steps = np.diff(timestamps, axis=1) if features is None else features.get('diff', 'timestamp', BRUSH_LOOKBACK_CANDLES)
+    no_gaps = ~np.any(steps > MAX_ALLOWED_GAP_CANDLES * timeframe_ms, axis=1)
+
+    # SMA, пересечения и отклонения
+    sma = rolling_sma(closes, BRUSH_SMA_PERIOD) if features is None else features.get('sma', 'close', BRUSH_SMA_PERIOD,
+                                                                                       BRUSH_LOOKBACK_CANDLES)
+    prices_for_comparison = closes[:, BRUSH_SMA_PERIOD - 1:]
+    above = prices_for_comparison > sma
+    crossings = np.count_nonzero(above[:, 1:] != above[:, :-1], axis=1)
+    safe_sma = np.where(sma <= 0, 1e-10, sma)
+    deviations_percent = (prices_for_comparison - sma) / safe_sma * 100
+    max_dev_up = np.max(deviations_percent, axis=1)
+    max_dev_down = np.min(deviations_percent, axis=1)
+
+    # "Плоскость" SMA
+    flat_ok = np.ones(n, dtype=bool)
+    if sma.shape[1] > 1:
+        mean_sma = np.mean(sma, axis=1)
+        std_dev_sma = np.std(sma, axis=1)
+        positive = mean_sma > 1e-10
+        sma_volatility_percent = np.divide(std_dev_sma, mean_sma, out=np.zeros(n), where=positive) * 100
+        flat_ok = ~positive | (sma_volatility_percent <= SMA_MAX_STD_DEV_PERCENT)
+
+    # Длительность зигзага: расстояние между соседними экстремумами
+    extrema = find_local_extrema_batch(closes)
+    positions = np.arange(closes.shape[1])
+    last_seen = np.maximum.accumulate(np.where(extrema, positions, -1), axis=1)
+    previous = np.full(extrema.shape, -1)
+    previous[:, 1:] = last_seen[:, :-1]
+    durations = np.where(extrema & (previous >= 0), positions - previous, 0)
+    zigzag_ok = (np.count_nonzero(extrema, axis=1) >= 2) & (durations.max(axis=1) <= MAX_ZIGZAG_DURATION_CANDLES)
+
+    mask = (no_gaps & flat_ok & zigzag_ok &
+            (crossings >= BRUSH_MIN_CROSSINGS) &
+            (max_dev_up >= BRUSH_MIN_DEVIATION_PERCENT) &
+            (np.abs(max_dev_down) >= BRUSH_MIN_DEVIATION_PERCENT))
+    details = {
+        'crossings': crossings,
+        'max_dev_up_pct': np.round(max_dev_up, 4),
+        'max_dev_down_pct': np.round(max_dev_down, 4),
+    }
+    return mask, details
+
+def brush_batch_details(details: dict, row: int) -> dict:
+    """Словарь деталей для строки row пакетного результата - в том же формате, что у check_brush_pattern."""
+    return {
+        "crossings": int(details['crossings'][row]),
+        "max_dev_up_pct": details['max_dev_up_pct'][row],
+        "max_dev_down_pct": details['max_dev_down_pct'][row],
+        "sma_period": BRUSH_SMA_PERIOD,
+        "lookback_candles": BRUSH_LOOKBACK_CANDLES,
+    }
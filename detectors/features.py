@@ -0,0 +1,102 @@
+# detectors/features.py
+import numpy as np
+
+from utils.candle_frame import as_candle_frame
+
+# Зарегистрированные признаки: имя -> функция (cache, *args) -> значение
+FEATURES = {}
+# Признаки, у которых последний аргумент - окно (lookback), а значение для меньшего окна -
+# хвост значения для большего по последней оси (окна колонок, разности, скользящие средние)
+TAIL_FEATURES = set()
+
+def feature(name: str, tail: bool = False):
+    """
+    Декоратор регистрации признака. Детекторы могут объявлять свои признаки так же.
+    tail=True - признак считается один раз по общему окну кэша, а меньшие окна - его срезы.
+    """
+    def register(func):
+        if name in FEATURES and FEATURES[name] is not func:
+            raise ValueError(f"Признак '{name}' уже зарегистрирован")
+        FEATURES[name] = func
+        if tail: TAIL_FEATURES.add(name)
+        return func
+    return register
+
+class FeatureCache:
+    """
+    Признаки свечей одного символа (или матриц символов, см. DetectorRegistry.run_batch) в рамках цикла.
+    Каждый признак (например, ('sma', 'close', 20, 120)) вычисляется один раз
+    и переиспользуется всеми детекторами, которым он нужен.
+    lookback - общее окно детекторов: признаки из TAIL_FEATURES считаются по нему один раз,
+    а детектор с меньшим окном получает срез (без копирования), поэтому окна 120 и 61 делят значения.
+    """
+    __slots__ = ('frame', 'timeframe_ms', 'lookback', '_values', 'hits', 'misses')
+
+    def __init__(self, ohlcv, timeframe_ms: int = 60 * 1000, lookback: int = None):
+        self.frame = as_candle_frame(ohlcv)
+        self.timeframe_ms = timeframe_ms # Длительность свечи (пороги пропусков задаются в свечах)
+        self.lookback = lookback
+        self._values = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str, *args):
+        key = (name, *args)
+        try:
+            value = self._values[key]
+            self.hits += 1
+            return value
+        except KeyError:
+            pass
+        try:
+            func = FEATURES[name]
+        except KeyError:
+            raise KeyError(f"Неизвестный признак '{name}'") from None
+        if name in TAIL_FEATURES and self.lookback and args[-1] < self.lookback:
+            # Срез значения по общему окну: отбрасываем столько первых элементов, на сколько окно короче
+            full = self.get(name, *args[:-1], self.lookback)
+            length = self.frame.timestamp.shape[-1]
+            value = self._values[key] = full[..., min(self.lookback, length) - min(args[-1], length):]
+            self.hits += 1
+            return value
+        value = self._values[key] = func(self, *args)
+        self.misses += 1
+        return value
+
+def rolling_sma(prices: np.ndarray, period: int) -> np.ndarray:
+    """
+    SMA по последней оси (1D - один символ, 2D - матрица символов).
+    Окно суммируется последовательно и делится на период, поэтому результат
+    побитово совпадает для скалярной и пакетной версий детектора.
+    """
+    m = prices.shape[-1] - period + 1
+    total = prices[..., 0:m].copy()
+    for k in range(1, period):
+        total += prices[..., k:k + m]
+    return total / period
+
+# --- Базовые признаки ---
+@feature('window', tail=True)
+def _window(cache: FeatureCache, column: str, lookback: int):
+    """Последние lookback значений колонки (срез без копирования; для матриц - по последней оси)."""
+    values = getattr(cache.frame, column)
+    return values[..., -lookback:] if lookback < values.shape[-1] else values
+
+@feature('diff', tail=True)
+def _diff(cache: FeatureCache, column: str, lookback: int):
+    """Разности соседних значений колонки в окне (например, шаг таймстемпов)."""
+    return np.diff(cache.get('window', column, lookback))
+
+@feature('sma', tail=True)
+def _sma(cache: FeatureCache, column: str, period: int, lookback: int):
+    return rolling_sma(cache.get('window', column, lookback), period)
+
+@feature('argmax')
+def _argmax(cache: FeatureCache, column: str, lookback: int, stop: int = None):
+    """Индекс первого максимума колонки в окне (по первым stop значениям окна)."""
+    return np.argmax(cache.get('window', column, lookback)[:stop])
+
+@feature('argmin')
+def _argmin(cache: FeatureCache, column: str, lookback: int, stop: int = None):
+    """Индекс первого минимума колонки в окне (по первым stop значениям окна)."""
+    return np.argmin(cache.get('window', column, lookback)[:stop])
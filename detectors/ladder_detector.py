@@ -1,6 +1,8 @@
 # detectors/ladder_detector.py
+import logging
 import numpy as np
-import traceback
+
+from detectors.features import FeatureCache
 # from sklearn.linear_model import LinearRegression # Можно добавить для тренда
 
 # --- НАСТРОЙКИ ПАТТЕРНА "ЛЕСЕНКА" (v3 - последовательный рост OHLCV) ---
@@ -19,9 +21,12 @@ LADDER_DROP_MATCH_RATIO_MAX = 1.50
 DROP_PRICE_TYPE = 'low' # 'low' или 'close'
 # -----------------------------------------
 
-def check_ladder_pattern(ohlcv_data: list):
+logger = logging.getLogger(__name__)
+
+def check_ladder_pattern(ohlcv_data, features: FeatureCache = None):
     """
     Проверяет наличие паттерна 'Лесенка' (v3 - последовательный рост OHLCV).
+    ohlcv_data - CandleFrame или список свечей ccxt, features - общий кэш признаков символа.
     Возвращает: (bool, dict)
     """
     # Требуется lookback + 1 свеча (для падения)
@@ -29,29 +34,28 @@ def check_ladder_pattern(ohlcv_data: list):
     if len(ohlcv_data) < required_length:
         return False, {}
 
-    analysis_ohlcv = ohlcv_data[-required_length:]
-
     try:
-        # Извлекаем данные
-        timestamps = np.array([int(candle[0]) for candle in analysis_ohlcv])
-        open_prices = np.array([float(candle[1]) for candle in analysis_ohlcv])
-        high_prices = np.array([float(candle[2]) for candle in analysis_ohlcv])
-        low_prices = np.array([float(candle[3]) for candle in analysis_ohlcv])
-        close_prices = np.array([float(candle[4]) for candle in analysis_ohlcv])
-
-        if not (len(timestamps) == len(open_prices) == len(high_prices) == len(low_prices) == len(close_prices) == required_length):
+        # Колонки уже разобраны в CandleFrame - берем срезы без копирования
+        if features is None: features = FeatureCache(ohlcv_data)
+        timestamps = features.get('window', 'timestamp', required_length)
+        open_prices = features.get('window', 'open', required_length)
+        high_prices = features.get('window', 'high', required_length)
+        low_prices = features.get('window', 'low', required_length)
+        close_prices = features.get('window', 'close', required_length)
+
+        if len(timestamps) != required_length:
             # print("Debug Ladder v3: Ошибка извлечения данных нужной длины.")
             return False, {}
 
     except (ValueError, TypeError, IndexError) as e:
-        print(f"Ошибка извлечения данных из OHLCV: {e}")
+        logger.warning("Ошибка извлечения данных из OHLCV: %s", e)
         return False, {}
 
     try:
         # --- Поиск пика (в lookback-периоде) ---
         lookback_highs = high_prices[:LADDER_LOOKBACK_CANDLES]
         if len(lookback_highs) == 0: return False, {} # Проверка на пустой массив
-        peak_index_in_lookback = np.argmax(lookback_highs)
+        peak_index_in_lookback = features.get('argmax', 'high', required_length, LADDER_LOOKBACK_CANDLES)
         peak_price = lookback_highs[peak_index_in_lookback]
 
         # --- Поиск долины (перед пиком) ---
@@ -95,8 +99,8 @@ def check_ladder_pattern(ohlcv_data: list):
 
         # --- Фаза падения (по первой свече после пика) ---
         drop_candle_index = peak_index_in_lookback + 1
-        # Проверка индекса остается, т.к. анализ идет по analysis_ohlcv
-        if drop_candle_index >= len(analysis_ohlcv): return False, {}
+        # Проверка индекса остается, т.к. анализ идет по окну required_length
+        if drop_candle_index >= required_length: return False, {}
 
         if DROP_PRICE_TYPE == 'low': drop_price = low_prices[drop_candle_index]
         else: drop_price = close_prices[drop_candle_index]
@@ -131,6 +135,91 @@ def check_ladder_pattern(ohlcv_data: list):
             return False, {}
 
     except Exception as e:
-        print(f"Ошибка в check_ladder_pattern v3: {e}")
-        traceback.print_exc()
-        return False, {}
\ No newline at end of file
+        logger.exception("Ошибка в check_ladder_pattern v3: %s", e)
+        return False, {}
+
+# --- ПАКЕТНАЯ (ВЕКТОРНАЯ) ВЕРСИЯ ДЕТЕКТОРА ---
+def check_ladder_pattern_batch(open_matrix: np.ndarray, high_matrix: np.ndarray,
+                               low_matrix: np.ndarray, close_matrix: np.ndarray):
+    """
+    Проверяет паттерн 'Лесенка' сразу для многих символов.
+    Матрицы (n_symbols, >= LADDER_LOOKBACK_CANDLES + 1), берутся последние lookback + 1 колонок.
+    Пик/долина ищутся через argmax/argmin по оси, медвежьи и откатные свечи между долиной
+    и пиком считаются разностью кумулятивных сумм.
+    Возвращает: (mask, details) - булева маска и dict массивов с сырыми (неокругленными) значениями.
+    """
+    required_length = LADDER_LOOKBACK_CANDLES + 1
+    o, h, l, c = (np.asarray(m, dtype=np.float64)[:, -required_length:]
+                  for m in (open_matrix, high_matrix, low_matrix, close_matrix))
+    n = c.shape[0]
+    if c.shape[1] < required_length or n == 0:
+        return np.zeros(n, dtype=bool), {}
+    rows = np.arange(n)
+    positions = np.arange(required_length)
+
+    # Пик в lookback-периоде и долина перед ним
+    peak_index = np.argmax(h[:, :LADDER_LOOKBACK_CANDLES], axis=1)
+    peak_price = h[rows, peak_index]
+    enough_before_peak = peak_index + 1 >= LADDER_MIN_RISE_DURATION
+    lows_before_peak = np.where(positions <= peak_index[:, None], l, np.inf)
+    valley_index = np.argmin(lows_before_peak, axis=1)
+    valley_price = l[rows, valley_index]
+    rise_duration = peak_index - valley_index
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total_rise_percent = ((peak_price - valley_price) / valley_price) * 100
+
+        # Медвежьи и откатные свечи в фазе роста (valley, peak]
+        bearish = np.cumsum(c < o, axis=1)
+        pullback_flags = np.zeros(c.shape, dtype=bool)
+        pullback_flags[:, 1:] = c[:, 1:] < c[:, :-1]
+        pullback = np.cumsum(pullback_flags, axis=1)
+        bearish_count = bearish[rows, peak_index] - bearish[rows, valley_index]
+        pullback_count = pullback[rows, peak_index] - pullback[rows, valley_index]
+        bearish_ratio = bearish_count / rise_duration
+        pullback_ratio = pullback_count / rise_duration
+
+        # Падение по первой свече после пика
+        drop_index = peak_index + 1
+        drop_price = l[rows, drop_index] if DROP_PRICE_TYPE == 'low' else c[rows, drop_index]
+        drop_percent = ((peak_price - drop_price) / peak_price) * 100
+        drop_to_rise_ratio = drop_percent / total_rise_percent
+
+    # Условия записаны как отрицание условий отказа скалярной версии (в т.ч. для NaN)
+    mask = (enough_before_peak &
+            ~(valley_price <= 1e-10) &
+            ~((rise_duration < LADDER_MIN_RISE_DURATION) | (total_rise_percent < LADDER_MIN_RISE_PERCENT)) &
+            (rise_duration > 0) &
+            ~((bearish_ratio > LADDER_MAX_BEARISH_CANDLE_RATIO) | (pullback_ratio > LADDER_MAX_PULLBACK_CANDLE_RATIO)) &
+            ~(peak_price <= 1e-10) &
+            ~(total_rise_percent <= 1e-10) &
+            (drop_percent > 0) &
+            (LADDER_DROP_MATCH_RATIO_MIN <= drop_to_rise_ratio) & (drop_to_rise_ratio <= LADDER_DROP_MATCH_RATIO_MAX))
+
+    details = {
+        'rise_pct': total_rise_percent,
+        'rise_duration_candles': rise_duration,
+        'drop_pct_1st_candle': drop_percent,
+        'ratio': drop_to_rise_ratio,
+        'peak_price': peak_price,
+        'valley_price': valley_price,
+        'drop_price': drop_price,
+        'bearish_candle_ratio': bearish_ratio,
+        'pullback_candle_ratio': pullback_ratio,
+    }
+    return mask, details
+
+def ladder_batch_details(details: dict, row: int) -> dict:
+    """Словарь деталей для строки row пакетного результата - в том же формате, что у check_ladder_pattern."""
+    return {
+        "rise_pct": round(details['rise_pct'][row], 2),
+        "rise_duration_candles": details['rise_duration_candles'][row],
+        "drop_pct_1st_candle": round(details['drop_pct_1st_candle'][row], 2),
+        "ratio": round(details['ratio'][row], 2),
+        "peak_price": details['peak_price'][row],
+        "valley_price": details['valley_price'][row],
+        f"drop_price_{DROP_PRICE_TYPE}": details['drop_price'][row],
+        "bearish_candle_ratio": round(float(details['bearish_candle_ratio'][row]), 2),
+        "pullback_candle_ratio": round(float(details['pullback_candle_ratio'][row]), 2),
+        "lookback_candles": LADDER_LOOKBACK_CANDLES
+    }
@@ -0,0 +1,146 @@
+# detectors/registry.py
+import logging
+import time
+import numpy as np
+
+from detectors.features import FEATURES, TAIL_FEATURES, FeatureCache
+from detectors.brush_detector import (check_brush_pattern, check_brush_pattern_batch, brush_batch_details,
+                                      BRUSH_LOOKBACK_CANDLES, BRUSH_SMA_PERIOD)
+from detectors.ladder_detector import (check_ladder_pattern, check_ladder_pattern_batch, ladder_batch_details,
+                                       LADDER_LOOKBACK_CANDLES)
+from utils.candle_frame import CandleFrame, FRAME_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+class Detector:
+    """
+    Описание детектора: функция (frame, features) -> (bool, dict), минимум свечей и нужные признаки.
+    batch - необязательная пакетная версия: (FeatureCache по матрицам (n, L)) -> {номер строки: детали}.
+    """
+    __slots__ = ('name', 'title', 'func', 'min_candles', 'features', 'batch')
+
+    def __init__(self, name: str, title: str, func, min_candles: int, features: tuple = (), batch=None):
+        self.name = name
+        self.title = title
+        self.func = func
+        self.min_candles = min_candles
+        self.features = features
+        self.batch = batch
+
+class DetectorRegistry:
+    """
+    Реестр детекторов паттернов. Все детекторы символа (и пакетные версии - все строки матриц)
+    работают с одним FeatureCache, поэтому общие признаки считаются один раз за цикл.
+    Окна признаков у детекторов разные (120 у "ёршика", 61 у "лесенки"), поэтому кэш строится
+    по общему окну - максимальному из объявленных - и детектор с меньшим окном получает срез.
+    Новый паттерн добавляется вызовом register() - без изменений в цикле сканирования.
+    """
+
+    def __init__(self):
+        self._detectors = {}
+        self.lookback = 0 # Общее окно признаков (максимальное окно объявленных TAIL_FEATURES)
+
+    def register(self, name: str, func, min_candles: int, features: tuple = (), title: str = None, batch=None):
+        """
+        features - объявленные признаки вида ('sma', 'close', 20, 120): проверяются при регистрации,
+        окна признаков из TAIL_FEATURES расширяют общее окно кэша.
+        """
+        unknown = [f[0] for f in features if f[0] not in FEATURES]
+        if unknown:
+            raise ValueError(f"Детектор '{name}' использует незарегистрированные признаки: {unknown}")
+        self._detectors[name] = Detector(name, title or name.capitalize(), func, min_candles, tuple(features), batch)
+        self.lookback = max([self.lookback] + [f[-1] for f in features if f[0] in TAIL_FEATURES])
+        return func
+
+    def names(self) -> list:
+        return list(self._detectors)
+
+    @property
+    def max_min_candles(self) -> int:
+        """Сколько свечей нужно, чтобы могли сработать все детекторы."""
+        return max((d.min_candles for d in self._detectors.values()), default=0)
+
+    def run(self, symbol: str, ohlcv, timeframe_ms: int = 60 * 1000, timings: dict = None) -> dict:
+        """
+        Запускает все детекторы по свечам символа (timeframe_ms - длительность свечи).
+        Возвращает dict {имя детектора: детали} только для сработавших детекторов.
+        Ошибка одного детектора не мешает остальным.
+        timings - необязательный dict, в который добавляется время каждого детектора (сек).
+        """
+        features = FeatureCache(ohlcv, timeframe_ms, self.lookback)
+        found = {}
+        for detector in self._detectors.values():
+            if len(features.frame) < detector.min_candles:
+                continue
+            started = time.perf_counter()
+            try:
+                is_found, details = detector.func(features.frame, features=features)
+                if is_found:
+                    found[detector.name] = details
+            except Exception as e:
+                logger.error("Ошибка детектора %s для %s: %s", detector.title, symbol, e)
+            if timings is not None:
+                timings[detector.name] = timings.get(detector.name, 0.0) + time.perf_counter() - started
+        return found
+
+    def run_batch(self, symbols: list, matrices: CandleFrame, timeframe_ms: int = 60 * 1000, timings: dict = None) -> dict:
+        """
+        Запускает детекторы сразу по многим символам одинаковой длины.
+        matrices - CandleFrame, колонки которого - матрицы (len(symbols), L) с последними L свечами.
+        Детекторы с пакетной версией считаются векторно, остальные - построчно.
+        Возвращает dict {символ: {имя детектора: детали}} только для символов со срабатываниями.
+        timings - как в run().
+        """
+        found = {}
+        length = matrices.timestamp.shape[1] if len(symbols) else 0
+        features = FeatureCache(matrices, timeframe_ms, self.lookback) # Признаки сразу по всем строкам
+        for detector in self._detectors.values():
+            if length < detector.min_candles:
+                continue
+            started = time.perf_counter()
+            try:
+                if detector.batch is not None:
+                    hits = detector.batch(features)
+                else:
+                    hits = {}
+                    for row in range(len(symbols)):
+                        frame = CandleFrame(*(getattr(matrices, name)[row] for name in FRAME_COLUMNS))
+                        is_found, details = detector.func(frame, features=FeatureCache(frame, timeframe_ms, self.lookback))
+                        if is_found: hits[row] = details
+            except Exception as e:
+                logger.error("Ошибка пакетного детектора %s: %s", detector.title, e)
+                continue
+            finally:
+                if timings is not None:
+                    timings[detector.name] = timings.get(detector.name, 0.0) + time.perf_counter() - started
+            for row, details in hits.items():
+                found.setdefault(symbols[row], {})[detector.name] = details
+        return found
+
+def _brush_batch(features: FeatureCache) -> dict:
+    mask, details = check_brush_pattern_batch(features.frame.close, features.frame.timestamp, features.timeframe_ms,
+                                              features=features)
+    return {int(row): brush_batch_details(details, row) for row in np.flatnonzero(mask)}
+
+def _ladder_batch(features: FeatureCache) -> dict:
+    mask, details = check_ladder_pattern_batch(*(features.get('window', column, LADDER_LOOKBACK_CANDLES + 1)
+                                                 for column in ('open', 'high', 'low', 'close')))
+    return {int(row): ladder_batch_details(details, row) for row in np.flatnonzero(mask)}
+
+# Реестр по умолчанию со встроенными паттернами
+detector_registry = DetectorRegistry()
+detector_registry.register(
+    'brush', check_brush_pattern, BRUSH_LOOKBACK_CANDLES,
+    features=(('window', 'timestamp', BRUSH_LOOKBACK_CANDLES), ('window', 'close', BRUSH_LOOKBACK_CANDLES),
+              ('diff', 'timestamp', BRUSH_LOOKBACK_CANDLES),
+              ('sma', 'close', BRUSH_SMA_PERIOD, BRUSH_LOOKBACK_CANDLES),
+              ('local_extrema', 'close', BRUSH_LOOKBACK_CANDLES)),
+    batch=_brush_batch,
+)
+detector_registry.register(
+    'ladder', check_ladder_pattern, LADDER_LOOKBACK_CANDLES + 1,
+    features=tuple(('window', column, LADDER_LOOKBACK_CANDLES + 1)
+                   for column in ('timestamp', 'open', 'high', 'low', 'close'))
+             + (('argmax', 'high', LADDER_LOOKBACK_CANDLES + 1, LADDER_LOOKBACK_CANDLES),),
+    batch=_ladder_batch,
+)
@@ -0,0 +1,360 @@
+# detectors/streaming.py
+import math
+from collections import deque
+import numpy as np
+
+from detectors.brush_detector import (
+    BRUSH_LOOKBACK_CANDLES, BRUSH_SMA_PERIOD, BRUSH_MIN_DEVIATION_PERCENT, BRUSH_MIN_CROSSINGS,
+    MAX_ZIGZAG_DURATION_CANDLES, SMA_MAX_STD_DEV_PERCENT, MAX_ALLOWED_GAP_CANDLES,
+)
+from detectors.ladder_detector import (
+    LADDER_LOOKBACK_CANDLES, LADDER_MIN_RISE_DURATION, LADDER_MIN_RISE_PERCENT,
+    LADDER_MAX_BEARISH_CANDLE_RATIO, LADDER_MAX_PULLBACK_CANDLE_RATIO,
+    LADDER_DROP_MATCH_RATIO_MIN, LADDER_DROP_MATCH_RATIO_MAX, DROP_PRICE_TYPE,
+)
+from utils.candle_frame import as_candle_frame
+
+# --- НАСТРОЙКИ ПОТОКОВЫХ ДЕТЕКТОРОВ ---
+# Относительная близость к порогу "плоскости" SMA, при которой волатильность пересчитывается точно
+FLATNESS_EXACT_TOLERANCE = 1e-6
+# ---------------------------------------
+
+class _Ring:
+    """Последние size значений потока, адресуемые глобальным номером свечи."""
+    __slots__ = ('size', 'values')
+
+    def __init__(self, size: int, fill=0.0):
+        self.size = size
+        self.values = [fill] * size
+
+    def __getitem__(self, i):
+        return self.values[i % self.size]
+
+    def __setitem__(self, i, value):
+        self.values[i % self.size] = value
+
+class StreamingBrushState:
+    """
+    Потоковый детектор 'Ёршик' для одного символа.
+    Каждая новая закрытая свеча обновляет состояние за время, не зависящее от длины окна:
+    SMA (сумма последних BRUSH_SMA_PERIOD цен), флаги пересечений и пропусков со счетчиками,
+    монотонные очереди максимума/минимума отклонений, очередь экстремумов и расстояний между ними,
+    скользящие суммы для "плоскости" SMA. Результат совпадает с check_brush_pattern по последним
+    BRUSH_LOOKBACK_CANDLES свечам. timeframe_ms - длительность свечи (порог пропуска задается в свечах).
+    """
+
+    def __init__(self, timeframe_ms: int = 60 * 1000):
+        self.lookback = BRUSH_LOOKBACK_CANDLES
+        self.period = BRUSH_SMA_PERIOD
+        self.window = BRUSH_LOOKBACK_CANDLES - BRUSH_SMA_PERIOD + 1 # Число значений SMA в окне
+        self.max_gap_ms = MAX_ALLOWED_GAP_CANDLES * timeframe_ms
+        self.reset()
+
+    def reset(self):
+        self.n = 0 # Сколько свечей учтено
+        self.last_timestamp = None
+        self._close = _Ring(self.lookback)
+        self._gap = _Ring(self.lookback - 1, False)  # Пропуск перед свечой i
+        self._gap_count = 0
+        self._sma = _Ring(self.window)
+        self._dev = _Ring(self.window)
+        self._above = _Ring(self.window, False)
+        self._cross = _Ring(self.window - 1, False)  # Смена стороны цены относительно SMA на свече i
+        self._cross_count = 0
+        self._nan_count = 0                          # Отклонения NaN в окне
+        self._dev_max = deque()
+        self._dev_min = deque()
+        self._extrema = deque()                      # Номера локальных экстремумов
+        self._zigzag = deque()                       # (левый экстремум, расстояние) по убыванию расстояния
+        self._last_extremum = None
+        self._shift = 0.0                            # Сдвиг для скользящих сумм SMA
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._since_resync = 0
+
+    def warm(self, ohlcv):
+        """Сбрасывает состояние и заполняет его хвостом свечей. Возвращает результат по последней свече."""
+        self.reset()
+        frame = as_candle_frame(ohlcv).tail(self.lookback)
+        timestamps, closes = frame.timestamp.tolist(), frame.close.tolist()
+        for ts, close in zip(timestamps[:-1], closes[:-1]):
+            self._push(ts, close)
+        return self.update(timestamps[-1], closes[-1]) if timestamps else (False, {})
+
+    def update(self, timestamp, close):
+        """Добавляет закрытую свечу. Возвращает (bool, dict) как check_brush_pattern."""
+        self._push(int(timestamp), float(close))
+        return self._evaluate()
+
+    def _push(self, timestamp: int, close: float):
+        i = self.n
+        gap = i > 0 and timestamp - self.last_timestamp > self.max_gap_ms
+        self._gap_count += gap - self._gap[i]
+        self._gap[i] = gap
+        self._close[i] = close
+        self.n = i + 1
+        self.last_timestamp = timestamp
+
+        # Экстремум на предыдущей свече определяется, когда известна следующая
+        if i >= 2:
+            left, mid = self._close[i - 2], self._close[i - 1]
+            if (mid < left and mid < close) or (mid > left and mid > close):
+                self._add_extremum(i - 1)
+        low_bound = self.n - self.lookback + 1 # Крайние свечи окна экстремумами не считаются
+        while self._extrema and self._extrema[0] < low_bound: self._extrema.popleft()
+        while self._zigzag and self._zigzag[0][0] < low_bound: self._zigzag.popleft()
+
+        if i >= self.period - 1:
+            self._push_sma(i, close)
+
+    def _add_extremum(self, index: int):
+        if self._last_extremum is not None:
+            distance = index - self._last_extremum
+            while self._zigzag and self._zigzag[-1][1] <= distance: self._zigzag.pop()
+            self._zigzag.append((self._last_extremum, distance))
+        self._last_extremum = index
+        self._extrema.append(index)
+
+    def _push_sma(self, i: int, close: float):
+        # Сумма окна последовательно слева направо - как в rolling_sma
+        total = self._close[i - self.period + 1]
+        for k in range(i - self.period + 2, i + 1):
+            total += self._close[k]
+        sma = total / self.period
+        safe_sma = 1e-10 if sma <= 0 else sma
+        dev = (close - sma) / safe_sma * 100
+        above = close > sma
+
+        w = self.window
+        first = self.period - 1 # Первая свеча, для которой есть SMA
+        if i - w >= first:
+            old = self._sma[i - w] - self._shift
+            self._sum -= old
+            self._sum_sq -= old * old
+            self._nan_count -= math.isnan(self._dev[i - w])
+        cross = i > first and above != self._above[i - 1]
+        self._cross_count += cross - self._cross[i]
+        self._cross[i] = cross
+        self._sma[i], self._dev[i], self._above[i] = sma, dev, above
+        self._nan_count += math.isnan(dev)
+
+        low_bound = i - w + 1
+        if not math.isnan(dev):
+            while self._dev_max and self._dev[self._dev_max[-1]] <= dev: self._dev_max.pop()
+            self._dev_max.append(i)
+            while self._dev_min and self._dev[self._dev_min[-1]] >= dev: self._dev_min.pop()
+            self._dev_min.append(i)
+        while self._dev_max and self._dev_max[0] < low_bound: self._dev_max.popleft()
+        while self._dev_min and self._dev_min[0] < low_bound: self._dev_min.popleft()
+
+        self._since_resync += 1
+        if self._since_resync >= w:
+            self._resync_sums(i)
+        else:
+            shifted = sma - self._shift
+            self._sum += shifted
+            self._sum_sq += shifted * shifted
+
+    def _resync_sums(self, i: int):
+        """Точный пересчет скользящих сумм раз в окно (накопленная ошибка не растет)."""
+        values = self._sma_window(i)
+        self._shift = values[0]
+        self._sum = sum(v - self._shift for v in values)
+        self._sum_sq = sum((v - self._shift) ** 2 for v in values)
+        self._since_resync = 0
+
+    def _sma_window(self, last: int) -> list:
+        first = max(self.period - 1, last - self.window + 1)
+        return [self._sma[k] for k in range(first, last + 1)]
+
+    def _sma_is_flat(self) -> bool:
+        w = self.window
+        mean = self._shift + self._sum / w
+        if math.isfinite(mean) and math.isfinite(self._sum_sq):
+            scale = max(abs(mean), 1e-10)
+            if abs(mean - 1e-10) > FLATNESS_EXACT_TOLERANCE * scale:
+                if mean <= 1e-10:
+                    return True # Если средняя SMA очень мала, считаем ее плоской
+                variance = max(self._sum_sq / w - (self._sum / w) ** 2, 0.0)
+                volatility = math.sqrt(variance) / mean * 100
+                if abs(volatility - SMA_MAX_STD_DEV_PERCENT) > FLATNESS_EXACT_TOLERANCE * SMA_MAX_STD_DEV_PERCENT:
+                    return volatility <= SMA_MAX_STD_DEV_PERCENT
+        # Рядом с порогом (или при нечисловых значениях) - точный расчет, как в check_brush_pattern
+        sma = np.array(self._sma_window(self.n - 1))
+        mean_sma = np.mean(sma)
+        if mean_sma > 1e-10:
+            return not (np.std(sma) / mean_sma) * 100 > SMA_MAX_STD_DEV_PERCENT
+        return True
+
+    def _evaluate(self):
+        if self.n < self.lookback:
+            return False, {}
+        if self._gap_count or self._nan_count:
+            return False, {} # Пропуск в данных или NaN в отклонениях (max/min тогда NaN)
+        if not self._sma_is_flat():
+            return False, {}
+        if len(self._extrema) < 2 or self._zigzag[0][1] > MAX_ZIGZAG_DURATION_CANDLES:
+            return False, {}
+        crossings = self._cross_count
+        max_dev_up = np.float64(self._dev[self._dev_max[0]])
+        max_dev_down = np.float64(self._dev[self._dev_min[0]])
+        if (crossings >= BRUSH_MIN_CROSSINGS and
+                max_dev_up >= BRUSH_MIN_DEVIATION_PERCENT and
+                abs(max_dev_down) >= BRUSH_MIN_DEVIATION_PERCENT):
+            return True, {
+                "crossings": crossings,
+                "max_dev_up_pct": round(max_dev_up, 4),
+                "max_dev_down_pct": round(max_dev_down, 4),
+                "sma_period": BRUSH_SMA_PERIOD,
+                "lookback_candles": BRUSH_LOOKBACK_CANDLES,
+            }
+        return False, {}
+
+class StreamingLadderState:
+    """
+    Потоковый детектор 'Лесенка' для одного символа.
+    Пик - фронт монотонной очереди максимумов high за lookback-период (его номер не убывает),
+    долина - фронт очереди минимумов low на отрезке [начало окна, пик], который тоже только сдвигается.
+    Медвежьи и откатные свечи считаются по префиксным счетчикам. Результат совпадает
+    с check_ladder_pattern по последним LADDER_LOOKBACK_CANDLES + 1 свечам.
+    """
+
+    def __init__(self):
+        self.lookback = LADDER_LOOKBACK_CANDLES
+        self.length = LADDER_LOOKBACK_CANDLES + 1 # lookback + свеча падения
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.last_timestamp = None
+        size = self.length
+        self._open, self._high, self._low, self._close = (_Ring(size) for _ in range(4))
+        self._bearish = _Ring(size, 0)  # Число медвежьих свечей с начала потока (включительно)
+        self._pullback = _Ring(size, 0) # Число свечей, закрывшихся ниже предыдущей
+        self._peaks = deque()
+        self._valleys = deque()
+        self._valley_pushed = -1        # Последний номер, добавленный в очередь долин
+        self._nan_highs = deque()
+        self._nan_lows = deque()
+
+    def warm(self, ohlcv):
+        """Сбрасывает состояние и заполняет его хвостом свечей. Возвращает результат по последней свече."""
+        self.reset()
+        frame = as_candle_frame(ohlcv).tail(self.length)
+        rows = list(zip(frame.timestamp.tolist(), frame.open.tolist(), frame.high.tolist(),
+                        frame.low.tolist(), frame.close.tolist()))
+        for row in rows[:-1]:
+            self._push(*row)
+        return self.update(*rows[-1]) if rows else (False, {})
+
+    def update(self, timestamp, open_price, high, low, close):
+        """Добавляет закрытую свечу. Возвращает (bool, dict) как check_ladder_pattern."""
+        self._push(int(timestamp), float(open_price), float(high), float(low), float(close))
+        return self._evaluate()
+
+    def _push(self, timestamp: int, open_price: float, high: float, low: float, close: float):
+        i = self.n
+        previous_bearish = self._bearish[i - 1] if i else 0
+        previous_pullback = self._pullback[i - 1] if i else 0
+        self._bearish[i] = previous_bearish + (close < open_price)
+        self._pullback[i] = previous_pullback + (i > 0 and close < self._close[i - 1])
+        self._open[i], self._high[i], self._low[i], self._close[i] = open_price, high, low, close
+        self.n = i + 1
+        self.last_timestamp = timestamp
+
+        # Предыдущая свеча входит в lookback-период поиска пика
+        if i >= 1:
+            value = self._high[i - 1]
+            if math.isnan(value):
+                self._nan_highs.append(i - 1)
+            else:
+                # Строгое сравнение: при равных high пиком остается первая свеча (как np.argmax)
+                while self._peaks and self._high[self._peaks[-1]] < value: self._peaks.pop()
+                self._peaks.append(i - 1)
+        start = self.n - self.length
+        while self._peaks and self._peaks[0] < start: self._peaks.popleft()
+        while self._nan_highs and self._nan_highs[0] < start: self._nan_highs.popleft()
+
+    def _find_valley(self, start: int, peak: int):
+        """Первый минимум low на [start, peak] или None, если среди них есть NaN (np.argmin вернул бы NaN)."""
+        for k in range(max(self._valley_pushed + 1, start), peak + 1):
+            value = self._low[k]
+            if math.isnan(value):
+                self._nan_lows.append(k)
+                continue
+            while self._valleys and self._low[self._valleys[-1]] > value: self._valleys.pop()
+            self._valleys.append(k)
+        self._valley_pushed = max(self._valley_pushed, peak)
+        while self._valleys and self._valleys[0] < start: self._valleys.popleft()
+        while self._nan_lows and self._nan_lows[0] < start: self._nan_lows.popleft()
+        if self._nan_lows and self._nan_lows[0] <= peak:
+            return None
+        return self._valleys[0]
+
+    def _evaluate(self):
+        if self.n < self.length:
+            return False, {}
+        if self._nan_highs:
+            return False, {} # np.argmax вернул бы NaN-пик, падение тогда NaN
+        start = self.n - self.length
+        peak = self._peaks[0]
+        if peak - start + 1 < LADDER_MIN_RISE_DURATION:
+            return False, {}
+        valley = self._find_valley(start, peak)
+        if valley is None:
+            return False, {}
+
+        peak_price = np.float64(self._high[peak])
+        valley_price = np.float64(self._low[valley])
+        rise_duration = peak - valley
+        if valley_price <= 1e-10: return False, {}
+        total_rise_percent = ((peak_price - valley_price) / valley_price) * 100
+        if rise_duration < LADDER_MIN_RISE_DURATION or total_rise_percent < LADDER_MIN_RISE_PERCENT:
+            return False, {}
+
+        bearish_ratio = (self._bearish[peak] - self._bearish[valley]) / rise_duration
+        pullback_ratio = (self._pullback[peak] - self._pullback[valley]) / rise_duration
+        if bearish_ratio > LADDER_MAX_BEARISH_CANDLE_RATIO or pullback_ratio > LADDER_MAX_PULLBACK_CANDLE_RATIO:
+            return False, {}
+
+        drop_price = np.float64(self._low[peak + 1] if DROP_PRICE_TYPE == 'low' else self._close[peak + 1])
+        if peak_price <= 1e-10: return False, {}
+        drop_percent = ((peak_price - drop_price) / peak_price) * 100
+        if total_rise_percent <= 1e-10: return False, {}
+        drop_to_rise_ratio = drop_percent / total_rise_percent
+
+        if drop_percent > 0 and LADDER_DROP_MATCH_RATIO_MIN <= drop_to_rise_ratio <= LADDER_DROP_MATCH_RATIO_MAX:
+            return True, {
+                "rise_pct": round(total_rise_percent, 2),
+                "rise_duration_candles": rise_duration,
+                "drop_pct_1st_candle": round(drop_percent, 2),
+                "ratio": round(drop_to_rise_ratio, 2),
+                "peak_price": peak_price,
+                "valley_price": valley_price,
+                f"drop_price_{DROP_PRICE_TYPE}": drop_price,
+                "bearish_candle_ratio": round(bearish_ratio, 2),
+                "pullback_candle_ratio": round(pullback_ratio, 2),
+                "lookback_candles": LADDER_LOOKBACK_CANDLES,
+            }
+        return False, {}
+
+class StreamingPatternState:
+    """Потоковые состояния обоих детекторов для одного символа (timeframe_ms - длительность свечи)."""
+
+    def __init__(self, timeframe_ms: int = 60 * 1000):
+        self.brush = StreamingBrushState(timeframe_ms)
+        self.ladder = StreamingLadderState()
+
+    def on_frame(self, frame, incremental: bool = True):
+        """
+        Синхронизирует состояние со свечами буфера символа.
+        Если к уже учтенным свечам добавилась ровно одна новая - обновление O(1),
+        иначе (первый вызов, догрузка пропуска, перезапись свечей) - прогрев по хвосту буфера.
+        Возвращает ((is_brush, brush_details), (is_ladder, ladder_details)).
+        """
+        frame = as_candle_frame(frame)
+        if (incremental and len(frame) >= 2 and self.brush.last_timestamp is not None
+                and self.brush.last_timestamp == self.ladder.last_timestamp == frame.timestamp[-2]):
+            ts, o, h, l, c = (frame.timestamp[-1], frame.open[-1], frame.high[-1], frame.low[-1], frame.close[-1])
+            return self.brush.update(ts, c), self.ladder.update(ts, o, h, l, c)
+        return self.brush.warm(frame), self.ladder.warm(frame)
@@ -4,195 +4,439 @@ import ccxt.async_support as ccxt_async
 import ccxt
 import time
 from datetime import datetime, timezone
-import traceback
-import csv
+import logging
 import os
 
 # Импорты детекторов
-from detectors.brush_detector import check_brush_pattern, BRUSH_LOOKBACK_CANDLES
-# Импортируем только нужные настройки и функцию детектора лесенки
-from detectors.ladder_detector import check_ladder_pattern, LADDER_LOOKBACK_CANDLES
+from detectors.brush_detector import BRUSH_LOOKBACK_CANDLES
+# Импортируем только нужные настройки детектора лесенки
+from detectors.ladder_detector import LADDER_LOOKBACK_CANDLES
+# Реестр детекторов с общим кэшем признаков символа
+from detectors.registry import detector_registry
+# Потоковые версии детекторов (O(1) на новую закрытую свечу)
+from detectors.streaming import StreamingPatternState
 
 # Импорт поиска символов
 from utils.find_tokens import find_and_filter_symbols # Убедитесь, что имя файла верное
+# Общий пул соединений с MEXC
+from utils.exchange_pool import get_exchange, close_exchange
+# Планировщик REST-запросов с ограничением по весу
+from utils.fetch_scheduler import FetchScheduler
+# Кольцевые буферы свечей (полная загрузка один раз, дальше только новые свечи)
+from utils.candle_buffer import CandleBufferStore
+# Локальное хранилище свечей на диске (теплый старт после перезапуска)
+from utils.candle_store import CandleStore
+# Потоковое получение свечей через WebSocket
+from utils.kline_stream import KlineStream
+# Демон периодического сканирования по закрытию свечей
+from utils.scan_daemon import ScanDaemon
+# Детекция вне event loop (пул процессов + общая память)
+from utils.detection_executor import DetectionExecutor
+# Сборка старших таймфреймов из 1m свечей (без дополнительных запросов)
+from utils.resample import ResampledBuffers, timeframe_to_ms
+# Метрики конвейера (гистограммы задержек, счетчики ошибок и паттернов) и эндпоинт /metrics
+from utils.metrics import (FETCH_SECONDS, DETECTOR_SECONDS, CYCLE_SECONDS, CANDLE_LAG_SECONDS, PATTERNS_TOTAL,
+                           record_error, start_metrics_server)
+# Логирование через очередь и фоновый поток, сводка повторяющихся ошибок за цикл
+from utils.log import setup_logging, cycle_errors
+# История найденных паттернов (SQLite, запись фоновым потоком)
+from utils.pattern_store import PatternStore, PATTERN_DB_FILE
+# Кулдаун оповещений: повторные срабатывания не доходят до логов, графиков и Telegram
+from utils.alert_cooldown import AlertCooldown, ALERT_COOLDOWN_FILE
 
 # --- НАСТРОЙКИ ---
 CHECK_INTERVAL_SECONDS = 60
 CANDLE_TIMEFRAME = '1m'
-PRINT_COOLDOWN_SECONDS = 300
-BRUSH_PATTERN_LOG_CSV = 'brush_patterns_log.csv'
-LADDER_PATTERN_LOG_CSV = 'ladder_patterns_log.csv'
-LOG_COOLDOWN_SECONDS = 60 * 10 # Кулдаун для записи в лог (10 минут)
+BUFFER_MAX_IDLE_SECONDS = 60 * 60 # Буфер символа, не сканировавшегося час, удаляется
+CANDLE_STORE_ENABLED = True # Сохранять свечи на диск и прогревать буферы из хранилища
+SCAN_MODE = os.getenv('SCAN_MODE', 'rest') # 'rest' - опрос OHLCV, 'stream' - свечи через WebSocket
+# Таймфреймы детекции: CANDLE_TIMEFRAME сканируется всегда, старшие собираются из него локально (например '1m,5m,15m,1h')
+SCAN_TIMEFRAMES = [tf.strip() for tf in os.getenv('SCAN_TIMEFRAMES', CANDLE_TIMEFRAME).split(',') if tf.strip()]
 # -----------------
 
+logger = logging.getLogger(__name__)
+
 # Пересчет CANDLES_TO_FETCH
 try:
     # Требуется максимальное количество свечей для обоих детекторов + запас
     CANDLES_TO_FETCH = max(BRUSH_LOOKBACK_CANDLES, LADDER_LOOKBACK_CANDLES + 1) + 50 # Исправлено: +1 для лесенки
 except NameError:
-    print("Ошибка импорта настроек детекторов. Установлены значения по умолчанию для FETCH.")
+    logger.error("Ошибка импорта настроек детекторов. Установлены значения по умолчанию для FETCH.")
     BRUSH_LOOKBACK_CANDLES = 120
     LADDER_LOOKBACK_CANDLES = 60
     CANDLES_TO_FETCH = max(BRUSH_LOOKBACK_CANDLES, LADDER_LOOKBACK_CANDLES + 1) + 50 # Исправлено: +1 для лесенки
 
-# Словари для кулдаунов
-last_brush_log_times = {}
-last_ladder_log_times = {}
-last_pattern_print_times = {}
+# Общий планировщик запросов OHLCV (бюджет веса сохраняется между циклами)
+ohlcv_scheduler = FetchScheduler()
+# Буферы последних CANDLES_TO_FETCH свечей по символам (живут между циклами)
+candle_buffers = CandleBufferStore(CANDLES_TO_FETCH)
+TIMEFRAME_MS = timeframe_to_ms(CANDLE_TIMEFRAME)
+# Хранилище свечей на диске (None - хранение отключено)
+candle_store = CandleStore() if CANDLE_STORE_ENABLED else None
+
+def resample_supported(timeframe: str) -> bool:
+    """
+    Можно ли собирать таймфрейм из буфера CANDLE_TIMEFRAME: корзина длиннее буфера собирается
+    только с хранилищем свечей (начало корзины читается с диска).
+    """
+    base_candles = timeframe_to_ms(timeframe) // TIMEFRAME_MS
+    if base_candles > CANDLES_TO_FETCH and candle_store is None:
+        logger.error("Таймфрейм %s пропущен: корзина (%d свечей %s) длиннее буфера (%d), а хранилище свечей отключено.",
+                     timeframe, base_candles, CANDLE_TIMEFRAME, CANDLES_TO_FETCH)
+        return False
+    return True
+
+# Буферы старших таймфреймов, собираемых из свечей CANDLE_TIMEFRAME
+resampled_buffers = {tf: ResampledBuffers(tf, CANDLES_TO_FETCH, store=candle_store, base_timeframe=CANDLE_TIMEFRAME)
+                     for tf in SCAN_TIMEFRAMES if tf != CANDLE_TIMEFRAME and resample_supported(tf)}
+# Стадия детекции (процессы создаются при первом большом цикле)
+detection_executor = DetectionExecutor()
+# Потоковые состояния детекторов по символам (режим WebSocket)
+streaming_states = {}
+# История найденных паттернов (файл и поток-писатель создаются при первой записи)
+pattern_store = PatternStore(PATTERN_DB_FILE)
+# Циклы сканирования идут по одному: буферы свечей общие, а часть цикла читает их в потоках
+scan_cycle_lock = asyncio.Lock()
+# Кулдауны оповещений по (symbol, pattern, timeframe) и по чатам бота, сохраняются между перезапусками
+alert_cooldown = AlertCooldown(ALERT_COOLDOWN_FILE)
 
 # --- Функция проверки таймфреймов ---
 async def check_exchange_timeframes(exchange):
     try:
         if not getattr(exchange, 'markets', None): await exchange.load_markets()
         if exchange.has['fetchOHLCV']:
-            print("\nПоддерживаемые биржей MEXC таймфреймы (по данным ccxt):")
             tf = getattr(exchange, 'timeframes', None)
-            if tf: print(list(tf.keys()))
-            else: print("Не удалось получить список таймфреймов от ccxt.")
-            print(f"Используемый таймфрейм: {CANDLE_TIMEFRAME}")
+            if tf: logger.info("Поддерживаемые биржей MEXC таймфреймы (по данным ccxt): %s", list(tf.keys()))
+            else: logger.warning("Не удалось получить список таймфреймов от ccxt.")
+            logger.info("Используемый таймфрейм: %s", CANDLE_TIMEFRAME)
             if tf and CANDLE_TIMEFRAME not in tf:
-                print(f"ПРЕДУПРЕЖДЕНИЕ: Используемый таймфрейм '{CANDLE_TIMEFRAME}' может не поддерживаться!")
-        else: print("Биржа MEXC (по данным ccxt) не поддерживает fetchOHLCV."); return False
+                logger.warning("Используемый таймфрейм '%s' может не поддерживаться!", CANDLE_TIMEFRAME)
+        else: logger.error("Биржа MEXC (по данным ccxt) не поддерживает fetchOHLCV."); return False
         return True
-    except Exception as e: print(f"Ошибка при проверке таймфреймов: {e}"); return False
+    except Exception as e: logger.error("Ошибка при проверке таймфреймов: %s", e); return False
 
-# --- Функция получения OHLCV ---
-async def fetch_ohlcv_safe(exchange: ccxt_async.Exchange, symbol: str, timeframe: str, limit: int):
-    reported_errors = set() # Локальные ошибки для одного цикла
-    try:
-        ohlcv = await exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
-        if not ohlcv:
-            return symbol, None
-        if all(len(candle) >= 5 for candle in ohlcv):
-            return symbol, ohlcv
-        else:
-             valid_ohlcv = [candle for candle in ohlcv if len(candle) >= 5]
-             # Проверяем на МИНИМАЛЬНО необходимое количество свечей
-             required_min_len = max(BRUSH_LOOKBACK_CANDLES, LADDER_LOOKBACK_CANDLES + 1) # Исправлено: +1
-             if len(valid_ohlcv) >= required_min_len:
-                 return symbol, valid_ohlcv
-             else:
-                 # print(f"Предупреждение: Слишком мало валидных свечей ({len(valid_ohlcv)}/{required_min_len}) для {symbol}.")
-                 return symbol, None
-    except ccxt.BadRequest as e:
-        error_key = f"{symbol}_{timeframe}_invalid_interval"
-        if error_key not in fetch_ohlcv_safe.reported_errors:
-             print(f"Ошибка BadRequest ('Invalid interval'?) для {symbol} [{timeframe}]: {e}. Пропуск.")
-             fetch_ohlcv_safe.reported_errors.add(error_key)
-    except ccxt.RateLimitExceeded as e: print(f"RateLimit для {symbol}: {e}. Пауза..."); await asyncio.sleep(10)
-    except ccxt.NetworkError as e: print(f"NetworkError для {symbol}: {e}.")
-    except ccxt.ExchangeError as e: print(f"ExchangeError для {symbol}: {e}.")
-    except Exception as e: print(f"Unknown Error для {symbol}: {e}"); # traceback.print_exc()
-    return symbol, None
-
-# --- Функция дозаписи в CSV ---
-def append_patterns_to_csv(patterns_data: list, filename: str):
-    if not patterns_data: return
-    file_exists = os.path.isfile(filename)
-    # Проверка, что все словари в списке имеют одинаковый набор ключей
-    if len(patterns_data) > 1:
-        first_keys = set(patterns_data[0].keys())
-        if not all(set(d.keys()) == first_keys for d in patterns_data[1:]):
-            print(f"Предупреждение: Не все записи для {filename} имеют одинаковые ключи. Запись может быть некорректной.")
-            # Можно попытаться найти общий набор ключей или записать как есть
-    fieldnames = list(patterns_data[0].keys()) # Берем ключи из первой записи
+# --- Проверка свечей, полученных от биржи ---
+def validate_ohlcv(ohlcv: list):
+    """Отбрасывает неполные свечи. Возвращает список свечей или None, если данных недостаточно."""
+    if not ohlcv:
+        return None
+    if all(len(candle) >= 5 for candle in ohlcv):
+        return ohlcv
+    valid_ohlcv = [candle for candle in ohlcv if len(candle) >= 5]
+    # Проверяем на МИНИМАЛЬНО необходимое количество свечей
+    required_min_len = max(BRUSH_LOOKBACK_CANDLES, LADDER_LOOKBACK_CANDLES + 1) # Исправлено: +1
+    if len(valid_ohlcv) >= required_min_len:
+        return valid_ohlcv
+    # print(f"Предупреждение: Слишком мало валидных свечей ({len(valid_ohlcv)}/{required_min_len}) для {symbol}.")
+    return None
+
+# --- Получение OHLCV через кольцевой буфер ---
+async def fetch_ohlcv_buffered(exchange: ccxt_async.Exchange, symbol: str):
+    """
+    Первый запрос по символу (и любой, пока буфер заполнен не до CANDLES_TO_FETCH) загружает свечи целиком,
+    последующие - только свечи начиная с последнего сохраненного таймстемпа.
+    Возвращает CandleFrame свечей из буфера или None. Ошибки ccxt пробрасываются (их обрабатывает планировщик).
+    """
+    buffer = candle_buffers.get(symbol)
+    if not len(buffer) and candle_store is not None:
+        # Теплый старт: берем историю с диска, из сети догружаем только недостающий хвост
+        buffer.reset(candle_store.read_tail(symbol, CANDLE_TIMEFRAME, buffer.capacity))
+    since, limit = buffer.fetch_window(exchange.milliseconds(), TIMEFRAME_MS)
+    if since is None:
+        with FETCH_SECONDS.time():
+            ohlcv = validate_ohlcv(await exchange.fetch_ohlcv(symbol, timeframe=CANDLE_TIMEFRAME, limit=limit))
+        if ohlcv is None:
+            return None
+        buffer.reset(ohlcv)
+        # Биржа вернула меньше запрошенного - более ранней истории нет, дальше только догрузка хвоста
+        buffer.history_complete = len(buffer) < limit
+    else:
+        with FETCH_SECONDS.time():
+            new_candles = await exchange.fetch_ohlcv(symbol, timeframe=CANDLE_TIMEFRAME, since=since, limit=limit)
+        buffer.merge([candle for candle in new_candles if len(candle) >= 5])
+    return buffer.view()
+
+def candle_snapshot(symbol: str, timeframe: str = CANDLE_TIMEFRAME, limit: int = None):
+    """
+    Копия последних limit свечей символа из буферов сканера (CANDLE_TIMEFRAME или собранного старшего ТФ)
+    или None, если символ не сканировался. Графики строятся по ней без повторного запроса к бирже.
+    """
+    if timeframe == CANDLE_TIMEFRAME: store = candle_buffers
+    elif timeframe in resampled_buffers: store = resampled_buffers[timeframe].buffers
+    else: return None
+    buffer = store.buffers.get(symbol)
+    if buffer is None or not len(buffer):
+        return None
+    frame = buffer.view()
+    # Копия: срезы буфера меняются следующим циклом, а график рисуется уже после await
+    return (frame.tail(limit) if limit else frame).copy()
+
+def resample_fetched(resampled: ResampledBuffers, fetched: dict, now_ms: int) -> dict:
+    """
+    Обновляет буферы старшего таймфрейма из свежих свечей (вызывается через asyncio.to_thread).
+    Возвращает только символы, у которых закрылась новая свеча этого таймфрейма.
+    """
+    frames = {}
+    for symbol, frame in fetched.items():
+        if frame is None: continue
+        resampled_frame, has_new_candle = resampled.update(symbol, frame, now_ms)
+        if has_new_candle: frames[symbol] = resampled_frame
+    return frames
+
+def persist_candles(fetched: dict):
+    """Дописывает свежие свечи из буферов в хранилище на диске (вызывается через asyncio.to_thread)."""
+    for symbol, frame in fetched.items():
+        if frame is None: continue
+        try: candle_store.append(symbol, CANDLE_TIMEFRAME, frame)
+        except OSError as e: cycle_errors.add('store', e, symbol)
+    try: candle_store.flush()
+    except OSError as e: logger.error("Ошибка сохранения индекса хранилища свечей: %s", e)
+
+# --- Детекция паттернов по свечам одного символа ---
+def pattern_entries(symbol: str, found: dict, detection_time_utc: datetime, timeframe: str = CANDLE_TIMEFRAME):
+    """Найденные детали {имя детектора: детали} -> (brush_entry или None, ladder_entry или None) для лога."""
+    timestamp_utc = detection_time_utc.strftime('%Y-%m-%d %H:%M:%S')
+    for name in found: PATTERNS_TOTAL.inc(pattern=name, timeframe=timeframe)
+    entries = {name: {'timestamp_utc': timestamp_utc, 'symbol': symbol, 'timeframe': timeframe, **details}
+               for name, details in found.items()}
+    return entries.get('brush'), entries.get('ladder')
 
+def detect_patterns(symbol: str, ohlcv_list, detection_time_utc: datetime):
+    """
+    Запускает все детекторы реестра по свечам символа (CandleFrame, разобранный один раз, или список ccxt).
+    Общие признаки (окна колонок, SMA, экстремумы) считаются один раз на символ.
+    Возвращает tuple: (brush_entry или None, ladder_entry или None) - записи для лога.
+    """
+    return pattern_entries(symbol, detector_registry.run(symbol, ohlcv_list), detection_time_utc)
+
+# --- Потоковая детекция по новой закрытой свече ---
+def detect_patterns_streaming(symbol: str, frame, detection_time_utc: datetime, incremental: bool = True,
+                              timeframe: str = CANDLE_TIMEFRAME):
+    """
+    То же, что detect_patterns, но через потоковое состояние символа: новая свеча
+    обрабатывается за O(1), без пересчета окна. incremental=False - пересобрать состояние по буферу.
+    timeframe - таймфрейм свечей frame (от него зависит допустимый пропуск между свечами).
+    Возвращает tuple: (brush_entry или None, ladder_entry или None).
+    """
+    state = streaming_states.get(symbol)
+    if state is None:
+        state = streaming_states[symbol] = StreamingPatternState(timeframe_to_ms(timeframe))
     try:
-        with open(filename, 'a', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore') # Игнорировать лишние поля
-            if not file_exists or os.path.getsize(filename) == 0:
-                writer.writeheader()
-            writer.writerows(patterns_data)
-    except IOError as e: print(f"Ошибка записи в CSV файл {filename}: {e}")
-    except Exception as e: print(f"Непредвиденная ошибка при дозаписи в CSV {filename}: {e}"); traceback.print_exc()
+        with DETECTOR_SECONDS.time(pattern='streaming'):
+            (is_brush, brush_details), (is_ladder, ladder_details) = state.on_frame(frame, incremental)
+    except Exception as e:
+        cycle_errors.add('detect', e, symbol)
+        streaming_states.pop(symbol, None) # Следующая свеча пересоберет состояние с нуля
+        return None, None
+    found = {}
+    if is_brush: found['brush'] = brush_details
+    if is_ladder: found['ladder'] = ladder_details
+    return pattern_entries(symbol, found, detection_time_utc, timeframe)
 
 # --- Основная функция проверки паттернов ---
 # --- ОСНОВНАЯ ФУНКЦИЯ ОДНОГО ЦИКЛА СКАНИРОВАНИЯ ---
-async def run_one_scan_cycle(symbols: list):
+async def run_one_scan_cycle(symbols: list, exchange=None):
     """
     Выполняет ОДИН цикл проверки паттернов для списка символов.
+    exchange - экземпляр биржи (по умолчанию общий из пула; бенчмарки передают фейковую биржу).
     Возвращает tuple: (list_of_brush_results, list_of_ladder_results)
     Каждый элемент списка - словарь с данными паттерна.
+    Одновременные вызовы (демон и несколько пользователей бота) выполняются по очереди:
+    ресемплинг и запись на диск читают срезы общих буферов в потоках, пока event loop мог бы их дописывать.
     """
     if not symbols:
-        print("Нет символов для сканирования.")
+        logger.info("Нет символов для сканирования.")
         return [], []
+    if scan_cycle_lock.locked():
+        logger.info("Цикл сканирования уже выполняется - ждем его завершения.")
+    async with scan_cycle_lock:
+        return await _run_one_scan_cycle(symbols, exchange)
+
+async def _run_one_scan_cycle(symbols: list, exchange=None):
 
     # Списки для сбора результатов этого цикла
     brush_patterns_found = []
     ladder_patterns_found = []
 
-    exchange = ccxt_async.mexc({'options': {'defaultType': 'spot'}})
-    print(f"[{datetime.now(timezone.utc).strftime('%H:%M:%S')}] Запуск одного цикла сканирования для {len(symbols)} символов...")
+    logger.info("Запуск одного цикла сканирования для %d символов...", len(symbols))
+    cycle_started = time.perf_counter()
     try:
+        # Берем общий экземпляр биржи из пула (не закрываем его в конце цикла)
+        if exchange is None: exchange = await get_exchange()
+
         # --- Проверка поддержки OHLCV ---
         # Убрана проверка таймфреймов отсюда, ее можно делать перед вызовом этой функции
         # if not await check_exchange_timeframes(exchange): # Можно вернуть, если нужно
-        #     print("Проверка таймфреймов не пройдена.")
+        #     logger.error("Проверка таймфреймов не пройдена.")
         #     await exchange.close()
         #     return [], []
 
-        # --- Параллельный запрос OHLCV ---
+        # --- Запрос OHLCV через планировщик (лимит веса, параллелизм, повторы) ---
         start_time_fetch = time.time()
-        tasks = [fetch_ohlcv_safe(exchange, symbol, CANDLE_TIMEFRAME, CANDLES_TO_FETCH) for symbol in symbols]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        print(f"Запрос OHLCV завершен за {time.time() - start_time_fetch:.2f} сек.")
+        min_fetch_seconds = ohlcv_scheduler.min_duration(len(symbols))
+        if min_fetch_seconds > CHECK_INTERVAL_SECONDS:
+            logger.warning("Лимит запросов не позволяет опросить %d символов за интервал: нужно не меньше %.0f сек. "
+                           "(интервал %s сек., не больше %d символов).", len(symbols), min_fetch_seconds,
+                           CHECK_INTERVAL_SECONDS, ohlcv_scheduler.max_symbols(CHECK_INTERVAL_SECONDS))
+        fetched, fetch_stats = await ohlcv_scheduler.run(symbols, lambda symbol: fetch_ohlcv_buffered(exchange, symbol))
+        candle_buffers.prune_idle(BUFFER_MAX_IDLE_SECONDS)
+        logger.info("Запрос OHLCV завершен за %.2f сек. Планировщик: %s", time.time() - start_time_fetch, fetch_stats)
 
         # --- Обработка результатов и детекция ---
-        print(f"Обработка результатов и детекция паттернов...")
+        logger.debug("Обработка результатов и детекция паттернов...")
         start_time_detect = time.time()
         detection_time_utc = datetime.now(timezone.utc) # Единое время для всех паттернов цикла
 
-        for result in results:
-            if isinstance(result, Exception): continue
-            symbol, ohlcv_list = result
-            if ohlcv_list is None: continue
-
-            # Проверка Ёршика
-            try:
-                if len(ohlcv_list) >= BRUSH_LOOKBACK_CANDLES:
-                    is_brush, brush_details = check_brush_pattern(ohlcv_list)
-                    if is_brush:
-                        log_entry = {'timestamp_utc': detection_time_utc.strftime('%Y-%m-%d %H:%M:%S'), 'symbol': symbol, **brush_details}
-                        brush_patterns_found.append(log_entry)
-            except Exception as e_brush: print(f"Ошибка детектора Brush для {symbol}: {e_brush}"); # traceback.print_exc()
-
-            # Проверка Лесенки
-            try:
-                req_len_ladder = LADDER_LOOKBACK_CANDLES + 1
-                if len(ohlcv_list) >= req_len_ladder:
-                    is_ladder, ladder_details = check_ladder_pattern(ohlcv_list)
-                    if is_ladder:
-                        log_entry = {'timestamp_utc': detection_time_utc.strftime('%Y-%m-%d %H:%M:%S'), 'symbol': symbol, **ladder_details}
-                        ladder_patterns_found.append(log_entry)
-            except Exception as e_ladder: print(f"Ошибка детектора Ladder для {symbol}: {e_ladder}"); # traceback.print_exc()
-
-        print(f"Детекция завершена за {time.time() - start_time_detect:.2f} сек.")
+        # Пакетная детекция в пуле процессов - event loop (и бот) остается свободным
+        found_by_symbol = await detection_executor.detect(fetched)
+        for symbol, found in found_by_symbol.items():
+            brush_entry, ladder_entry = pattern_entries(symbol, found, detection_time_utc)
+            if brush_entry: brush_patterns_found.append(brush_entry)
+            if ladder_entry: ladder_patterns_found.append(ladder_entry)
+
+        # Старшие таймфреймы: свечи собираются из уже загруженных, детекция - только по новым закрытым свечам
+        for timeframe, resampled in resampled_buffers.items():
+            frames_tf = await asyncio.to_thread(resample_fetched, resampled, fetched, exchange.milliseconds())
+            resampled.prune_idle(BUFFER_MAX_IDLE_SECONDS)
+            if not frames_tf: continue
+            found_tf = await detection_executor.detect(frames_tf, resampled.timeframe_ms)
+            for symbol, found in found_tf.items():
+                brush_entry, ladder_entry = pattern_entries(symbol, found, detection_time_utc, timeframe)
+                if brush_entry: brush_patterns_found.append(brush_entry)
+                if ladder_entry: ladder_patterns_found.append(ladder_entry)
+
+        logger.info("Детекция завершена за %.2f сек.", time.time() - start_time_detect)
+        # Отставание: сколько прошло от закрытия последней закрытой свечи до готовых результатов
+        newest = max((int(frame.timestamp[-1]) for frame in fetched.values() if frame is not None and len(frame)), default=None)
+        if newest is not None:
+            CANDLE_LAG_SECONDS.observe(max(0, exchange.milliseconds() - newest) / 1000)
+
+        # --- Сохранение свечей на диск (в отдельном потоке, чтобы не блокировать event loop) ---
+        if candle_store is not None:
+            await asyncio.to_thread(persist_candles, fetched)
 
     except Exception as e_cycle:
-        print(f"Ошибка в цикле сканирования: {e_cycle}")
-        traceback.print_exc()
+        record_error('cycle', e_cycle)
+        logger.exception("Ошибка в цикле сканирования: %s", e_cycle)
     finally:
-        # Гарантированное закрытие соединения
-        if 'exchange' in locals() and hasattr(exchange, 'close'):
-             try: await exchange.close()
-             except Exception: pass # Игнорируем ошибки закрытия здесь
-        print(f"[{datetime.now(timezone.utc).strftime('%H:%M:%S')}] Цикл сканирования завершен.")
+        CYCLE_SECONDS.observe(time.perf_counter() - cycle_started)
+        cycle_errors.flush(logger)
+        logger.info("Цикл сканирования завершен.")
 
     return brush_patterns_found, ladder_patterns_found
 
+# --- ПОТОКОВЫЙ РЕЖИМ (WebSocket) ---
+async def run_streaming_scan(symbols: list, on_patterns):
+    """
+    Потоковый режим: подписывается на 1m свечи символов через WebSocket и запускает
+    детекторы по каждой закрытой свече. REST используется для первичной загрузки буферов
+    и для догрузки пропусков после переподключения.
+    on_patterns(brush_results, ladder_results) - корутина, вызывается при найденных паттернах.
+    Работает до отмены задачи.
+    """
+    if not symbols:
+        logger.info("Нет символов для потокового сканирования.")
+        return
+    exchange = await get_exchange()
+
+    # Первичная загрузка буферов через REST
+    fetched, fetch_stats = await ohlcv_scheduler.run(symbols, lambda symbol: fetch_ohlcv_buffered(exchange, symbol))
+    logger.info("Поток: буферы загружены для %d символов. Планировщик: %s", len(fetched), fetch_stats)
+    closed_rows = {} # Закрытые свечи, ожидающие записи на диск
+
+    async def on_closed(symbol: str, candle: list):
+        buffer = candle_buffers.get(symbol)
+        last_ts = buffer.last_timestamp
+        backfilled = last_ts is None or candle[0] - last_ts > TIMEFRAME_MS
+        if backfilled:
+            # Пропуск свечей (например, после переподключения) - догружаем хвост через REST
+            try: await fetch_ohlcv_buffered(exchange, symbol)
+            except Exception as e: cycle_errors.add('fetch', e, symbol)
+        buffer.merge([candle])
+        frame = buffer.view()
+        if candle_store is not None:
+            # Все свечи новее сохраненных на диске: после догрузки их может быть больше одной
+            stored_ts = candle_store.last_timestamp(symbol, CANDLE_TIMEFRAME)
+            closed_rows[symbol] = (frame if stored_ts is None else frame[frame.timestamp > stored_ts]).copy()
+        # После догрузки свечи в буфере могли измениться - состояние детекторов пересобирается
+        brush_entry, ladder_entry = detect_patterns_streaming(symbol, frame, datetime.now(timezone.utc),
+                                                              incremental=not backfilled)
+        CANDLE_LAG_SECONDS.observe(max(0, exchange.milliseconds() - (candle[0] + TIMEFRAME_MS)) / 1000)
+        if brush_entry or ladder_entry:
+            await on_patterns([brush_entry] if brush_entry else [], [ladder_entry] if ladder_entry else [])
+
+    async def persist_periodically():
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL_SECONDS)
+            cycle_errors.flush(logger, "Ошибки потока за интервал")
+            if closed_rows:
+                batch = dict(closed_rows); closed_rows.clear()
+                await asyncio.to_thread(persist_candles, batch)
+
+    stream = KlineStream(symbols, CANDLE_TIMEFRAME, on_closed, markets_from=exchange)
+    persist_task = asyncio.create_task(persist_periodically()) if candle_store is not None else None
+    try:
+        await stream.run()
+    finally:
+        if persist_task: persist_task.cancel()
+
+# --- Отсев повторных оповещений ---
+async def filter_new_patterns(brush_results: list, ladder_results: list, scope=None):
+    """
+    Оставляет только паттерны, по которым не истек кулдаун (symbol, pattern, timeframe).
+    Вызывается до записи, графиков и отправки - повторы дальше не обрабатываются.
+    scope - свой кулдаун получателя: бот передает id чата, чтобы ручной запрос одного чата
+    не скрывал паттерны от другого и от фонового сканирования (scope=None).
+    """
+    brush_new = alert_cooldown.filter('brush', brush_results, scope=scope)
+    ladder_new = alert_cooldown.filter('ladder', ladder_results, scope=scope)
+    await asyncio.to_thread(alert_cooldown.save)
+    return brush_new, ladder_new
+
 # --- Блок if __name__ == "__main__": ---
+async def log_patterns(brush_results: list, ladder_results: list):
+    """Ставит новые (вне кулдауна) паттерны в очередь на запись в историю (диск пишет фоновый поток)."""
+    brush_results, ladder_results = await filter_new_patterns(brush_results, ladder_results)
+    pattern_store.add('brush', brush_results)
+    pattern_store.add('ladder', ladder_results)
+    for item in brush_results + ladder_results:
+        logger.info("Найден паттерн: %s %s", item['symbol'], item)
+
+async def load_symbols_to_watch(reload: bool = False) -> list:
+    """Список символов для сканирования (из кэшируемого поиска по цене; reload=True - без кэша)."""
+    filtered_symbols_data = await find_and_filter_symbols(reload)
+    return [item['symbol'] for item in filtered_symbols_data]
+
+async def main_async():
+    """Поиск символов и сканирование в одном event loop с общим пулом соединений."""
+    metrics_server = await start_metrics_server()
+    try:
+        if SCAN_MODE == 'stream':
+            symbols_to_watch = await load_symbols_to_watch()
+            logger.info("Получен список из %d символов для потоковой проверки.", len(symbols_to_watch))
+            if symbols_to_watch:
+                logger.info("Запуск потокового режима (WebSocket)...")
+                await run_streaming_scan(symbols_to_watch, log_patterns)
+            else: logger.warning("Не найдено символов для проверки или произошла ошибка при поиске.")
+        else:
+            logger.info("Запуск демона сканирования (интервал %s сек., по закрытию свечей)...", CHECK_INTERVAL_SECONDS)
+            daemon = ScanDaemon(
+                run_one_scan_cycle,
+                load_symbols_to_watch,
+                on_results=lambda results: log_patterns(*results),
+                interval=CHECK_INTERVAL_SECONDS,
+            )
+            await daemon.run()
+    finally:
+        if metrics_server is not None: await metrics_server.cleanup()
+        detection_executor.shutdown()
+        pattern_store.close() # Дописывает очередь паттернов
+        await close_exchange()
+
 if __name__ == "__main__":
-    print("Запускаем скринер (режим проверки по OHLCV v4: Brush + Ladder)...")
-    filtered_symbols_data = asyncio.run(find_and_filter_symbols())
-    if filtered_symbols_data:
-        symbols_to_watch = [item['symbol'] for item in filtered_symbols_data]
-        print(f"\nПолучен список из {len(symbols_to_watch)} символов для периодической проверки.")
-        if symbols_to_watch:
-            print("\nЗапуск основного цикла периодической проверки...")
-            try: asyncio.run(run_one_scan_cycle(symbols_to_watch))
-            except KeyboardInterrupt: print("\nЗавершение работы по команде пользователя (Ctrl+C)...")
-            except Exception as e: print(f"\nКритическая ошибка в основном потоке __main__: {e}"); traceback.print_exc()
-        else: print("\nСписок символов для проверки пуст после фильтрации.")
-    else: print("\nНе найдено символов для проверки или произошла ошибка при поиске.")
-    print("\nОсновной скрипт завершил работу.")
\ No newline at end of file
+    setup_logging()
+    logger.info("Запускаем скринер (режим проверки по OHLCV v4: Brush + Ladder)...")
+    try: asyncio.run(main_async())
+    except KeyboardInterrupt: logger.info("Завершение работы по команде пользователя (Ctrl+C)...")
+    except Exception as e: logger.critical("Критическая ошибка в основном потоке __main__: %s", e, exc_info=True)
+    logger.info("Основной скрипт завершил работу.")
@@ -0,0 +1,43 @@
+# test_alert_cooldown.py
+# Запуск: python -m unittest discover tests
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.alert_cooldown import AlertCooldown
+
+class AlertCooldownFileTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cooldown.json')
+
+    def _write(self, data):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    def test_wrong_shape_is_ignored(self):
+        for data in ({'a': 1}, [[1, 2]], [['AAA/USDT', 'brush', '1m', 'never']], ['row'], 5):
+            self._write(data)
+            with self.assertLogs('utils.alert_cooldown', 'WARNING'):
+                cooldown = AlertCooldown(self.path)
+            self.assertEqual(len(cooldown), 0)
+            self.assertTrue(cooldown.allow('AAA/USDT', 'brush', '1m'))
+
+    def test_scoped_keys_survive_save(self):
+        cooldown = AlertCooldown(self.path)
+        self.assertTrue(cooldown.allow('AAA/USDT', 'brush', '1m', scope=42))
+        self.assertTrue(cooldown.allow('AAA/USDT', 'brush', '1m'))
+        cooldown.save()
+        restored = AlertCooldown(self.path)
+        self.assertFalse(restored.allow('AAA/USDT', 'brush', '1m', scope=42))
+        self.assertFalse(restored.allow('AAA/USDT', 'brush', '1m'))
+        self.assertTrue(restored.allow('AAA/USDT', 'brush', '1m', scope=7))
+
+if __name__ == '__main__':
+    unittest.main()
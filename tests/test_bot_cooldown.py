@@ -0,0 +1,62 @@
+# test_bot_cooldown.py
+# Ручной запрос сканирования: повтор паттерна в пределах кулдауна чата не рисуется и не отправляется.
+# Запуск: python -m unittest discover tests
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from bot import handlers
+from utils.alert_cooldown import AlertCooldown
+
+BRUSH_ENTRY = {'timestamp_utc': '2026-01-01 00:00:00', 'symbol': 'AAA/USDT', 'timeframe': '1m', 'crossings': 7}
+
+def _message(chat_id: int):
+    message = mock.MagicMock()
+    message.from_user.id = chat_id
+    message.chat.id = chat_id
+    message.answer = mock.AsyncMock(return_value=mock.MagicMock(message_id=1))
+    message.answer_photo = mock.AsyncMock()
+    return message
+
+class ScanCooldownTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.charts = mock.AsyncMock(side_effect=lambda charts: [b'png'] * len(charts))
+        patches = [
+            mock.patch.object(main, 'alert_cooldown', AlertCooldown(os.path.join(directory.name, 'cooldown.json'))),
+            mock.patch.object(handlers, 'find_and_filter_symbols', mock.AsyncMock(return_value=[{'symbol': 'AAA/USDT'}])),
+            mock.patch.object(handlers, 'run_one_scan_cycle', mock.AsyncMock(return_value=([dict(BRUSH_ENTRY)], []))),
+            mock.patch.object(handlers, 'generate_chart_images', self.charts),
+            mock.patch.object(handlers, 'candle_snapshot', mock.MagicMock(return_value=None)),
+            mock.patch.object(handlers.asyncio, 'sleep', mock.AsyncMock()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def test_repeat_is_not_charted_or_sent(self):
+        message = _message(chat_id=1)
+        await handlers.handle_scan_request(message, mock.AsyncMock())
+        self.assertEqual(self.charts.await_count, 1)
+        self.assertEqual(message.answer_photo.await_count, 1)
+
+        repeat = _message(chat_id=1)
+        await handlers.handle_scan_request(repeat, mock.AsyncMock())
+        self.assertEqual(self.charts.await_count, 1)
+        repeat.answer_photo.assert_not_awaited()
+
+    async def test_cooldown_is_per_chat(self):
+        await handlers.handle_scan_request(_message(chat_id=1), mock.AsyncMock())
+        other = _message(chat_id=2)
+        await handlers.handle_scan_request(other, mock.AsyncMock())
+        self.assertEqual(other.answer_photo.await_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
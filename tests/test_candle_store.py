@@ -0,0 +1,57 @@
+# test_candle_store.py
+# Запуск: python -m unittest discover tests
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.candle_store import CandleStore
+
+MINUTE_MS = 60 * 1000
+START_MS = 1700000040000
+
+def _candles(start: int, n: int) -> list:
+    return [[START_MS + i * MINUTE_MS, 1.0 + i, 2.0 + i, 0.5 + i, 1.5 + i, 10.0] for i in range(start, start + n)]
+
+class CandleStoreIndexRecoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        store = CandleStore(self.root)
+        store.append('BTC/USDT', '1m', _candles(0, 100))
+        store.flush()
+        self.index_path = os.path.join(self.root, 'index.json')
+
+    def _check_history(self, store: CandleStore, count: int):
+        self.assertEqual(store.count('BTC/USDT', '1m'), count)
+        self.assertEqual(os.path.getsize(os.path.join(self.root, '1m', 'BTC_USDT', 'timestamp.bin')), count * 8)
+        self.assertEqual(store.ranges('BTC/USDT', '1m'), [[START_MS, START_MS + (count - 1) * MINUTE_MS]])
+        self.assertEqual(store.read_tail('BTC/USDT', '1m', count).to_ohlcv(), _candles(0, count))
+
+    def test_corrupt_index_keeps_history(self):
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            f.write('{broken')
+        store = CandleStore(self.root)
+        store.append('BTC/USDT', '1m', _candles(100, 1))
+        self._check_history(store, 101)
+
+    def test_missing_index_keeps_history(self):
+        os.remove(self.index_path)
+        store = CandleStore(self.root)
+        self.assertEqual(store.last_timestamp('BTC/USDT', '1m'), START_MS + 99 * MINUTE_MS)
+        store.append('BTC/USDT', '1m', _candles(100, 1))
+        self._check_history(store, 101)
+
+    def test_stale_index_after_crash_before_flush(self):
+        store = CandleStore(self.root)
+        store.append('BTC/USDT', '1m', _candles(100, 20)) # Индекс на диске не обновлен (нет flush)
+        store = CandleStore(self.root)
+        store.append('BTC/USDT', '1m', _candles(120, 1))
+        self._check_history(store, 121)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+# test_ticker_snapshot.py
+# Запуск: python -m unittest discover tests
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import ticker_snapshot
+from utils.ticker_snapshot import fetch_ticker_snapshot
+
+class ChunkExchange:
+    """Биржа без общего запроса тикеров: чанк с символом из broken всегда падает с error."""
+    has = {'fetchTickers': False}
+
+    def __init__(self, broken, error):
+        self.broken = broken
+        self.error = error
+        self.calls = 0
+
+    async def fetch_tickers(self, symbols=None):
+        self.calls += 1
+        if self.broken in symbols:
+            raise self.error
+        return {s: {'symbol': s, 'last': 0.0001, 'high': 0.0002, 'low': 0.00005, 'quoteVolume': 1000} for s in symbols}
+
+class FetchTickerSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(ticker_snapshot, TICKER_CHUNK_SIZE=2, TICKER_CHUNK_RETRIES=2,
+                                      TICKER_RETRY_BASE_DELAY=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.symbols = [f'T{i}/USDT' for i in range(6)]
+
+    def test_generic_error_drops_only_its_chunk(self):
+        exchange = ChunkExchange('T2/USDT', RuntimeError('boom'))
+        with self.assertLogs('utils.ticker_snapshot', 'WARNING'):
+            snapshot, stats = asyncio.run(fetch_ticker_snapshot(exchange, self.symbols))
+        self.assertEqual(sorted(snapshot.symbols), ['T0/USDT', 'T1/USDT', 'T4/USDT', 'T5/USDT'])
+        self.assertFalse(stats.complete)
+        self.assertEqual((stats.dropped, stats.dropped_symbols, stats.retried, stats.sent), (1, 2, 2, 5))
+
+    def test_complete_snapshot(self):
+        exchange = ChunkExchange('none', RuntimeError('boom'))
+        snapshot, stats = asyncio.run(fetch_ticker_snapshot(exchange, self.symbols))
+        self.assertEqual(len(snapshot), 6)
+        self.assertTrue(stats.complete)
+        self.assertEqual(stats.sent, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# test_ws_replay_server.py
+# Smoke-тест: replay-сервер отдает свечи, KlineStream (ccxt.pro) доводит их до закрытой свечи.
+# Запуск: python -m unittest discover tests
+import asyncio
+import os
+import sys
+import unittest
+
+import ccxt
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.kline_stream import KlineStream
+from utils.ws_replay_server import create_app, protobuf_available
+
+START_S = 1700000040 # Начало первой свечи (сек., как в потоке MEXC)
+RECORDS = [
+    {'s': 'BTCUSDT', 'i': 'Min1', 't': START_S, 'o': 100.0, 'h': 101.0, 'l': 99.5, 'c': 100.5, 'v': 2.0, 'a': 201.0,
+     'T': START_S + 60},
+    {'s': 'BTCUSDT', 'i': 'Min1', 't': START_S + 60, 'o': 100.5, 'h': 102.0, 'l': 100.0, 'c': 101.5, 'v': 1.0,
+     'a': 101.5, 'T': START_S + 120},
+]
+
+def _markets_source():
+    """REST-экземпляр с одним рынком без обращения к бирже."""
+    exchange = ccxt.mexc({'options': {'defaultType': 'spot'}})
+    exchange.set_markets([{
+        'id': 'BTCUSDT', 'symbol': 'BTC/USDT', 'base': 'BTC', 'quote': 'USDT', 'baseId': 'BTC', 'quoteId': 'USDT',
+        'type': 'spot', 'spot': True, 'swap': False, 'future': False, 'option': False, 'contract': False,
+        'active': True, 'precision': {'amount': 1e-6, 'price': 0.01},
+        'limits': {'amount': {}, 'price': {}, 'cost': {}}, 'info': {},
+    }])
+    return exchange
+
+class ReplayServerSmokeTest(unittest.IsolatedAsyncioTestCase):
+
+    async def _first_closed_candle(self, message_format: str):
+        runner = web.AppRunner(create_app(RECORDS, interval=0.05, message_format=message_format))
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        closed = asyncio.get_running_loop().create_future()
+
+        async def on_closed(symbol, candle):
+            if not closed.done(): closed.set_result((symbol, candle))
+
+        stream = KlineStream(['BTC/USDT'], '1m', on_closed, markets_from=_markets_source(),
+                             url=f'ws://127.0.0.1:{port}/ws')
+        task = asyncio.create_task(stream.run())
+        try:
+            return await asyncio.wait_for(closed, timeout=15)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await runner.cleanup()
+
+    def _check(self, result):
+        symbol, candle = result
+        self.assertEqual(symbol, 'BTC/USDT')
+        self.assertEqual(candle[:6], [START_S * 1000, 100.0, 101.0, 99.5, 100.5, 2.0])
+
+    @unittest.skipUnless(protobuf_available(), "нужен protobuf (формат кадров MEXC)")
+    async def test_protobuf_frames(self):
+        self._check(await self._first_closed_candle('pb'))
+
+    async def test_json_frames(self):
+        self._check(await self._first_closed_candle('json'))
+
+if __name__ == '__main__':
+    unittest.main()
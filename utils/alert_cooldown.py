@@ -0,0 +1,124 @@
+# alert_cooldown.py
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+
+from utils.resample import timeframe_to_ms
+
+# --- НАСТРОЙКИ КУЛДАУНА ОПОВЕЩЕНИЙ ---
+ALERT_COOLDOWN_FILE = os.getenv('ALERT_COOLDOWN_FILE', 'alert_cooldown.json') # Состояние переживает перезапуск
+ALERT_COOLDOWN_SECONDS = 60 * 10  # Повтор того же паттерна по символу не раньше, чем через 10 минут...
+ALERT_COOLDOWN_CANDLES = 10       # ...и не раньше, чем через столько свечей его таймфрейма
+# --------------------------------------
+
+logger = logging.getLogger(__name__)
+
+def cooldown_seconds(timeframe: str) -> float:
+    """Длительность кулдауна для таймфрейма: на старших ТФ паттерн держится дольше."""
+    try: candles = ALERT_COOLDOWN_CANDLES * timeframe_to_ms(timeframe) / 1000
+    except (KeyError, ValueError, IndexError): candles = 0
+    return max(ALERT_COOLDOWN_SECONDS, candles)
+
+class AlertCooldown:
+    """
+    Дедупликация оповещений по ключу (symbol, pattern, timeframe) - или (scope, symbol, pattern, timeframe),
+    если у получателей свои кулдауны (scope - например, id чата): повторное срабатывание
+    пропускается, пока не истек кулдаун. Истекшие ключи снимаются с вершины кучи по времени
+    истечения, поэтому память не растет с числом когда-либо виденных символов.
+    Состояние сохраняется в JSON (save()) и подхватывается при запуске. Если файл делят несколько
+    процессов, save() сливает свои ключи с записанными другими (побеждает более позднее истечение).
+    """
+
+    def __init__(self, path: str = ALERT_COOLDOWN_FILE):
+        self.path = path
+        self._expires = {} # ключ -> время истечения (unix, сек.)
+        self._heap = []    # (время истечения, ключ)
+        self._dirty = False
+        self._lock = threading.Lock() # Сохранение идет из asyncio.to_thread
+        if path: self._load()
+
+    def _read_file(self, now: float) -> dict:
+        """Неистекшие ключи из файла: {ключ: время истечения}. Строки: [*ключ, время истечения]."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                items = json.load(f)
+            if not isinstance(items, list):
+                raise ValueError(f"ожидался список, получен {type(items).__name__}")
+            keys = {}
+            for row in items:
+                if not isinstance(row, list) or len(row) not in (4, 5) or not isinstance(row[-1], (int, float)):
+                    raise ValueError(f"некорректная строка {row!r}")
+                if row[-1] > now:
+                    keys[tuple(row[:-1])] = row[-1]
+            return keys
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning("Кулдаун оповещений: не удалось прочитать %s: %s. Ключи из файла не учитываются.", self.path, e)
+            return {}
+
+    def _merge(self, items: dict):
+        """Добавляет ключи, для которых в items истечение позже нашего."""
+        for key, expires in items.items():
+            if expires > self._expires.get(key, 0):
+                self._expires[key] = expires
+                heapq.heappush(self._heap, (expires, key))
+
+    def _load(self):
+        self._merge(self._read_file(time.time()))
+
+    def _evict(self, now: float):
+        while self._heap and self._heap[0][0] <= now:
+            expires, key = heapq.heappop(self._heap)
+            if self._expires.get(key) == expires:
+                del self._expires[key]
+                self._dirty = True
+
+    def allow(self, symbol: str, pattern: str, timeframe: str, now: float = None, scope=None) -> bool:
+        """
+        True - оповещение новое (кулдаун запускается), False - повтор в пределах кулдауна.
+        scope - получатель со своим кулдауном (например, id чата); None - общий кулдаун.
+        """
+        now = time.time() if now is None else now
+        # scope приводится к строке: ключи в куче сравниваются между собой при равном времени истечения
+        key = (symbol, pattern, timeframe) if scope is None else (str(scope), symbol, pattern, timeframe)
+        with self._lock:
+            self._evict(now)
+            if key in self._expires:
+                return False
+            expires = now + cooldown_seconds(timeframe)
+            self._expires[key] = expires
+            heapq.heappush(self._heap, (expires, key))
+            self._dirty = True
+            return True
+
+    def filter(self, pattern: str, entries: list, now: float = None, scope=None) -> list:
+        """Оставляет только новые записи паттерна (словари из main.pattern_entries)."""
+        return [entry for entry in entries
+                if self.allow(entry['symbol'], pattern, entry.get('timeframe', ''), now, scope)]
+
+    def save(self):
+        """Сохраняет активные кулдауны (атомарно через временный файл); без изменений ничего не пишет."""
+        if not self.path: return
+        with self._lock:
+            now = time.time()
+            self._evict(now)
+            if not self._dirty:
+                return
+            # Файл мог обновить другой процесс (бот и демон) - не затираем его ключи
+            self._merge(self._read_file(now))
+            items = [[*key, expires] for key, expires in self._expires.items()]
+            tmp_path = self.path + '.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(items, f)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except OSError as e:
+                logger.error("Кулдаун оповещений: не удалось сохранить %s: %s", self.path, e)
+
+    def __len__(self):
+        return len(self._expires)
@@ -0,0 +1,120 @@
+# candle_buffer.py
+import time
+import numpy as np
+
+from utils.candle_frame import CandleFrame, as_candle_frame
+
+# Колонки цен буфера (timestamp хранится отдельно, int64 мс)
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+# Запас свечей при догрузке хвоста (последняя свеча могла быть еще не закрыта)
+INCREMENTAL_FETCH_MARGIN = 2
+
+class CandleBuffer:
+    """
+    Кольцевой буфер последних свечей одного символа.
+    Хранит не более capacity свечей в колонках удвоенного размера, поэтому
+    view() всегда возвращает CandleFrame из непрерывных срезов без копирования.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._timestamps = np.empty(capacity * 2, dtype=np.int64)
+        self._prices = np.empty((len(PRICE_COLUMNS), capacity * 2), dtype=np.float64)
+        self._start = 0
+        self._end = 0
+        self.last_used = time.monotonic()
+        # True - у биржи нет более ранних свечей (полная загрузка вернула меньше capacity), дозагружать нечего
+        self.history_complete = False
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def last_timestamp(self):
+        """Таймстемп (мс) последней свечи в буфере или None, если буфер пуст."""
+        return int(self._timestamps[self._end - 1]) if len(self) else None
+
+    def view(self) -> CandleFrame:
+        """Свечи буфера. Срезы действительны до следующего изменения буфера."""
+        self.last_used = time.monotonic()
+        s, e = self._start, self._end
+        return CandleFrame(self._timestamps[s:e], *self._prices[:, s:e])
+
+    def reset(self, ohlcv):
+        """Полностью заменяет содержимое буфера (первичная загрузка или прогрев с диска)."""
+        self._start = self._end = 0
+        self.history_complete = False
+        self._append(as_candle_frame(ohlcv).sorted_unique())
+
+    def merge(self, ohlcv):
+        """
+        Вливает догруженные свечи: свеча с таймстемпом последней обновляется
+        (она могла быть не закрыта), более новые дописываются, более старые игнорируются.
+        """
+        frame = as_candle_frame(ohlcv).sorted_unique()
+        if not len(self):
+            self._append(frame)
+            return
+        last_ts = self._timestamps[self._end - 1]
+        same = np.flatnonzero(frame.timestamp == last_ts)
+        if len(same):
+            self._write(self._end - 1, frame[same[-1:]])
+        self._append(frame[frame.timestamp > last_ts])
+
+    def _append(self, frame: CandleFrame):
+        k = len(frame)
+        if k == 0:
+            return
+        cap = self.capacity
+        if k >= cap:
+            self._write(0, frame.tail(cap))
+            self._start, self._end = 0, cap
+            return
+        if self._end + k > cap * 2:
+            # Переносим в начало только то, что останется видимым после добавления
+            keep = min(self._end - self._start, cap - k)
+            self._timestamps[:keep] = self._timestamps[self._end - keep:self._end]
+            self._prices[:, :keep] = self._prices[:, self._end - keep:self._end]
+            self._start, self._end = 0, keep
+        self._write(self._end, frame)
+        self._end += k
+        self._start = max(self._start, self._end - cap)
+
+    def _write(self, position: int, frame: CandleFrame):
+        end = position + len(frame)
+        self._timestamps[position:end] = frame.timestamp
+        for k, name in enumerate(PRICE_COLUMNS):
+            self._prices[k, position:end] = getattr(frame, name)
+
+    def fetch_window(self, now_ms: int, timeframe_ms: int):
+        """
+        Параметры следующего запроса: (since, limit).
+        since=None означает, что нужна полная загрузка: буфер пуст, заполнен не до емкости
+        (например, короткий хвост из хранилища после перезапуска) или разрыв больше емкости.
+        """
+        last_ts = self.last_timestamp
+        if last_ts is None or (len(self) < self.capacity and not self.history_complete):
+            return None, self.capacity
+        missing = max(0, (now_ms - last_ts) // timeframe_ms) + INCREMENTAL_FETCH_MARGIN
+        if missing >= self.capacity:
+            return None, self.capacity
+        return last_ts, int(missing)
+
+class CandleBufferStore:
+    """Набор кольцевых буферов по символам."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.buffers = {}
+
+    def get(self, symbol: str) -> CandleBuffer:
+        buffer = self.buffers.get(symbol)
+        if buffer is None:
+            buffer = self.buffers[symbol] = CandleBuffer(self.capacity)
+        return buffer
+
+    def prune_idle(self, max_idle_seconds: float):
+        """Удаляет буферы символов, которые давно не сканировались."""
+        threshold = time.monotonic() - max_idle_seconds
+        for symbol in [s for s, b in self.buffers.items() if b.last_used < threshold]:
+            del self.buffers[symbol]
@@ -0,0 +1,82 @@
+# candle_frame.py
+import numpy as np
+
+# Порядок колонок свечи ccxt: [timestamp, open, high, low, close, volume]
+FRAME_COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+class CandleFrame:
+    """
+    Свечи одного символа в виде непрерывных колонок: timestamp (int64, мс)
+    и open/high/low/close/volume (float64). Создается один раз при получении данных
+    и передается во все детекторы и в построение графика. Срезы не копируют данные.
+    """
+    __slots__ = FRAME_COLUMNS
+
+    def __init__(self, timestamp, open, high, low, close, volume):
+        self.timestamp = timestamp
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int64), *(np.empty(0, dtype=np.float64) for _ in range(5)))
+
+    @classmethod
+    def from_ohlcv(cls, ohlcv):
+        """
+        Разбирает список свечей ccxt (или массив (n, 5..6)) один раз.
+        Свечи без объема получают NaN. Порядок свечей не меняется.
+        """
+        if isinstance(ohlcv, CandleFrame):
+            return ohlcv
+        if not len(ohlcv):
+            return cls.empty()
+        try:
+            rows = np.asarray(ohlcv, dtype=np.float64)
+        except ValueError:
+            rows = None # Свечи разной длины
+        if rows is None or rows.ndim != 2 or rows.shape[1] < 5:
+            rows = np.full((len(ohlcv), 6), np.nan, dtype=np.float64)
+            for i, candle in enumerate(ohlcv):
+                n = min(len(candle), 6)
+                rows[i, :n] = candle[:n]
+        if rows.shape[1] < 6:
+            rows = np.column_stack((rows, np.full(len(rows), np.nan)))
+        return cls(rows[:, 0].astype(np.int64),
+                   *(np.ascontiguousarray(rows[:, k]) for k in range(1, 6)))
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __getitem__(self, item):
+        """Срез по свечам (без копирования для slice)."""
+        return CandleFrame(*(getattr(self, name)[item] for name in FRAME_COLUMNS))
+
+    def tail(self, n: int):
+        """Последние n свечей (без копирования)."""
+        return self[-n:] if n < len(self) else self
+
+    def copy(self):
+        return CandleFrame(*(getattr(self, name).copy() for name in FRAME_COLUMNS))
+
+    def sorted_unique(self):
+        """Свечи по возрастанию времени без дублей: при одинаковом timestamp остается последняя."""
+        if len(self) < 2:
+            return self
+        order = np.argsort(self.timestamp, kind='stable')
+        ts = self.timestamp[order]
+        keep = order[np.append(ts[1:] != ts[:-1], True)]
+        if len(keep) == len(self) and np.all(keep == np.arange(len(self))):
+            return self
+        return self[keep]
+
+    def to_ohlcv(self) -> list:
+        """Обратно в список свечей ccxt (для совместимости)."""
+        return [list(candle) for candle in zip(*(getattr(self, name).tolist() for name in FRAME_COLUMNS))]
+
+def as_candle_frame(ohlcv) -> CandleFrame:
+    """CandleFrame как есть, список свечей - разбирается."""
+    return ohlcv if isinstance(ohlcv, CandleFrame) else CandleFrame.from_ohlcv(ohlcv)
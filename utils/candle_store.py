@@ -0,0 +1,216 @@
+# candle_store.py
+import json
+import logging
+import os
+import threading
+import numpy as np
+
+from utils.candle_frame import CandleFrame, FRAME_COLUMNS, as_candle_frame
+from utils.resample import timeframe_to_ms
+
+# --- НАСТРОЙКИ ХРАНИЛИЩА СВЕЧЕЙ ---
+CANDLE_STORE_DIR = 'candle_store' # Корневая папка хранилища
+# Колонки и их типы: каждая колонка - отдельный файл, дописываемый в конец
+STORE_COLUMNS = (('timestamp', np.int64), ('open', np.float64), ('high', np.float64),
+                 ('low', np.float64), ('close', np.float64), ('volume', np.float64))
+# -----------------------------------
+
+logger = logging.getLogger(__name__)
+
+def _safe_name(symbol: str) -> str:
+    """BTC/USDT -> BTC_USDT (имя папки символа)."""
+    return symbol.replace('/', '_').replace(':', '_')
+
+class CandleStore:
+    """
+    Локальное хранилище свечей по ключу (symbol, timeframe).
+    Каждая колонка лежит в своем бинарном файле и читается через numpy.memmap без копирования.
+    Индекс index.json хранит для каждого символа число свечей и непрерывные диапазоны времени.
+    При первом обращении к символу запись индекса сверяется с файлами колонок: если индекс потерян,
+    поврежден или отстал (сбой до flush), запись пересобирается по самим файлам.
+    """
+
+    def __init__(self, root: str = CANDLE_STORE_DIR):
+        self.root = root
+        self._index_path = os.path.join(root, 'index.json')
+        self._index = self._load_index()
+        self._dirty = False
+        self._checked = set() # (symbol, timeframe), уже сверенные с файлами
+        self._lock = threading.RLock() # Запись может идти из asyncio.to_thread
+
+    # --- Индекс ---
+    def _load_index(self) -> dict:
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("Хранилище свечей: не удалось прочитать индекс %s: %s. Записи символов будут пересобраны "
+                           "по файлам колонок при первом обращении.", self._index_path, e)
+            return {}
+
+    def flush(self):
+        """Сохраняет индекс на диск (атомарно через временный файл)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = self._index_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f)
+            os.replace(tmp_path, self._index_path)
+            self._dirty = False
+
+    def _entry(self, symbol: str, timeframe: str):
+        entry = self._index.get(timeframe, {}).get(symbol)
+        if (symbol, timeframe) not in self._checked:
+            with self._lock:
+                if (symbol, timeframe) not in self._checked:
+                    entry = self._reconcile(symbol, timeframe, entry)
+                    self._checked.add((symbol, timeframe))
+        return entry
+
+    def _file_rows(self, symbol: str, timeframe: str) -> int:
+        """Сколько целых свечей есть во всех файлах колонок (по самой короткой колонке)."""
+        rows = None
+        for name, dtype in STORE_COLUMNS:
+            try: size = os.path.getsize(self._path(symbol, timeframe, name))
+            except OSError: return 0
+            column_rows = size // np.dtype(dtype).itemsize
+            rows = column_rows if rows is None else min(rows, column_rows)
+        return rows or 0
+
+    def _reconcile(self, symbol: str, timeframe: str, entry):
+        """Сверяет запись индекса с файлами; при расхождении пересобирает ее (число свечей и диапазоны)."""
+        rows = self._file_rows(symbol, timeframe)
+        if (entry['count'] if entry else 0) == rows:
+            return entry
+        symbols = self._index.setdefault(timeframe, {})
+        if rows == 0:
+            symbols.pop(symbol, None)
+            self._dirty = True
+            return None
+        timestamps = np.fromfile(self._path(symbol, timeframe, 'timestamp'), dtype=np.int64, count=rows)
+        # Берем только возрастающий префикс: дальше - мусор от прерванной записи
+        decreasing = np.flatnonzero(np.diff(timestamps) <= 0)
+        if len(decreasing):
+            timestamps = timestamps[:decreasing[0] + 1]
+        rebuilt = {'first': int(timestamps[0]), 'last': int(timestamps[-1]), 'count': len(timestamps), 'ranges': []}
+        self._extend_ranges(rebuilt, timestamps, timeframe_to_ms(timeframe))
+        logger.warning("Хранилище свечей: запись индекса %s [%s] пересобрана по файлам: %d свечей (в индексе было %d).",
+                       symbol, timeframe, rebuilt['count'], entry['count'] if entry else 0)
+        symbols[symbol] = rebuilt
+        self._dirty = True
+        return rebuilt
+
+    def _dir(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.root, timeframe, _safe_name(symbol))
+
+    def _path(self, symbol: str, timeframe: str, column: str) -> str:
+        return os.path.join(self._dir(symbol, timeframe), f"{column}.bin")
+
+    # --- Чтение ---
+    def symbols(self, timeframe: str) -> list:
+        """Символы из индекса (символы, потерянные вместе с индексом, появляются после первого обращения)."""
+        return sorted(self._index.get(timeframe, {}).keys())
+
+    def count(self, symbol: str, timeframe: str) -> int:
+        entry = self._entry(symbol, timeframe)
+        return entry['count'] if entry else 0
+
+    def last_timestamp(self, symbol: str, timeframe: str):
+        entry = self._entry(symbol, timeframe)
+        return entry['last'] if entry else None
+
+    def ranges(self, symbol: str, timeframe: str) -> list:
+        """Непрерывные диапазоны [первый_ts, последний_ts] без пропусков свечей."""
+        entry = self._entry(symbol, timeframe)
+        return [list(r) for r in entry['ranges']] if entry else []
+
+    def read(self, symbol: str, timeframe: str, start_ms: int = None, end_ms: int = None) -> dict:
+        """
+        Колонки свечей в диапазоне [start_ms, end_ms] как memmap-срезы (без копирования).
+        Возвращает dict {колонка: массив}; пустой dict, если данных нет.
+        """
+        count = self.count(symbol, timeframe)
+        if count == 0:
+            return {}
+        columns = {name: np.memmap(self._path(symbol, timeframe, name), dtype=dtype, mode='r', shape=(count,))
+                   for name, dtype in STORE_COLUMNS}
+        timestamps = columns['timestamp']
+        lo = 0 if start_ms is None else int(np.searchsorted(timestamps, start_ms, side='left'))
+        hi = count if end_ms is None else int(np.searchsorted(timestamps, end_ms, side='right'))
+        return {name: col[lo:hi] for name, col in columns.items()}
+
+    def read_tail(self, symbol: str, timeframe: str, n: int) -> CandleFrame:
+        """Последние n свечей (копия в памяти) - для прогрева кольцевых буферов."""
+        count = self.count(symbol, timeframe)
+        if count == 0:
+            return CandleFrame.empty()
+        lo = max(0, count - n)
+        columns = self.read(symbol, timeframe)
+        return CandleFrame(*(np.array(columns[name][lo:]) for name in FRAME_COLUMNS))
+
+    # --- Запись ---
+    def append(self, symbol: str, timeframe: str, candles):
+        """
+        Дописывает свечи (CandleFrame или список ccxt, отсортированные по времени).
+        Свеча с таймстемпом последней сохраненной перезаписывается (могла быть не закрыта),
+        более старые игнорируются.
+        """
+        if candles is None or not len(candles):
+            return
+        frame = as_candle_frame(candles)
+        with self._lock:
+            entry = self._entry(symbol, timeframe)
+            count = entry['count'] if entry else 0
+            last_ts = entry['last'] if entry else None
+
+            if last_ts is not None:
+                same = np.flatnonzero(frame.timestamp == last_ts)
+                if len(same):
+                    self._write_row(symbol, timeframe, count - 1, frame[same[-1]])
+                frame = frame[frame.timestamp > last_ts]
+            if not len(frame):
+                return
+            timestamps = frame.timestamp
+
+            os.makedirs(self._dir(symbol, timeframe), exist_ok=True)
+            for name, dtype in STORE_COLUMNS:
+                path = self._path(symbol, timeframe, name)
+                with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                    # Обрезаем "хвост" от прерванной записи, чтобы колонки оставались выровненными
+                    f.truncate(count * np.dtype(dtype).itemsize)
+                    f.seek(0, os.SEEK_END)
+                    np.asarray(getattr(frame, name), dtype=dtype).tofile(f)
+
+            if entry is None:
+                entry = self._index.setdefault(timeframe, {})[symbol] = {
+                    'first': int(timestamps[0]), 'last': None, 'count': 0, 'ranges': []}
+            self._extend_ranges(entry, timestamps, timeframe_to_ms(timeframe))
+            entry['count'] = count + len(frame)
+            entry['last'] = int(timestamps[-1])
+            self._dirty = True
+
+    def _write_row(self, symbol: str, timeframe: str, position: int, row: CandleFrame):
+        """Перезаписывает одну свечу (row - CandleFrame со скалярными колонками)."""
+        for name, dtype in STORE_COLUMNS:
+            itemsize = np.dtype(dtype).itemsize
+            with open(self._path(symbol, timeframe, name), 'r+b') as f:
+                f.seek(position * itemsize)
+                f.write(np.asarray(getattr(row, name), dtype=dtype).tobytes())
+
+    @staticmethod
+    def _extend_ranges(entry: dict, timestamps: np.ndarray, step_ms: int):
+        ranges = entry['ranges']
+        # Точки разрыва внутри новой порции
+        breaks = np.flatnonzero(np.diff(timestamps) != step_ms) + 1
+        starts = np.concatenate(([0], breaks))
+        ends = np.concatenate((breaks - 1, [len(timestamps) - 1]))
+        for s, e in zip(starts, ends):
+            first, last = int(timestamps[s]), int(timestamps[e])
+            if ranges and first - ranges[-1][1] == step_ms:
+                ranges[-1][1] = last
+            else:
+                ranges.append([first, last])
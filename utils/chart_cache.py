@@ -0,0 +1,133 @@
+# chart_cache.py
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from utils.metrics import CHART_CACHE_TOTAL
+
+# --- НАСТРОЙКИ КЭША ГРАФИКОВ ---
+CHART_CACHE_MAX_BYTES = 64 * 1024 * 1024        # Бюджет памяти под PNG (LRU вытесняет самые давние)
+CHART_CACHE_DIR = os.getenv('CHART_CACHE_DIR', '') # Папка дискового уровня ('' - только память)
+CHART_CACHE_DISK_MAX_BYTES = 512 * 1024 * 1024  # Бюджет дискового уровня
+# --------------------------------
+
+logger = logging.getLogger(__name__)
+
+def chart_key(symbol: str, timeframe: str, last_candle_ts: int, style: str) -> tuple:
+    """Ключ графика: в пределах одной свечи картинка та же, новая свеча - новый ключ."""
+    return (symbol, timeframe, int(last_candle_ts), style)
+
+def _file_name(key: tuple) -> str:
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.png'
+
+class ChartCache:
+    """
+    LRU-кэш готовых PNG графиков с бюджетом в байтах.
+    Необязательный дисковый уровень (disk_dir) переживает перезапуск и тоже ограничен по объему:
+    промах в памяти проверяет диск, найденный файл поднимается обратно в память.
+    """
+
+    def __init__(self, max_bytes: int = CHART_CACHE_MAX_BYTES, disk_dir: str = CHART_CACHE_DIR,
+                 disk_max_bytes: int = CHART_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = disk_max_bytes
+        self.bytes = 0
+        self._items = OrderedDict() # ключ -> PNG, в порядке использования (последний - самый свежий)
+        self._disk = OrderedDict()  # имя файла -> размер, от старых к новым
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        if self.disk_dir: self._scan_disk()
+
+    def _scan_disk(self):
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            entries = [e for e in os.scandir(self.disk_dir) if e.is_file() and e.name.endswith('.png')]
+        except OSError as e:
+            logger.warning("Кэш графиков: дисковый уровень %s недоступен: %s. Используется только память.", self.disk_dir, e)
+            self.disk_dir = None
+            return
+        for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+            size = entry.stat().st_size
+            self._disk[entry.name] = size
+            self._disk_bytes += size
+
+    def get(self, key: tuple):
+        """PNG по ключу или None."""
+        with self._lock:
+            png = self._items.get(key)
+            if png is not None:
+                self._items.move_to_end(key)
+                CHART_CACHE_TOTAL.inc(result='memory')
+                return png
+        png = self._read_disk(key)
+        if png is not None:
+            CHART_CACHE_TOTAL.inc(result='disk')
+            self._put_memory(key, png)
+            return png
+        CHART_CACHE_TOTAL.inc(result='miss')
+        return None
+
+    def put(self, key: tuple, png: bytes):
+        if not png: return
+        self._put_memory(key, png)
+        self._write_disk(key, png)
+
+    def _put_memory(self, key: tuple, png: bytes):
+        if len(png) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None: self.bytes -= len(old)
+            self._items[key] = png
+            self.bytes += len(png)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    # --- Дисковый уровень ---
+    def _read_disk(self, key: tuple):
+        if not self.disk_dir: return None
+        name = _file_name(key)
+        with self._lock:
+            if name not in self._disk: return None
+            self._disk.move_to_end(name)
+        try:
+            with open(os.path.join(self.disk_dir, name), 'rb') as f:
+                return f.read()
+        except OSError:
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(name, 0)
+            return None
+
+    def _write_disk(self, key: tuple, png: bytes):
+        if not self.disk_dir or len(png) > self.disk_max_bytes: return
+        name = _file_name(key)
+        path = os.path.join(self.disk_dir, name)
+        try:
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(png)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Кэш графиков: не удалось записать %s: %s", path, e)
+            return
+        with self._lock:
+            self._disk_bytes += len(png) - self._disk.pop(name, 0)
+            self._disk[name] = len(png)
+            evicted = []
+            while self._disk_bytes > self.disk_max_bytes:
+                old_name, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(old_name)
+        for old_name in evicted:
+            try: os.remove(os.path.join(self.disk_dir, old_name))
+            except OSError: pass
+
+    def __len__(self):
+        return len(self._items)
+
+# Общий кэш графиков процесса
+chart_cache = ChartCache()
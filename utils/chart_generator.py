@@ -1,106 +1,138 @@
 # chart_generator.py
 import asyncio
-import ccxt.async_support as ccxt_async
 import ccxt # Для ошибок
-import pandas as pd
-import mplfinance as mpf # Библиотека для графиков
-from datetime import datetime, timedelta, timezone
-import traceback
-import tempfile # Для временного файла
-import os
+from datetime import datetime, timezone
+import logging
+
+from utils.exchange_pool import get_exchange, exchange_session # Общий пул соединений
+from utils.candle_frame import CandleFrame, as_candle_frame
+from utils.resample import timeframe_to_ms
+from utils.metrics import FETCH_SECONDS, record_error
+from utils.chart_renderer import chart_renderer, CHART_STYLE # Отрисовка в пуле процессов, PNG в памяти
+from utils.chart_cache import chart_cache, chart_key # Готовые PNG по (символ, ТФ, свеча, стиль)
 
 # --- НАСТРОЙКИ ГРАФИКА ---
 CHART_TIMEFRAME = '1m'      # Таймфрейм свечей для графика
 CHART_CANDLES_LIMIT = 120   # Сколько последних свечей показать (2 часа)
-CHART_STYLE = 'yahoo'       # Стили mplfinance: 'yahoo', 'charles', 'binance', 'nightclouds', ...
-CHART_MA_PERIODS = (10, 20) # Периоды для скользящих средних на графике (можно убрать или изменить)
-CHART_VOLUME = True         # Показывать ли объем на графике
-CHART_DPI = 150             # Качество (разрешение) генерируемого изображения
+CHART_MAX_LAG_CANDLES = 1   # Переданные свечи устарели, если последняя закрылась раньше, чем столько свечей назад
+# Оформление (стиль, MA, объем, DPI) задается в utils/chart_renderer.py
 # ---------------------------
 
-async def generate_mexc_chart_image(symbol: str) -> str | None:
-    """
-    Получает OHLCV данные с MEXC и генерирует изображение графика.
-    Возвращает путь к временному PNG файлу или None в случае ошибки.
-    """
-    print(f"Запрос данных для генерации графика {symbol} [{CHART_TIMEFRAME}]...")
-    exchange = ccxt_async.mexc({'options': {'defaultType': 'spot'}})
-    filepath = None
-
-    try:
-        # Запрашиваем OHLCV данные
-        # Не используем fetch_ohlcv_safe, т.к. нужна обработка ошибок специфичная для генерации
-        ohlcv = await exchange.fetch_ohlcv(symbol, timeframe=CHART_TIMEFRAME, limit=CHART_CANDLES_LIMIT)
-
-        if not ohlcv or len(ohlcv) < 5: # Нужно хотя бы несколько свечей
-            print(f"Недостаточно OHLCV данных для {symbol} для генерации графика.")
-            return None
-
-        # Преобразуем в Pandas DataFrame, как требует mplfinance
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-
-        # Конвертируем timestamp в DatetimeIndex (важно для mplfinance)
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True)
-        df = df.set_index('timestamp')
+logger = logging.getLogger(__name__)
 
-        # Преобразуем столбцы в числовые типы (на всякий случай)
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            df[col] = pd.to_numeric(df[col])
+def _now_ms() -> int:
+    return int(datetime.now(timezone.utc).timestamp() * 1000)
 
-        print(f"Данные для {symbol} подготовлены, генерация графика...")
+def _cache_key(symbol: str, candles, timeframe: str, style: str) -> tuple:
+    """
+    Ключ кэша до загрузки свечей: по последней свече переданных (свежих) свечей,
+    иначе по текущей свече таймфрейма - ее же вернет запрос к бирже.
+    """
+    if candles is not None and candles_are_fresh(as_candle_frame(candles), timeframe):
+        return chart_key(symbol, timeframe, as_candle_frame(candles).timestamp[-1], style)
+    timeframe_ms = timeframe_to_ms(timeframe)
+    return chart_key(symbol, timeframe, _now_ms() // timeframe_ms * timeframe_ms, style)
 
-        # Создаем временный файл для сохранения графика
-        # delete=False, чтобы файл не удалился сразу после закрытия
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as temp_png:
-            filepath = temp_png.name
+def candles_are_fresh(candles, timeframe: str = CHART_TIMEFRAME, now_ms: int = None) -> bool:
+    """Подходят ли переданные свечи для графика: их достаточно и последняя не отстает от текущего времени."""
+    if candles is None or len(candles) < 5: # Нужно хотя бы несколько свечей
+        return False
+    timeframe_ms = timeframe_to_ms(timeframe)
+    now_ms = _now_ms() if now_ms is None else now_ms
+    last_close = int(candles.timestamp[-1]) + timeframe_ms
+    return now_ms - last_close <= CHART_MAX_LAG_CANDLES * timeframe_ms
 
-            # Генерируем и сохраняем график
-            mpf.plot(
-                df,
-                type='candle',             # Тип графика - свечной
-                style=CHART_STYLE,         # Стиль оформления
-                title=f'\n{symbol} - {CHART_TIMEFRAME}', # Заголовок графика
-                ylabel='Price',            # Подпись оси Y
-                volume=CHART_VOLUME,       # Отображать объем
-                mav=CHART_MA_PERIODS,      # Скользящие средние
-                tight_layout=True,         # Плотная компоновка
-                figratio=(16,9),           # Соотношение сторон
-                scale_padding={'left': 0.5, 'right': 0.9, 'top': 1.0, 'bottom': 0.5}, # Отступы
-                savefig=dict(fname=filepath, dpi=CHART_DPI) # Параметры сохранения
-            )
-        print(f"График для {symbol} сохранен в: {filepath}")
-        return filepath
+async def load_chart_candles(symbol: str, candles=None, timeframe: str = CHART_TIMEFRAME):
+    """
+    Свечи для графика: candles (уже загруженные сканером, например main.candle_snapshot), если они свежие,
+    иначе запрос OHLCV с MEXC. Возвращает CandleFrame последних CHART_CANDLES_LIMIT свечей или None.
+    """
+    if candles is not None and candles_are_fresh(as_candle_frame(candles), timeframe):
+        logger.debug("График %s [%s]: свечи из буфера сканера, без запроса к бирже.", symbol, timeframe)
+        return as_candle_frame(candles).tail(CHART_CANDLES_LIMIT)
 
+    logger.info("Запрос данных для генерации графика %s [%s]...", symbol, timeframe)
+    try:
+        exchange = await get_exchange() # Общий экземпляр биржи, не закрываем его здесь
+        # Отдельный запрос без планировщика: нужна обработка ошибок, специфичная для генерации
+        with FETCH_SECONDS.time():
+            ohlcv = await exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=CHART_CANDLES_LIMIT)
     except ccxt.BadSymbol as e:
-        print(f"Ошибка генерации графика: Неверный символ {symbol}. {e}")
+        record_error('chart', e)
+        logger.warning("Ошибка генерации графика: Неверный символ %s. %s", symbol, e)
+        return None
     except ccxt.NetworkError as e:
-        print(f"Сетевая ошибка при получении данных для графика {symbol}: {e}")
+        record_error('chart', e)
+        logger.warning("Сетевая ошибка при получении данных для графика %s: %s", symbol, e)
+        return None
     except ccxt.ExchangeError as e:
-        print(f"Ошибка биржи при получении данных для графика {symbol}: {e}")
+        record_error('chart', e)
+        logger.warning("Ошибка биржи при получении данных для графика %s: %s", symbol, e)
+        return None
+
+    if not ohlcv or len(ohlcv) < 5: # Нужно хотя бы несколько свечей
+        logger.warning("Недостаточно OHLCV данных для %s для генерации графика.", symbol)
+        return None
+    # Разбираем свечи один раз в колонки
+    return CandleFrame.from_ohlcv(ohlcv).sorted_unique()
+
+async def generate_mexc_chart_image(symbol: str, candles=None, timeframe: str = CHART_TIMEFRAME,
+                                    style: str = CHART_STYLE) -> bytes | None:
+    """
+    Генерирует график символа. candles - свечи таймфрейма timeframe, уже загруженные сканером:
+    если они свежие, запроса к бирже нет. Повторный запрос в пределах той же свечи отдается из кэша
+    без загрузки и отрисовки. Рисование идет в пуле процессов.
+    Возвращает PNG в памяти (bytes) или None в случае ошибки.
+    """
+    try:
+        png = chart_cache.get(_cache_key(symbol, candles, timeframe, style))
+        if png is not None:
+            return png
+        frame = await load_chart_candles(symbol, candles, timeframe)
+        if frame is None:
+            return None
+        png = await chart_renderer.render(symbol, frame, timeframe, style)
+        chart_cache.put(chart_key(symbol, timeframe, frame.timestamp[-1], style), png)
+        return png
     except Exception as e:
-        print(f"Неизвестная ошибка при генерации графика для {symbol}: {e}")
-        traceback.print_exc()
-    finally:
-        # Важно закрыть соединение
-        if 'exchange' in locals() and hasattr(exchange, 'close'):
-            await exchange.close()
+        record_error('chart', e)
+        logger.exception("Неизвестная ошибка при генерации графика для %s: %s", symbol, e)
+        return None
 
-    # Если дошли сюда - произошла ошибка, удаляем временный файл, если он создался
-    if filepath and os.path.exists(filepath):
-        try: os.remove(filepath)
-        except OSError: pass
-    return None
+async def generate_chart_images(charts: list, timeframe: str = CHART_TIMEFRAME, style: str = CHART_STYLE) -> list:
+    """
+    Пакетная генерация: charts - список (symbol, candles или None). Графики из кэша отдаются сразу,
+    для остальных недостающие свечи запрашиваются параллельно и графики рисуются параллельно всеми воркерами пула.
+    Возвращает PNG (bytes или None) в том же порядке.
+    """
+    async def load(symbol, candles):
+        try: return await load_chart_candles(symbol, candles, timeframe)
+        except Exception as e:
+            record_error('chart', e)
+            logger.exception("Неизвестная ошибка при получении данных для графика %s: %s", symbol, e)
+            return None
+    results = [chart_cache.get(_cache_key(symbol, candles, timeframe, style)) for symbol, candles in charts]
+    missing = [i for i, png in enumerate(results) if png is None]
+    frames = await asyncio.gather(*(load(*charts[i]) for i in missing))
+    ready = [(i, frame) for i, frame in zip(missing, frames) if frame is not None]
+    rendered = await chart_renderer.render_many([(charts[i][0], frame, timeframe) for i, frame in ready], style)
+    for (i, frame), png in zip(ready, rendered):
+        results[i] = png
+        chart_cache.put(chart_key(charts[i][0], timeframe, frame.timestamp[-1], style), png)
+    return results
 
 # Пример использования
 if __name__ == '__main__':
     async def run_test():
         test_symbol = "BTC/USDT"
         print(f"Тестовый запуск генерации графика для: {test_symbol}")
-        img_path = await generate_mexc_chart_image(test_symbol)
-        if img_path:
+        async with exchange_session():
+            png = await generate_mexc_chart_image(test_symbol)
+        chart_renderer.shutdown()
+        if png:
+            img_path = 'chart_test.png'
+            with open(img_path, 'wb') as f: f.write(png)
             print(f"График сохранен: {img_path}")
-            # В реальном приложении здесь была бы отправка файла и его удаление
-            # os.remove(img_path) # Удаляем после теста
         else:
             print("Не удалось сгенерировать график.")
-    asyncio.run(run_test())
\ No newline at end of file
+    asyncio.run(run_test())
@@ -0,0 +1,154 @@
+# chart_renderer.py
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+from utils.candle_frame import FRAME_COLUMNS, as_candle_frame
+from utils.log import after_fork
+from utils.metrics import CHART_RENDER_SECONDS, record_error
+
+# --- НАСТРОЙКИ ОТРИСОВКИ ---
+CHART_RENDER_WORKERS = int(os.getenv('CHART_RENDER_WORKERS', min(4, os.cpu_count() or 1))) # 0 - рисовать в потоке
+CHART_STYLE = 'yahoo'       # Стили mplfinance: 'yahoo', 'charles', 'binance', 'nightclouds', ...
+CHART_MA_PERIODS = (10, 20) # Периоды для скользящих средних на графике (можно убрать или изменить)
+CHART_VOLUME = True         # Показывать ли объем на графике
+CHART_DPI = 150             # Качество (разрешение) генерируемого изображения
+# ----------------------------
+
+logger = logging.getLogger(__name__)
+
+_mpf = None
+_pd = None
+_styles = {} # Имя стиля -> готовый стиль mplfinance (собирается один раз на процесс)
+
+def _load_plotting():
+    """Импорт matplotlib (без GUI) и mplfinance - один раз на процесс."""
+    global _mpf, _pd
+    if _mpf is None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import mplfinance
+        import pandas
+        _mpf, _pd = mplfinance, pandas
+    return _mpf, _pd
+
+def _style(name: str):
+    style = _styles.get(name)
+    if style is None:
+        mpf, _ = _load_plotting()
+        style = _styles[name] = mpf.make_mpf_style(base_mpf_style=name)
+    return style
+
+def render_chart_png(symbol: str, timeframe: str, columns: tuple, style: str = CHART_STYLE) -> bytes:
+    """
+    Рисует свечной график в PNG в памяти (без временных файлов).
+    columns - колонки свечей (timestamp, open, high, low, close, volume) как numpy-массивы.
+    Выполняется в воркере пула (или в потоке, если пул отключен).
+    """
+    mpf, pd = _load_plotting()
+    timestamp, open_, high, low, close, volume = columns
+    # mplfinance принимает только DataFrame - собираем его из колонок целиком, без построчного преобразования
+    df = pd.DataFrame(
+        {'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume},
+        index=pd.DatetimeIndex(pd.to_datetime(timestamp, unit='ms', utc=True), name='timestamp'),
+    )
+    mav = tuple(p for p in CHART_MA_PERIODS if p < len(df)) or None
+    buffer = io.BytesIO()
+    mpf.plot(
+        df,
+        type='candle',             # Тип графика - свечной
+        style=_style(style),       # Стиль оформления (готовый объект, не пересобирается)
+        title=f'\n{symbol} - {timeframe}', # Заголовок графика
+        ylabel='Price',            # Подпись оси Y
+        volume=CHART_VOLUME,       # Отображать объем
+        mav=mav,                   # Скользящие средние
+        tight_layout=True,         # Плотная компоновка
+        figratio=(16,9),           # Соотношение сторон
+        scale_padding={'left': 0.5, 'right': 0.9, 'top': 1.0, 'bottom': 0.5}, # Отступы
+        savefig=dict(fname=buffer, format='png', dpi=CHART_DPI) # mplfinance закрывает фигуру после сохранения
+    )
+    return buffer.getvalue()
+
+def _warm_worker():
+    """Инициализация воркера: импорт matplotlib/mplfinance, стиль и шрифты - на пробном графике."""
+    after_fork()
+    n = max(CHART_MA_PERIODS, default=0) + 5
+    prices = np.linspace(1.0, 2.0, n)
+    render_chart_png('WARMUP', '1m', (np.arange(n, dtype=np.int64) * 60000, prices, prices * 1.01, prices * 0.99,
+                                      prices, np.ones(n)))
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+def _columns(candles) -> tuple:
+    frame = as_candle_frame(candles)
+    return tuple(np.ascontiguousarray(getattr(frame, name)) for name in FRAME_COLUMNS)
+
+class ChartRenderer:
+    """
+    Отрисовка графиков вне event loop: пул процессов с заранее импортированными
+    matplotlib/mplfinance и собранным стилем. В воркеры уходят только колонки свечей,
+    обратно - готовые PNG-байты. render_many рисует пачку графиков параллельно.
+    """
+
+    def __init__(self, workers: int = CHART_RENDER_WORKERS):
+        self.workers = workers
+        self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+        return self._pool
+
+    async def warm_up(self):
+        """Запускает и прогревает все воркеры заранее (чтобы первый график не ждал импорта mplfinance)."""
+        try:
+            if self.workers <= 0:
+                await asyncio.to_thread(_load_plotting)
+                return
+            loop = asyncio.get_running_loop()
+            pool = self._get_pool()
+            await asyncio.gather(*(loop.run_in_executor(pool, _worker_ready) for _ in range(self.workers)))
+        except Exception as e:
+            logger.warning("Не удалось прогреть пул отрисовки графиков: %s", e)
+
+    async def render(self, symbol: str, candles, timeframe: str, style: str = CHART_STYLE) -> bytes:
+        """PNG графика по свечам (CandleFrame или список ccxt). Ошибки отрисовки пробрасываются."""
+        columns = _columns(candles)
+        with CHART_RENDER_SECONDS.time():
+            if self.workers <= 0:
+                return await asyncio.to_thread(render_chart_png, symbol, timeframe, columns, style)
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._get_pool(), render_chart_png, symbol, timeframe, columns, style)
+            except BrokenProcessPool as e:
+                logger.warning("Пул отрисовки графиков сломан (%s). Пересоздаю, текущий график рисуется в потоке.", e)
+                self.shutdown(wait=False)
+                return await asyncio.to_thread(render_chart_png, symbol, timeframe, columns, style)
+
+    async def render_many(self, charts: list, style: str = CHART_STYLE) -> list:
+        """
+        charts - список (symbol, candles, timeframe). Графики рисуются параллельно всеми воркерами.
+        Возвращает PNG-байты в том же порядке (None - график не удалось нарисовать).
+        """
+        async def render_one(symbol, candles, timeframe):
+            try:
+                return await self.render(symbol, candles, timeframe, style)
+            except Exception as e:
+                record_error('chart', e)
+                logger.error("Ошибка отрисовки графика %s: %s", symbol, e)
+                return None
+        return await asyncio.gather(*(render_one(*chart) for chart in charts))
+
+    def shutdown(self, wait: bool = True):
+        """Останавливает процессы пула (вызывается при остановке бота)."""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+# Общий сервис отрисовки процесса (воркеры создаются при первом графике или warm_up)
+chart_renderer = ChartRenderer()
@@ -0,0 +1,155 @@
+# detection_executor.py
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+import numpy as np
+
+from detectors.registry import detector_registry
+from utils.candle_frame import CandleFrame, FRAME_COLUMNS
+from utils.log import after_fork
+from utils.metrics import DETECTOR_SECONDS
+
+# --- НАСТРОЙКИ ДЕТЕКЦИИ ---
+DETECTION_WORKERS = int(os.getenv('DETECTION_WORKERS', os.cpu_count() or 1)) # Процессы детекции (1 - без пула)
+DETECTION_POOL_MIN_SYMBOLS = 200  # Меньше символов - пакетная детекция в потоке, без пересылки в процессы
+DETECTION_CHUNK_SYMBOLS = 256     # Строк матрицы на одну задачу воркера
+# ---------------------------
+
+logger = logging.getLogger(__name__)
+
+# Длина окна пакетной детекции: столько свечей нужно самому "длинному" детектору
+BATCH_WINDOW = detector_registry.max_min_candles
+
+def _stack_frames(frames: list, window: int) -> CandleFrame:
+    """Последние window свечей каждого символа -> CandleFrame из матриц (n, window)."""
+    tails = [frame.tail(window) for frame in frames]
+    return CandleFrame(*(np.stack([getattr(t, name) for t in tails]) for name in FRAME_COLUMNS))
+
+def _matrix_views(buffer, n: int, window: int) -> CandleFrame:
+    """Колонки в общем блоке памяти: timestamp (int64), затем 5 колонок float64, каждая (n, window)."""
+    size = n * window
+    return CandleFrame(*(np.ndarray((n, window), dtype=np.int64 if k == 0 else np.float64,
+                                    buffer=buffer, offset=k * size * 8)
+                         for k in range(len(FRAME_COLUMNS))))
+
+def _detect_local(symbols: list, matrices: CandleFrame, short: dict, timeframe_ms: int):
+    """
+    Детекция в текущем процессе: матрица для полных окон, реестр по символам для коротких.
+    Возвращает (найденные паттерны, {детектор: время в сек.}) - так же, как задачи воркеров.
+    """
+    timings = {}
+    found = detector_registry.run_batch(symbols, matrices, timeframe_ms, timings) if symbols else {}
+    found.update(_detect_short(short, timeframe_ms, timings)[0])
+    return found, timings
+
+def _detect_shared(shm_name: str, n: int, window: int, start: int, stop: int, symbols: list, timeframe_ms: int):
+    """Задача воркера: строки [start, stop) матриц из общей памяти (без копирования и pickle свечей)."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        matrices = _matrix_views(shm.buf, n, window)
+        rows = matrices[start:stop]
+        del matrices
+        timings = {}
+        found = detector_registry.run_batch(symbols, rows, timeframe_ms, timings)
+        del rows
+        return found, timings
+    finally:
+        shm.close()
+
+def _detect_short(short: dict, timeframe_ms: int, timings: dict = None):
+    """Задача воркера: символы с неполным окном - по одному через реестр."""
+    timings = {} if timings is None else timings
+    found = {symbol: hits for symbol, frame in short.items()
+             if (hits := detector_registry.run(symbol, frame, timeframe_ms, timings))}
+    return found, timings
+
+def _warm_worker():
+    """Инициализация воркера: модули детекторов уже импортированы, прогреваем numpy на маленькой матрице."""
+    after_fork()
+    detector_registry.run_batch([], CandleFrame(*(np.empty((0, BATCH_WINDOW)) for _ in FRAME_COLUMNS)))
+
+class DetectionExecutor:
+    """
+    Стадия детекции вне event loop.
+    Свечи символов упаковываются в общие матрицы (multiprocessing.shared_memory), воркеры
+    ProcessPoolExecutor считают пакетные детекторы по своим диапазонам строк и возвращают
+    только найденные паттерны. Небольшие наборы символов считаются в потоке (asyncio.to_thread).
+    """
+
+    def __init__(self, workers: int = DETECTION_WORKERS, pool_min_symbols: int = DETECTION_POOL_MIN_SYMBOLS,
+                 chunk_symbols: int = DETECTION_CHUNK_SYMBOLS):
+        self.workers = workers
+        self.pool_min_symbols = pool_min_symbols
+        self.chunk_symbols = chunk_symbols
+        self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+        return self._pool
+
+    async def detect(self, frames: dict, timeframe_ms: int = 60 * 1000) -> dict:
+        """
+        frames - {символ: CandleFrame или None}, timeframe_ms - длительность их свечей.
+        Возвращает {символ: {имя детектора: детали}} только для символов с найденными паттернами
+        (порядок - как в frames).
+        frames обычно - срезы кольцевых буферов, которые event loop перезаписывает на месте. Поэтому свечи
+        копируются (в матрицы или общую память) здесь, на event loop, до передачи в поток или процессы.
+        """
+        full = {s: f for s, f in frames.items() if f is not None and len(f) >= BATCH_WINDOW}
+        short = {s: f.copy() for s, f in frames.items() if f is not None and 0 < len(f) < BATCH_WINDOW}
+        if self.workers <= 1 or len(full) < self.pool_min_symbols:
+            found, timings = await self._detect_in_thread(full, short, timeframe_ms)
+        else:
+            try:
+                found, timings = await self._detect_in_pool(full, short, timeframe_ms)
+            except BrokenProcessPool as e:
+                logger.warning("Пул детекции сломан (%s). Пересоздаю, текущий цикл считается в потоке.", e)
+                self.shutdown(wait=False)
+                found, timings = await self._detect_in_thread(full, short, timeframe_ms)
+        # Время детектора - суммарное по всем задачам (процессорное время стадии, а не длительность ожидания)
+        for name, seconds in timings.items():
+            DETECTOR_SECONDS.observe(seconds, pattern=name)
+        return {s: found[s] for s in frames if s in found}
+
+    async def _detect_in_thread(self, full: dict, short: dict, timeframe_ms: int):
+        matrices = _stack_frames(list(full.values()), BATCH_WINDOW) if full else None # Копия на event loop
+        return await asyncio.to_thread(_detect_local, list(full), matrices, short, timeframe_ms)
+
+    async def _detect_in_pool(self, full: dict, short: dict, timeframe_ms: int) -> dict:
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        symbols = list(full)
+        n, window = len(symbols), BATCH_WINDOW
+        shm = shared_memory.SharedMemory(create=True, size=n * window * 8 * len(FRAME_COLUMNS))
+        try:
+            matrices = _matrix_views(shm.buf, n, window)
+            for row, symbol in enumerate(symbols):
+                tail = full[symbol].tail(window)
+                for name in FRAME_COLUMNS:
+                    getattr(matrices, name)[row] = getattr(tail, name)
+            del matrices, tail
+            tasks = [loop.run_in_executor(pool, _detect_shared, shm.name, n, window, start,
+                                          min(start + self.chunk_symbols, n), symbols[start:start + self.chunk_symbols],
+                                          timeframe_ms)
+                     for start in range(0, n, self.chunk_symbols)]
+            if short:
+                tasks.append(loop.run_in_executor(pool, _detect_short, short, timeframe_ms))
+            found, timings = {}, {}
+            for part, part_timings in await asyncio.gather(*tasks):
+                found.update(part)
+                for name, seconds in part_timings.items():
+                    timings[name] = timings.get(name, 0.0) + seconds
+            return found, timings
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self, wait: bool = True):
+        """Останавливает процессы пула (вызывается при остановке сканера/бота)."""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
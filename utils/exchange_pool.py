@@ -0,0 +1,105 @@
+# exchange_pool.py
+import asyncio
+import contextlib
+import logging
+import os
+import aiohttp
+import ccxt.async_support as ccxt_async
+
+from utils.market_cache import load_markets_cached # Рынки берутся из кэша, если он свежий
+
+# --- НАСТРОЙКИ ПУЛА СОЕДИНЕНИЙ ---
+POOL_MAX_CONNECTIONS = 100          # Общий лимит одновременных TCP-соединений
+POOL_MAX_CONNECTIONS_PER_HOST = 50  # Лимит соединений к одному хосту (api.mexc.com)
+POOL_KEEPALIVE_SECONDS = 60         # Сколько держать простаивающее соединение открытым
+POOL_DNS_CACHE_SECONDS = 300        # Кэш DNS-ответов
+EXCHANGE_TIMEOUT_MS = 15000         # Таймаут одного HTTP-запроса ccxt
+# Адрес REST API можно подменить (например, на локальный utils/fake_mexc_server.py)
+MEXC_API_URL = os.getenv('MEXC_API_URL')
+MEXC_DEFAULT_API_URL = 'https://api.mexc.com'
+# ---------------------------------
+
+logger = logging.getLogger(__name__)
+
+# Единственный экземпляр биржи на процесс (создается лениво)
+_exchange = None
+_session = None
+_loop = None
+_lock = None
+
+def _build_session() -> aiohttp.ClientSession:
+    """Создает aiohttp-сессию с пулом keep-alive соединений."""
+    connector = aiohttp.TCPConnector(
+        limit=POOL_MAX_CONNECTIONS,
+        limit_per_host=POOL_MAX_CONNECTIONS_PER_HOST,
+        keepalive_timeout=POOL_KEEPALIVE_SECONDS,
+        ttl_dns_cache=POOL_DNS_CACHE_SECONDS,
+        enable_cleanup_closed=True,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+def override_api_url(exchange, base_url: str):
+    """Переписывает адреса REST API MEXC (спот и контракты) на base_url."""
+    base_url = base_url.rstrip('/')
+    for section in exchange.urls['api'].values():
+        if not isinstance(section, dict): continue
+        for access, url in section.items():
+            if isinstance(url, str) and url.startswith(MEXC_DEFAULT_API_URL):
+                section[access] = base_url + url[len(MEXC_DEFAULT_API_URL):]
+
+async def get_exchange() -> ccxt_async.Exchange:
+    """
+    Возвращает общий (долгоживущий) экземпляр ccxt MEXC с загруженными рынками.
+    Соединения переиспользуются всеми вызывающими: сканером, поиском символов и графиками.
+    Закрывать возвращенный объект НЕ нужно - для этого есть close_exchange().
+    """
+    global _exchange, _session, _loop, _lock
+    loop = asyncio.get_running_loop()
+
+    if _loop is not loop:
+        # Пул был создан в другом event loop (например, после asyncio.run) - он уже непригоден
+        if _exchange is not None:
+            logger.warning("Пул соединений MEXC привязан к другому event loop. Создаю заново.")
+        _exchange, _session, _loop, _lock = None, None, loop, asyncio.Lock()
+
+    if _exchange is not None and _exchange.markets:
+        return _exchange
+
+    async with _lock:
+        if _exchange is None:
+            _session = _build_session()
+            _exchange = ccxt_async.mexc({
+                'options': {'defaultType': 'spot'},
+                'session': _session,
+                'timeout': EXCHANGE_TIMEOUT_MS,
+            })
+            if MEXC_API_URL:
+                override_api_url(_exchange, MEXC_API_URL)
+                logger.info("Пул MEXC: REST API подменен на %s", MEXC_API_URL)
+        if not _exchange.markets:
+            logger.info("Пул MEXC: загрузка рынков (один раз на процесс)...")
+            await load_markets_cached(_exchange)
+            logger.info("Пул MEXC: загружено %d рынков.", len(_exchange.markets))
+    return _exchange
+
+async def close_exchange():
+    """Закрывает общий экземпляр биржи и его HTTP-сессию (вызывается при остановке бота)."""
+    global _exchange, _session, _loop, _lock
+    exchange, session = _exchange, _session
+    _exchange, _session, _loop, _lock = None, None, None, None
+    if exchange is not None:
+        try: await exchange.close()
+        except Exception as e: logger.error("Ошибка при закрытии биржи MEXC: %s", e)
+    if session is not None and not session.closed:
+        try: await session.close()
+        except Exception as e: logger.error("Ошибка при закрытии HTTP-сессии MEXC: %s", e)
+    if exchange is not None:
+        logger.info("Пул соединений MEXC закрыт.")
+
+@contextlib.asynccontextmanager
+async def exchange_session():
+    """Контекст для скриптов: отдает общий экземпляр биржи и гарантированно закрывает пул."""
+    try:
+        yield await get_exchange()
+    finally:
+        await close_exchange()
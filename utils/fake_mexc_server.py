@@ -0,0 +1,222 @@
+# fake_mexc_server.py
+# Локальная замена REST API MEXC для нагрузочных проверок сканера без биржи.
+# Запуск: python -m utils.fake_mexc_server --symbols 5000 --latency 0.05 --error-rate 0.01 --rate-limit 200
+# Затем: MEXC_API_URL=http://127.0.0.1:8766 python main.py
+# Счетчики запросов/ошибок/429 и пик одновременных запросов: GET /_stats
+import argparse
+import asyncio
+import random
+import time
+import numpy as np
+from aiohttp import web
+
+# --- НАСТРОЙКИ ---
+FAKE_HOST = '127.0.0.1'
+FAKE_PORT = 8766
+FAKE_SYMBOLS = 2000          # Количество спотовых пар к USDT
+FAKE_SEED = 42
+FAKE_LATENCY_SECONDS = 0.0   # Задержка каждого ответа
+FAKE_JITTER_SECONDS = 0.0    # Случайная добавка к задержке (0..jitter)
+FAKE_ERROR_RATE = 0.0        # Доля ответов 503 (ccxt: ExchangeNotAvailable)
+FAKE_RATE_LIMIT = 0.0        # Запросов в секунду до ответа 429 (0 - без лимита)
+FAKE_KLINES_MAX_LIMIT = 1000 # Как у MEXC: не больше 1000 свечей за запрос
+# -----------------
+
+# Интервалы klines MEXC -> миллисекунды (ccxt переводит '1h' в '60m', '1w' в '1W')
+KLINE_INTERVALS = {'1m': 60_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000, '60m': 3_600_000,
+                   '4h': 14_400_000, '1d': 86_400_000, '1W': 604_800_000}
+_MASK = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+def _hash_uniform(keys: np.ndarray) -> np.ndarray:
+    """splitmix64: uint64-ключи -> псевдослучайные числа [0, 1). Без состояния, одинаково в любом порядке."""
+    with np.errstate(over='ignore'):
+        z = keys.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = (z ^ (z >> np.uint64(31))) & _MASK
+    return (z >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+class FakeMarket:
+    """
+    Синтетический рынок: цена символа - детерминированная функция (символ, минута), поэтому
+    сервер не хранит свечи и отдает одинаковые данные на любые окна и повторные запросы.
+    Цена колеблется вокруг базовой с периодом и амплитудой символа плюс шум.
+    """
+
+    def __init__(self, n_symbols: int = FAKE_SYMBOLS, seed: int = FAKE_SEED):
+        self.seed = seed
+        self.market_ids = [f"FAKE{i:05d}USDT" for i in range(n_symbols)]
+        self.index = {market_id: i for i, market_id in enumerate(self.market_ids)}
+        u = _hash_uniform(np.arange(n_symbols, dtype=np.uint64) * np.uint64(4) + np.uint64(seed << 32))
+        v = _hash_uniform(np.arange(n_symbols, dtype=np.uint64) * np.uint64(4) + np.uint64((seed << 32) + 1))
+        self.base_price = 10 ** (-8 + 9 * u)      # От 1e-8 до 10: часть пар проходит ценовой фильтр сканера
+        self.amplitude = 0.001 + 0.02 * v         # Амплитуда колебаний
+        self.period = 5 + np.floor(120 * (1 - v)) # Период колебаний (минут)
+
+    def prices(self, i: int, minutes: np.ndarray, salt: int = 0) -> np.ndarray:
+        noise = _hash_uniform(minutes.astype(np.uint64) * np.uint64(1_000_003) + np.uint64(i * 7919 + salt + self.seed))
+        wave = self.amplitude[i] * np.sin(2 * np.pi * minutes / self.period[i])
+        return self.base_price[i] * (1 + wave + 0.004 * (noise - 0.5))
+
+    def klines(self, i: int, interval_ms: int, starts: np.ndarray) -> list:
+        """Свечи с началами starts в формате /api/v3/klines (цены и объемы строками)."""
+        step = interval_ms // 60_000
+        first = starts // 60_000
+        open_ = self.prices(i, first - 1)
+        close = self.prices(i, first + step - 1)
+        wick = 1 + 0.003 * _hash_uniform(first.astype(np.uint64) + np.uint64(i * 31 + 17))
+        high = np.maximum(open_, close) * wick
+        low = np.minimum(open_, close) / wick
+        volume = 1000 * step * (0.5 + _hash_uniform(first.astype(np.uint64) * np.uint64(3) + np.uint64(i)))
+        return [[int(t), f"{o:.10g}", f"{h:.10g}", f"{l:.10g}", f"{c:.10g}", f"{v:.2f}", int(t) + interval_ms - 1,
+                 f"{v * c:.4f}"]
+                for t, o, h, l, c, v in zip(starts, open_, high, low, close, volume)]
+
+    def ticker(self, i: int, now_ms: int) -> dict:
+        minute = now_ms // 60_000
+        day = np.arange(minute - 1439, minute + 1)
+        prices = self.prices(i, day)
+        last, first = prices[-1], prices[0]
+        volume = float(1000 * 1440 * (0.5 + _hash_uniform(np.array([minute // 60 + i]))[0]))
+        return {
+            'symbol': self.market_ids[i], 'priceChange': f"{last - first:.10g}",
+            'priceChangePercent': f"{(last - first) / first:.6f}", 'prevClosePrice': f"{first:.10g}",
+            'lastPrice': f"{last:.10g}", 'bidPrice': f"{last * 0.9995:.10g}", 'bidQty': '100',
+            'askPrice': f"{last * 1.0005:.10g}", 'askQty': '100', 'openPrice': f"{first:.10g}",
+            'highPrice': f"{prices.max():.10g}", 'lowPrice': f"{prices.min():.10g}",
+            'volume': f"{volume:.2f}", 'quoteVolume': f"{volume * last:.4f}",
+            'openTime': int((minute - 1439) * 60_000), 'closeTime': int(now_ms), 'count': None,
+        }
+
+    def exchange_info(self, now_ms: int) -> dict:
+        symbols = [{
+            'symbol': market_id, 'status': '1', 'baseAsset': market_id[:-4], 'quoteAsset': 'USDT',
+            'baseAssetPrecision': '2', 'quoteAssetPrecision': '10', 'baseSizePrecision': '0',
+            'quoteAmountPrecision': '1', 'maxQuoteAmount': '2000000', 'makerCommission': '0',
+            'takerCommission': '0.0005', 'isSpotTradingAllowed': True, 'isMarginTradingAllowed': False,
+            'permissions': ['SPOT'], 'orderTypes': ['LIMIT', 'MARKET'], 'filters': [],
+        } for market_id in self.market_ids]
+        return {'timezone': 'CST', 'serverTime': now_ms, 'rateLimits': [], 'exchangeFilters': [], 'symbols': symbols}
+
+class FaultStats:
+    """Счетчики сервера (отдаются на /_stats)."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.requests = {}   # путь -> количество
+        self.statuses = {}   # HTTP-статус -> количество
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def as_dict(self) -> dict:
+        elapsed = time.time() - self.started_at
+        total = sum(self.requests.values())
+        return {'uptime_sec': round(elapsed, 1), 'requests': self.requests, 'statuses': self.statuses,
+                'requests_per_sec': round(total / elapsed, 1) if elapsed else None,
+                'in_flight': self.in_flight, 'max_in_flight': self.max_in_flight}
+
+def create_app(market: FakeMarket, latency: float = FAKE_LATENCY_SECONDS, jitter: float = FAKE_JITTER_SECONDS,
+               error_rate: float = FAKE_ERROR_RATE, rate_limit: float = FAKE_RATE_LIMIT) -> web.Application:
+    stats = FaultStats()
+    bucket = {'tokens': rate_limit, 'updated': time.monotonic()} # Token bucket на rate_limit запросов/сек
+
+    def now_ms() -> int:
+        return int(time.time() * 1000)
+
+    def rate_limited() -> bool:
+        if rate_limit <= 0: return False
+        now = time.monotonic()
+        bucket['tokens'] = min(rate_limit, bucket['tokens'] + (now - bucket['updated']) * rate_limit)
+        bucket['updated'] = now
+        if bucket['tokens'] < 1: return True
+        bucket['tokens'] -= 1
+        return False
+
+    @web.middleware
+    async def faults(request, handler):
+        """Задержка, 429 и случайные 503 - для всех эндпоинтов биржи (кроме /_stats)."""
+        if request.path == '/_stats':
+            return await handler(request)
+        stats.requests[request.path] = stats.requests.get(request.path, 0) + 1
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        try:
+            if latency or jitter:
+                await asyncio.sleep(latency + random.random() * jitter)
+            if rate_limited():
+                response = web.json_response({'code': 429, 'msg': 'Too Many Requests'}, status=429)
+            elif error_rate and random.random() < error_rate:
+                response = web.json_response({'code': 503, 'msg': 'Service Unavailable'}, status=503)
+            else:
+                response = await handler(request)
+        finally:
+            stats.in_flight -= 1
+        stats.statuses[response.status] = stats.statuses.get(response.status, 0) + 1
+        return response
+
+    def bad_request(msg: str):
+        return web.json_response({'code': -1121, 'msg': msg}, status=400)
+
+    async def handle_ping(request):
+        return web.json_response({})
+
+    async def handle_time(request):
+        return web.json_response({'serverTime': now_ms()})
+
+    async def handle_exchange_info(request):
+        return web.json_response(market.exchange_info(now_ms()))
+
+    async def handle_contract_detail(request):
+        # Фьючерсы сканеру не нужны, но ccxt загружает их вместе со спотом
+        return web.json_response({'success': True, 'code': 0, 'data': []})
+
+    async def handle_ticker_24hr(request):
+        now = now_ms()
+        market_id = request.query.get('symbol')
+        if market_id:
+            if market_id not in market.index: return bad_request('Invalid symbol.')
+            return web.json_response(market.ticker(market.index[market_id], now))
+        return web.json_response([market.ticker(i, now) for i in range(len(market.market_ids))])
+
+    async def handle_klines(request):
+        query = request.query
+        i = market.index.get(query.get('symbol'))
+        if i is None: return bad_request('Invalid symbol.')
+        interval_ms = KLINE_INTERVALS.get(query.get('interval'))
+        if interval_ms is None: return bad_request('Invalid interval.')
+        limit = min(int(query.get('limit', 500)), FAKE_KLINES_MAX_LIMIT)
+        current = now_ms() // interval_ms * interval_ms # Текущая (формирующаяся) свеча тоже отдается
+        end = min(current, int(query['endTime']) // interval_ms * interval_ms) if 'endTime' in query else current
+        if 'startTime' in query:
+            start = -(-int(query['startTime']) // interval_ms) * interval_ms
+            starts = np.arange(start, min(end, start + (limit - 1) * interval_ms) + 1, interval_ms, dtype=np.int64)
+        else:
+            starts = np.arange(end - (limit - 1) * interval_ms, end + 1, interval_ms, dtype=np.int64)
+        return web.json_response(market.klines(i, interval_ms, starts))
+
+    async def handle_stats(request):
+        return web.json_response(stats.as_dict())
+
+    app = web.Application(middlewares=[faults])
+    app.router.add_get('/api/v3/ping', handle_ping)
+    app.router.add_get('/api/v3/time', handle_time)
+    app.router.add_get('/api/v3/exchangeInfo', handle_exchange_info)
+    app.router.add_get('/api/v3/ticker/24hr', handle_ticker_24hr)
+    app.router.add_get('/api/v3/klines', handle_klines)
+    app.router.add_get('/api/v1/contract/detail', handle_contract_detail)
+    app.router.add_get('/_stats', handle_stats)
+    return app
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Локальный фейковый REST API MEXC (рынки, тикеры, свечи)')
+    parser.add_argument('--host', default=FAKE_HOST)
+    parser.add_argument('--port', type=int, default=FAKE_PORT)
+    parser.add_argument('--symbols', type=int, default=FAKE_SYMBOLS, help='Количество пар к USDT')
+    parser.add_argument('--seed', type=int, default=FAKE_SEED)
+    parser.add_argument('--latency', type=float, default=FAKE_LATENCY_SECONDS, help='Задержка ответа (сек)')
+    parser.add_argument('--jitter', type=float, default=FAKE_JITTER_SECONDS, help='Случайная добавка к задержке (сек)')
+    parser.add_argument('--error-rate', type=float, default=FAKE_ERROR_RATE, help='Доля ответов 503')
+    parser.add_argument('--rate-limit', type=float, default=FAKE_RATE_LIMIT, help='Запросов/сек до ответов 429 (0 - без лимита)')
+    args = parser.parse_args()
+    app = create_app(FakeMarket(args.symbols, args.seed), args.latency, args.jitter, args.error_rate, args.rate_limit)
+    web.run_app(app, host=args.host, port=args.port)
@@ -0,0 +1,176 @@
+# fetch_scheduler.py
+import asyncio
+import logging
+import time
+import ccxt # Для типов ошибок
+
+from utils.log import cycle_errors # Сводка ошибок запросов за цикл (и метрики по типу исключения)
+
+# --- НАСТРОЙКИ ПЛАНИРОВЩИКА ЗАПРОСОВ ---
+# Пополнение "бюджета" веса запросов в секунду. Один символ - один запрос свечей (вес 1), поэтому
+# за интервал сканирования успевает не больше WEIGHT_PER_SECOND * интервал + BURST символов:
+# при 20/сек и интервале 60 сек - около 1240. Лимит MEXC на REST - 500 запросов за 10 сек. на IP
+# (ccxt: rateLimit 50 мс), значение выбрано с запасом для бота и поиска символов в том же IP.
+SCHEDULER_WEIGHT_PER_SECOND = 20.0
+SCHEDULER_BURST_WEIGHT = 40.0       # Максимальный накопленный бюджет (всплеск)
+SCHEDULER_MAX_CONCURRENCY = 16      # Сколько запросов одновременно "в полете"
+SCHEDULER_MAX_RETRIES = 3           # Сколько раз повторять запрос символа перед отказом
+SCHEDULER_RETRY_BASE_DELAY = 1.0    # Базовая задержка повтора (сек), растет экспоненциально
+SCHEDULER_RATE_LIMIT_PAUSE = 10.0   # Пауза всего планировщика после ответа 429 / RateLimitExceeded
+# ----------------------------------------
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых запрос имеет смысл повторить
+RETRYABLE_ERRORS = (ccxt.RateLimitExceeded, ccxt.DDoSProtection, ccxt.RequestTimeout, ccxt.NetworkError)
+
+class TokenBucket:
+    """Ограничитель по весу запросов: бюджет пополняется со скоростью rate в секунду."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0 # Момент, до которого выдача запрещена (после 429)
+        self._lock = None
+        self._loop = None
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def penalize(self, seconds: float):
+        """Запрещает выдачу бюджета на seconds секунд и обнуляет накопленный запас."""
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0.0
+        self.updated_at = max(self.updated_at, self.blocked_until)
+
+    async def acquire(self, weight: float = 1.0):
+        """Ждет, пока в бюджете появится weight, и списывает его. Очередь обслуживается по порядку."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop: # Lock привязан к event loop - пересоздаем при смене loop
+            self._lock, self._loop = asyncio.Lock(), loop
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                await asyncio.sleep((weight - self.tokens) / self.rate)
+
+class SchedulerStats:
+    """Статистика одного прогона планировщика (одного цикла сканирования)."""
+
+    def __init__(self):
+        self.sent = 0       # Отправлено запросов (включая повторы)
+        self.throttled = 0  # Получено ответов RateLimitExceeded / DDoSProtection
+        self.retried = 0    # Поставлено в очередь повторов
+        self.dropped = 0    # Символов, так и не получивших данные (ошибка или пустой/невалидный ответ)
+        self.duration = 0.0
+
+    def as_dict(self) -> dict:
+        return {'sent': self.sent, 'throttled': self.throttled, 'retried': self.retried,
+                'dropped': self.dropped, 'duration_sec': round(self.duration, 2)}
+
+    def __str__(self):
+        return (f"отправлено {self.sent}, троттлинг {self.throttled}, "
+                f"повторов {self.retried}, потеряно {self.dropped}, {self.duration:.2f} сек.")
+
+class FetchScheduler:
+    """
+    Планировщик REST-запросов по символам: ограничение веса (token bucket),
+    ограниченное число параллельных запросов и очередь повторов,
+    которая уважает паузу после RateLimitExceeded.
+    """
+
+    def __init__(self, weight_per_second: float = SCHEDULER_WEIGHT_PER_SECOND,
+                 burst_weight: float = SCHEDULER_BURST_WEIGHT,
+                 max_concurrency: int = SCHEDULER_MAX_CONCURRENCY,
+                 max_retries: int = SCHEDULER_MAX_RETRIES):
+        self.bucket = TokenBucket(weight_per_second, burst_weight)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.last_stats = None
+
+    def min_duration(self, n_symbols: int, weight: float = 1.0) -> float:
+        """Минимальное время (сек.) на n_symbols запросов при текущем лимите веса (без повторов)."""
+        return max(0.0, n_symbols * weight - self.bucket.capacity) / self.bucket.rate
+
+    def max_symbols(self, seconds: float, weight: float = 1.0) -> int:
+        """Сколько символов успевает пройти за seconds секунд при текущем лимите веса."""
+        return int((self.bucket.rate * seconds + self.bucket.capacity) / weight)
+
+    async def run(self, symbols: list, request, weight: float = 1.0):
+        """
+        Выполняет request(symbol) для каждого символа с учетом лимитов.
+        request - корутина-функция, бросающая исключения ccxt при ошибках (None - данных нет, символ потерян).
+        Возвращает (dict {symbol: результат}, SchedulerStats). Потерянные символы в словарь не попадают.
+        """
+        stats = SchedulerStats()
+        results = {}
+        if not symbols:
+            self.last_stats = stats
+            return results, stats
+
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        for symbol in symbols:
+            queue.put_nowait((symbol, 0))
+
+        def requeue(item):
+            # Повтор возвращается в очередь до того, как исходный элемент будет помечен выполненным,
+            # поэтому queue.join() не завершится раньше времени
+            queue.put_nowait(item)
+            queue.task_done()
+
+        async def worker():
+            while True:
+                symbol, attempt = await queue.get()
+                retry_delay = None
+                try:
+                    await self.bucket.acquire(weight)
+                    stats.sent += 1
+                    result = await request(symbol)
+                    if result is None:
+                        # Ответ отклонен проверкой свечей (validate_ohlcv) - данных по символу нет
+                        stats.dropped += 1
+                    else:
+                        results[symbol] = result
+                except RETRYABLE_ERRORS as e:
+                    cycle_errors.add('fetch', e, symbol)
+                    if isinstance(e, (ccxt.RateLimitExceeded, ccxt.DDoSProtection)):
+                        stats.throttled += 1
+                        self.bucket.penalize(SCHEDULER_RATE_LIMIT_PAUSE)
+                    if attempt < self.max_retries:
+                        stats.retried += 1
+                        retry_delay = SCHEDULER_RETRY_BASE_DELAY * (2 ** attempt)
+                    else:
+                        stats.dropped += 1
+                        logger.debug("Планировщик: %s пропущен после %d попыток (%s: %s).", symbol, attempt + 1, type(e).__name__, e)
+                except Exception as e:
+                    # Неповторяемая ошибка (неверный символ, ошибка биржи и т.п.)
+                    cycle_errors.add('fetch', e, symbol)
+                    stats.dropped += 1
+                    logger.debug("Планировщик: %s пропущен (%s: %s).", symbol, type(e).__name__, e)
+                if retry_delay is not None:
+                    loop.call_later(retry_delay, requeue, (symbol, attempt + 1))
+                else:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.max_concurrency, len(symbols)))]
+        try:
+            await queue.join()
+        finally:
+            for w in workers: w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        stats.duration = time.monotonic() - started
+        self.last_stats = stats
+        return results, stats
@@ -0,0 +1,130 @@
+# kline_stream.py
+import asyncio
+import logging
+import os
+import time
+import ccxt.pro as ccxt_pro
+from utils.resample import timeframe_to_ms
+
+# --- НАСТРОЙКИ ПОТОКА СВЕЧЕЙ (WebSocket) ---
+STREAM_SYMBOLS_PER_CONNECTION = 30  # MEXC допускает не более 30 подписок на одно соединение
+STREAM_CLOSE_GRACE_SECONDS = 3      # Через сколько секунд после конца минуты считать свечу закрытой без новых данных
+STREAM_RECONNECT_BASE_DELAY = 1.0   # Начальная задержка переподключения (сек)
+STREAM_RECONNECT_MAX_DELAY = 30.0   # Максимальная задержка переподключения (сек)
+STREAM_ERROR_PRINT_INTERVAL = 10.0  # Не чаще одного сообщения об ошибке соединения за интервал
+# Адрес WebSocket можно подменить (например, на локальный replay-сервер)
+STREAM_URL = os.getenv('MEXC_WS_URL')
+# --------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+class KlineStream:
+    """
+    Потоковое получение свечей MEXC через WebSocket (ccxt.pro).
+    Символы распределяются по соединениям (до STREAM_SYMBOLS_PER_CONNECTION на каждое).
+    При разрыве подписка восстанавливается автоматически с экспоненциальной задержкой.
+    Для каждой ЗАКРЫТОЙ свечи вызывается on_closed(symbol, candle).
+    """
+
+    def __init__(self, symbols: list, timeframe: str, on_closed, markets_from=None, url: str = STREAM_URL):
+        self.symbols = list(symbols)
+        self.timeframe = timeframe
+        self.timeframe_ms = timeframe_to_ms(timeframe)
+        self.on_closed = on_closed
+        self.markets_from = markets_from # REST-экземпляр с уже загруженными рынками
+        self.url = url
+        self.exchanges = []
+        self._pending = {}   # symbol -> последняя (еще не закрытая) свеча
+        self._closed_ts = {} # symbol -> таймстемп последней отданной закрытой свечи
+        self._last_error_print = 0.0
+        self._tasks = []
+        # Статистика
+        self.connections = 0
+        self.reconnects = 0
+        self.candles_closed = 0
+
+    def _new_exchange(self):
+        exchange = ccxt_pro.mexc({'options': {'defaultType': 'spot'}})
+        if self.url:
+            exchange.urls['api']['ws']['spot'] = self.url
+        if self.markets_from is not None and self.markets_from.markets:
+            exchange.set_markets_from_exchange(self.markets_from)
+        return exchange
+
+    async def run(self):
+        """Запускает подписки и работает до отмены задачи или вызова stop()."""
+        shards = [self.symbols[i:i + STREAM_SYMBOLS_PER_CONNECTION]
+                  for i in range(0, len(self.symbols), STREAM_SYMBOLS_PER_CONNECTION)]
+        logger.info("Поток свечей: %d символов, %d соединений [%s].", len(self.symbols), len(shards), self.timeframe)
+        try:
+            for shard in shards:
+                exchange = self._new_exchange()
+                self.exchanges.append(exchange)
+                self.connections += 1
+                if not exchange.markets:
+                    await exchange.load_markets()
+                for symbol in shard:
+                    self._tasks.append(asyncio.create_task(self._watch_symbol(exchange, symbol)))
+            self._tasks.append(asyncio.create_task(self._close_by_timer()))
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        exchanges, self.exchanges = self.exchanges, []
+        for exchange in exchanges:
+            try: await exchange.close()
+            except Exception: pass
+
+    async def _watch_symbol(self, exchange, symbol: str):
+        delay = STREAM_RECONNECT_BASE_DELAY
+        while True:
+            try:
+                updates = await exchange.watch_ohlcv(symbol, self.timeframe)
+                delay = STREAM_RECONNECT_BASE_DELAY
+                await self._handle_updates(symbol, updates)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Следующий вызов watch_ohlcv сам переоткроет соединение и переподпишется
+                self.reconnects += 1
+                now = time.monotonic()
+                if now - self._last_error_print > STREAM_ERROR_PRINT_INTERVAL:
+                    self._last_error_print = now
+                    logger.warning("Поток свечей: ошибка соединения (%s: %s). Переподключение через %.0f сек...", type(e).__name__, e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, STREAM_RECONNECT_MAX_DELAY)
+
+    async def _handle_updates(self, symbol: str, updates: list):
+        for candle in sorted(updates, key=lambda c: c[0]):
+            pending = self._pending.get(symbol)
+            if pending is None or candle[0] == pending[0]:
+                self._pending[symbol] = candle
+            elif candle[0] > pending[0]:
+                # Началась новая свеча - предыдущая закрыта
+                self._pending[symbol] = candle
+                await self._emit(symbol, pending)
+
+    async def _close_by_timer(self):
+        """Закрывает свечи неликвидных символов, по которым после конца минуты не пришло обновлений."""
+        grace_ms = STREAM_CLOSE_GRACE_SECONDS * 1000
+        while True:
+            await asyncio.sleep(1)
+            now_ms = int(time.time() * 1000)
+            for symbol, candle in list(self._pending.items()):
+                if candle[0] + self.timeframe_ms + grace_ms <= now_ms:
+                    await self._emit(symbol, candle)
+
+    async def _emit(self, symbol: str, candle: list):
+        if candle[0] <= self._closed_ts.get(symbol, -1):
+            return # Уже отдана (например, закрыта по таймеру)
+        self._closed_ts[symbol] = candle[0]
+        self.candles_closed += 1
+        try:
+            await self.on_closed(symbol, candle)
+        except Exception as e:
+            logger.error("Поток свечей: ошибка обработки закрытой свечи %s: %s", symbol, e)
@@ -0,0 +1,121 @@
+# log.py
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+from utils.metrics import record_error
+
+# --- НАСТРОЙКИ ЛОГИРОВАНИЯ ---
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FILE = os.getenv('LOG_FILE')          # Дополнительно писать в файл (с ротацией)
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUPS = 5
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+LOG_QUEUE_SIZE = 10000                    # Переполнение очереди - запись отбрасывается, поток не ждет
+ERROR_SAMPLE_LENGTH = 200                 # Длина примера сообщения в сводке ошибок цикла
+# ------------------------------
+
+logger = logging.getLogger(__name__)
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который при переполнении очереди не блокирует вызывающего, а считает потери."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener = None
+_handler = None
+_listener_pid = None
+_setup_lock = threading.Lock()
+
+def setup_logging(level: str = LOG_LEVEL, log_file: str = LOG_FILE):
+    """
+    Настраивает корневой логгер: записи кладутся в ограниченную очередь (QueueHandler),
+    а форматирование и вывод в stdout/файл выполняет фоновый поток QueueListener.
+    Повторный вызов в том же процессе ничего не делает; в дочернем процессе (fork) - пересоздает
+    очередь и поток, иначе записи копились бы в очереди без читателя.
+    """
+    global _listener, _handler, _listener_pid
+    with _setup_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            return
+        root = logging.getLogger()
+        if _handler is not None:
+            root.removeHandler(_handler)
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers = [logging.StreamHandler(sys.stdout)]
+        if log_file:
+            handlers.append(logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding='utf-8'))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        log_queue = queue.Queue(LOG_QUEUE_SIZE)
+        _handler = _DroppingQueueHandler(log_queue)
+        root.addHandler(_handler)
+        root.setLevel(level)
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        _listener_pid = os.getpid()
+        atexit.register(stop_logging)
+
+def after_fork():
+    """
+    Вызывается в дочернем процессе (воркеры пула): если родитель настроил логирование,
+    поднимает в процессе свою очередь и фоновый поток с тем же уровнем.
+    """
+    if _listener is not None and _listener_pid != os.getpid():
+        setup_logging(logging.getLogger().level)
+
+def stop_logging():
+    """Дописывает накопленные записи и останавливает фоновый поток (вызывается и при выходе)."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None and _listener_pid == os.getpid():
+        listener.stop()
+        if _handler is not None and _handler.dropped:
+            sys.stderr.write(f"Логирование: отброшено {_handler.dropped} записей из-за переполнения очереди\n")
+
+class ErrorAggregator:
+    """
+    Сводка повторяющихся ошибок за цикл: вместо сотен строк - одна "fetch: NetworkError ×143".
+    add() также учитывает ошибку в метриках, flush() пишет сводку и обнуляет счетчики.
+    """
+
+    def __init__(self):
+        self._counts = {}  # (стадия, тип ошибки) -> [количество, пример]
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, error: BaseException, symbol: str = None):
+        record_error(stage, error)
+        key = (stage, type(error).__name__)
+        with self._lock:
+            item = self._counts.get(key)
+            if item is None:
+                sample = f"{symbol}: {error}" if symbol else str(error)
+                self._counts[key] = [1, sample[:ERROR_SAMPLE_LENGTH]]
+            else:
+                item[0] += 1
+        logger.debug("Ошибка [%s] %s%s: %s", stage, type(error).__name__, f" {symbol}" if symbol else '', error)
+
+    def flush(self, log: logging.Logger = logger, title: str = "Ошибки цикла"):
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        if not counts:
+            return
+        parts = [f"{stage}: {name} ×{count} (например, {sample})"
+                 for (stage, name), (count, sample) in sorted(counts.items(), key=lambda kv: -kv[1][0])]
+        log.warning("%s: %s", title, '; '.join(parts))
+
+# Ошибки текущего цикла сканирования (сводка пишется в конце цикла)
+cycle_errors = ErrorAggregator()
@@ -0,0 +1,115 @@
+# market_cache.py
+import json
+import logging
+import os
+import time
+
+# --- НАСТРОЙКИ КЭША ---
+MARKETS_CACHE_FILE = 'markets_cache.json' # Файл с сохраненными рынками MEXC
+MARKETS_CACHE_TTL_SECONDS = 12 * 60 * 60  # Метаданные рынков почти не меняются в течение дня
+TICKERS_CACHE_TTL_SECONDS = 30            # Тикеры можно переиспользовать несколько десятков секунд
+# -----------------------
+
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    """Простой кэш в памяти: значение по ключу живет ttl секунд."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._items = {} # key -> (время сохранения, значение)
+
+    def get(self, key, default=None):
+        item = self._items.get(key)
+        if item is None:
+            return default
+        stored_at, value = item
+        if time.monotonic() - stored_at > self.ttl:
+            del self._items[key]
+            return default
+        return value
+
+    def set(self, key, value):
+        self._items[key] = (time.monotonic(), value)
+
+    def age(self, key):
+        """Возраст значения в секундах или None, если его нет."""
+        item = self._items.get(key)
+        return time.monotonic() - item[0] if item else None
+
+    def invalidate(self, key=None):
+        """Сбрасывает одно значение или весь кэш (key=None)."""
+        if key is None: self._items.clear()
+        else: self._items.pop(key, None)
+
+# Кэш тикеров (только в памяти)
+ticker_cache = TTLCache(TICKERS_CACHE_TTL_SECONDS)
+# Атрибут экземпляра биржи с моментом (time.time()) загрузки его рынков: у каждого экземпляра свой
+_LOADED_AT_ATTR = 'markets_loaded_at'
+
+def _api_url(exchange) -> str:
+    """Адрес REST API биржи: рынки другого адреса (например, фейкового сервера) из кэша не берутся."""
+    return exchange.urls['api']['spot']['public']
+
+def _read_markets_file(api_url: str):
+    """Возвращает (время сохранения, рынки) из файла кэша или (None, None)."""
+    try:
+        with open(MARKETS_CACHE_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('api_url', api_url) != api_url:
+            return None, None
+        return float(data['saved_at']), data['markets']
+    except FileNotFoundError:
+        return None, None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning("Кэш рынков поврежден (%s): %s. Будет загружен заново.", MARKETS_CACHE_FILE, e)
+        return None, None
+
+def _write_markets_file(markets: dict, saved_at: float, api_url: str):
+    tmp_path = MARKETS_CACHE_FILE + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'saved_at': saved_at, 'api_url': api_url, 'markets': markets}, f)
+        os.replace(tmp_path, MARKETS_CACHE_FILE)
+    except (OSError, TypeError, ValueError) as e:
+        logger.error("Не удалось сохранить кэш рынков в %s: %s", MARKETS_CACHE_FILE, e)
+
+async def load_markets_cached(exchange) -> dict:
+    """
+    Загружает рынки в экземпляр биржи с учетом кэша:
+    1) рынки уже в памяти и не старше TTL - ничего не делаем;
+    2) свежий файл кэша - берем рынки с диска без запросов к бирже;
+    3) иначе - load_markets(reload=True) и сохраняем результат на диск.
+    Время загрузки хранится в самом экземпляре, поэтому пул, поток и поиск символов не путают свои рынки.
+    """
+    now = time.time()
+    loaded_at = getattr(exchange, _LOADED_AT_ATTR, None)
+    if exchange.markets and loaded_at is not None and now - loaded_at < MARKETS_CACHE_TTL_SECONDS:
+        return exchange.markets
+
+    saved_at, markets = _read_markets_file(_api_url(exchange))
+    if markets and now - saved_at < MARKETS_CACHE_TTL_SECONDS:
+        exchange.set_markets(list(markets.values()))
+        setattr(exchange, _LOADED_AT_ATTR, saved_at)
+        logger.info("Рынки MEXC взяты из кэша (%d шт., возраст %d сек.).", len(exchange.markets), int(now - saved_at))
+        return exchange.markets
+
+    await exchange.load_markets(reload=True)
+    setattr(exchange, _LOADED_AT_ATTR, now)
+    _write_markets_file(exchange.markets, now, _api_url(exchange))
+    return exchange.markets
+
+def invalidate_markets(exchange=None):
+    """
+    Сбрасывает кэш рынков на диске и, если передан exchange, - в памяти этого экземпляра:
+    следующая загрузка пойдет на биржу.
+    """
+    if exchange is not None:
+        setattr(exchange, _LOADED_AT_ATTR, None)
+    try: os.remove(MARKETS_CACHE_FILE)
+    except FileNotFoundError: pass
+    except OSError as e: logger.warning("Не удалось удалить кэш рынков %s: %s", MARKETS_CACHE_FILE, e)
+
+def invalidate_tickers():
+    """Сбрасывает кэш тикеров."""
+    ticker_cache.invalidate()
@@ -0,0 +1,220 @@
+# metrics.py
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from aiohttp import web
+
+# --- НАСТРОЙКИ МЕТРИК ---
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108)) # 0 - HTTP-эндпоинт не запускается
+# Границы корзин гистограмм (секунды)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CYCLE_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+# -------------------------
+
+logger = logging.getLogger(__name__)
+
+def _label_key(labelnames: tuple, labels: dict) -> tuple:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Ожидались метки {labelnames}, получены {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+def _format_labels(labelnames: tuple, key: tuple, extra: str = '') -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(labelnames, key)]
+    if extra: parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+class Counter:
+    """Счетчик с метками (например, ошибки по типу исключения ccxt)."""
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> dict:
+        """{значения меток: счетчик}."""
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> list:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value:g}" for key, value in sorted(self.values().items())]
+
+class _HistogramSeries:
+    __slots__ = ('counts', 'sum', 'count', 'min', 'max')
+
+    def __init__(self, size: int):
+        self.counts = [0] * size # Последняя корзина - +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (как в Prometheus) и оценкой квантилей по корзинам."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.buckets) + 1)
+            series.counts[index] += 1
+            series.sum += value
+            series.count += 1
+            series.min = min(series.min, value)
+            series.max = max(series.max, value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Замер блока кода (в том числе с await внутри): with histogram.time(): ..."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> dict:
+        """{значения меток: (счетчики корзин, сумма, количество, минимум, максимум)}."""
+        with self._lock:
+            return {key: (list(s.counts), s.sum, s.count, s.min, s.max) for key, s in self._series.items()}
+
+    def quantile(self, q: float, counts: list, count: int, low: float = 0.0, high: float = float('inf')):
+        """
+        Оценка квантиля линейной интерполяцией внутри корзины (None, если наблюдений нет).
+        low/high - наблюдавшиеся минимум и максимум: корзина сужается до них.
+        """
+        if not count: return None
+        rank = q * count
+        cumulative = 0
+        for i, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = max(self.buckets[i - 1] if i > 0 else 0.0, low)
+                upper = min(self.buckets[i] if i < len(self.buckets) else high, high)
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return high
+
+    def render(self) -> list:
+        lines = []
+        for key, (counts, total, count, _, _) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Набор метрик процесса: текст для Prometheus (/metrics) и краткая сводка для бота."""
+
+    def __init__(self):
+        self._metrics = {}
+        self.started_at = time.time()
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        return self._add(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS, labelnames: tuple = ()) -> Histogram:
+        return self._add(Histogram(name, help_text, buckets, labelnames))
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика '{metric.name}' уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Текстовый формат экспозиции Prometheus."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        """Сводка для Telegram: квантили гистограмм и счетчики."""
+        lines = [f"📊 Метрики (аптайм {int(time.time() - self.started_at) // 60} мин.)"]
+        for metric in self._metrics.values():
+            if isinstance(metric, Histogram):
+                for key, (counts, total, count, low, high) in sorted(metric.snapshot().items()):
+                    label = f" [{', '.join(key)}]" if key else ''
+                    p50, p95 = (metric.quantile(q, counts, count, low, high) for q in (0.5, 0.95))
+                    lines.append(f"{metric.help}{label}: n={count}, ср. {total / count:.3f} с, "
+                                 f"p50 {p50:.3f} с, p95 {p95:.3f} с")
+            else:
+                values = metric.values()
+                if values:
+                    parts = ', '.join(f"{'/'.join(key) or 'всего'} ×{value:g}"
+                                      for key, value in sorted(values.items(), key=lambda kv: -kv[1]))
+                    lines.append(f"{metric.help}: {parts}")
+        if len(lines) == 1:
+            lines.append("Данных пока нет.")
+        return '\n'.join(lines)
+
+# --- Метрики конвейера сканера ---
+metrics = MetricsRegistry()
+FETCH_SECONDS = metrics.histogram('screener_fetch_seconds', "Запрос свечей символа")
+DETECTOR_SECONDS = metrics.histogram('screener_detector_seconds', "Детектор (пакет символов)", labelnames=('pattern',))
+CHART_RENDER_SECONDS = metrics.histogram('screener_chart_render_seconds', "Отрисовка графика")
+CHART_CACHE_TOTAL = metrics.counter('screener_chart_cache_total', "Кэш графиков", labelnames=('result',))
+TELEGRAM_SEND_SECONDS = metrics.histogram('screener_telegram_send_seconds', "Отправка в Telegram")
+CYCLE_SECONDS = metrics.histogram('screener_cycle_seconds', "Цикл сканирования", buckets=CYCLE_BUCKETS)
+CANDLE_LAG_SECONDS = metrics.histogram('screener_candle_close_lag_seconds', "Отставание от закрытия свечи",
+                                       buckets=CYCLE_BUCKETS)
+ERRORS_TOTAL = metrics.counter('screener_errors_total', "Ошибки", labelnames=('stage', 'error'))
+PATTERNS_TOTAL = metrics.counter('screener_patterns_total', "Найдено паттернов", labelnames=('pattern', 'timeframe'))
+
+def record_error(stage: str, error: BaseException):
+    """Учитывает ошибку по типу исключения (NetworkError, RequestTimeout, ...)."""
+    ERRORS_TOTAL.inc(stage=stage, error=type(error).__name__)
+
+# --- HTTP-эндпоинт ---
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT, registry: MetricsRegistry = metrics):
+    """
+    Запускает GET /metrics в текущем event loop. Возвращает AppRunner (остановка - await runner.cleanup())
+    или None, если эндпоинт отключен или порт занят.
+    """
+    if not port:
+        return None
+
+    async def handle_metrics(request):
+        return web.Response(text=registry.render(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logger.error("Не удалось запустить эндпоинт метрик на %s:%s: %s", host, port, e)
+        await runner.cleanup()
+        return None
+    logger.info("Метрики доступны на http://%s:%s/metrics", host, port)
+    return runner
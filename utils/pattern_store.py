@@ -0,0 +1,268 @@
+# pattern_store.py
+import argparse
+import csv
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+
+# Запуск как скрипта: python utils/pattern_store.py
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import record_error
+
+# --- НАСТРОЙКИ ХРАНИЛИЩА ПАТТЕРНОВ ---
+PATTERN_DB_FILE = os.getenv('PATTERN_DB_FILE', 'patterns.db') # SQLite в режиме WAL
+PATTERN_STORE_QUEUE_SIZE = 100000   # Записей в очереди писателя; при переполнении запись отбрасывается
+PATTERN_STORE_BATCH_SIZE = 5000     # Максимум записей в одной транзакции
+PATTERN_STORE_FLUSH_SECONDS = 1.0   # Как долго писатель копит пакет после первой записи
+PATTERN_STORE_LAST_DEFAULT = 20     # Сколько последних срабатываний отдавать по умолчанию
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S' # Формат timestamp_utc в записях паттернов
+# --------------------------------------
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patterns (
+    id        INTEGER PRIMARY KEY,
+    ts        INTEGER NOT NULL,  -- время обнаружения, мс UTC
+    symbol    TEXT    NOT NULL,
+    pattern   TEXT    NOT NULL,  -- имя детектора: brush, ladder, ...
+    timeframe TEXT    NOT NULL,
+    details   TEXT    NOT NULL   -- остальные поля записи (JSON)
+);
+CREATE INDEX IF NOT EXISTS patterns_symbol_pattern_ts ON patterns (symbol, pattern, ts);
+CREATE INDEX IF NOT EXISTS patterns_ts ON patterns (ts);
+"""
+_BASE_FIELDS = ('timestamp_utc', 'symbol', 'timeframe')
+_CLOSE = object() # Сигнал писателю: дописать очередь и завершиться
+
+def _json_default(value):
+    if isinstance(value, np.generic): return value.item()
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+def _to_ms(timestamp_utc: str) -> int:
+    moment = datetime.strptime(timestamp_utc, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+def _connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')    # Читатели не ждут писателя
+    connection.execute('PRAGMA synchronous=NORMAL')  # В WAL этого достаточно для целостности
+    return connection
+
+def _row_to_entry(row) -> dict:
+    ts, symbol, pattern, timeframe, details = row
+    timestamp_utc = datetime.fromtimestamp(ts / 1000, timezone.utc).strftime(TIMESTAMP_FORMAT)
+    return {'timestamp_utc': timestamp_utc, 'symbol': symbol, 'pattern': pattern, 'timeframe': timeframe,
+            **json.loads(details)}
+
+class PatternStore:
+    """
+    История найденных паттернов в SQLite (WAL).
+    add() только кладет записи в очередь - цикл сканирования не ждет диска; фоновый поток-писатель
+    собирает их в пакеты и пишет одной транзакцией. Запросы идут через отдельные соединения
+    на чтение и не блокируются записью. Поток и файл создаются при первом обращении.
+    """
+
+    def __init__(self, path: str = PATTERN_DB_FILE, batch_size: int = PATTERN_STORE_BATCH_SIZE,
+                 flush_seconds: float = PATTERN_STORE_FLUSH_SECONDS, queue_size: int = PATTERN_STORE_QUEUE_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(queue_size)
+        self._writer = None
+        self._start_lock = threading.Lock()
+        self._local = threading.local() # Соединение на чтение у каждого потока свое
+
+    # --- Запись ---
+    def _ensure_started(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._start_lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            directory = os.path.dirname(self.path)
+            if directory: os.makedirs(directory, exist_ok=True)
+            with _connect(self.path) as connection:
+                connection.executescript(_SCHEMA)
+            connection.close()
+            self._writer = threading.Thread(target=self._write_loop, name='pattern-store-writer', daemon=True)
+            self._writer.start()
+
+    def add(self, pattern: str, entries: list):
+        """
+        Ставит записи паттерна (словари из main.pattern_entries) в очередь на запись. Не блокирует:
+        при переполнении очереди записи отбрасываются и учитываются в self.dropped.
+        """
+        if not entries: return
+        self._ensure_started()
+        parsed_ts = {} # У записей одного цикла общее время - разбираем строку один раз
+        for entry in entries:
+            timestamp_utc = entry['timestamp_utc']
+            ts = parsed_ts.get(timestamp_utc)
+            if ts is None: ts = parsed_ts[timestamp_utc] = _to_ms(timestamp_utc)
+            details = {key: value for key, value in entry.items() if key not in _BASE_FIELDS}
+            row = (ts, entry['symbol'], pattern, entry.get('timeframe', ''), json.dumps(details, default=_json_default))
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full as e:
+                self.dropped += 1
+                record_error('pattern_store', e)
+
+    def _write_loop(self):
+        connection = _connect(self.path)
+        try:
+            while True:
+                item = self._queue.get()
+                batch, closing = [], item is _CLOSE
+                if not closing:
+                    batch.append(item)
+                    # Копим пакет: до batch_size записей или flush_seconds после первой
+                    deadline = time.monotonic() + self.flush_seconds
+                    while len(batch) < self.batch_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0: break
+                        try: item = self._queue.get(timeout=remaining)
+                        except queue.Empty: break
+                        if item is _CLOSE:
+                            closing = True
+                            break
+                        batch.append(item)
+                if batch:
+                    self._write_batch(connection, batch)
+                for _ in range(len(batch) + closing):
+                    self._queue.task_done()
+                if closing:
+                    return
+        finally:
+            connection.close()
+
+    def _write_batch(self, connection: sqlite3.Connection, batch: list):
+        try:
+            with connection:
+                connection.executemany(
+                    'INSERT INTO patterns (ts, symbol, pattern, timeframe, details) VALUES (?, ?, ?, ?, ?)', batch)
+            self.written += len(batch)
+        except sqlite3.Error as e:
+            record_error('pattern_store', e)
+            logger.error("Хранилище паттернов: не удалось записать пакет из %d записей: %s", len(batch), e)
+
+    def flush(self):
+        """Ждет, пока писатель запишет все поставленные в очередь записи."""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """Дописывает очередь и останавливает писателя (вызывается при остановке сканера)."""
+        writer = self._writer
+        if writer is not None and writer.is_alive():
+            self._queue.put(_CLOSE)
+            writer.join()
+        self._writer = None
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+        if self.dropped:
+            logger.warning("Хранилище паттернов: отброшено %d записей из-за переполнения очереди", self.dropped)
+
+    # --- Чтение ---
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            if not os.path.exists(self.path): # Ничего еще не записано
+                return None
+            connection = self._local.connection = _connect(self.path)
+        return connection
+
+    def _query(self, sql: str, params: tuple) -> list:
+        connection = self._reader()
+        if connection is None:
+            return []
+        return [_row_to_entry(row) for row in connection.execute(sql, params).fetchall()]
+
+    def last_hits(self, symbol: str, limit: int = PATTERN_STORE_LAST_DEFAULT, pattern: str = None) -> list:
+        """Последние limit срабатываний по символу (новые первыми), опционально только одного паттерна."""
+        columns = 'SELECT ts, symbol, pattern, timeframe, details FROM patterns'
+        if pattern is not None:
+            return self._query(f'{columns} WHERE symbol = ? AND pattern = ? ORDER BY ts DESC, id DESC LIMIT ?',
+                               (symbol, pattern, limit))
+        return self._query(f'{columns} WHERE symbol = ? ORDER BY ts DESC, id DESC LIMIT ?', (symbol, limit))
+
+    def hits_between(self, start_ms: int, end_ms: int, symbol: str = None, pattern: str = None, limit: int = None) -> list:
+        """Срабатывания с start_ms <= ts < end_ms (по возрастанию времени), опционально по символу и паттерну."""
+        conditions, params = ['ts >= ?', 'ts < ?'], [start_ms, end_ms]
+        if symbol is not None:
+            conditions.append('symbol = ?'); params.append(symbol)
+        if pattern is not None:
+            conditions.append('pattern = ?'); params.append(pattern)
+        sql = f"SELECT ts, symbol, pattern, timeframe, details FROM patterns WHERE {' AND '.join(conditions)} ORDER BY ts, id"
+        if limit is not None:
+            sql += ' LIMIT ?'; params.append(limit)
+        return self._query(sql, tuple(params))
+
+    def count(self) -> int:
+        connection = self._reader()
+        if connection is None:
+            return 0
+        return connection.execute('SELECT COUNT(*) FROM patterns').fetchone()[0]
+
+    # --- Перенос старых логов ---
+    def import_csv(self, filename: str, pattern: str) -> int:
+        """Переносит записи из CSV-лога прежнего формата (brush_patterns_log.csv и т.п.). Возвращает число записей."""
+        with open(filename, newline='', encoding='utf-8') as f:
+            entries = [row for row in csv.DictReader(f) if row.get('timestamp_utc') and row.get('symbol')]
+        for start in range(0, len(entries), self.batch_size):
+            # Очередь ограничена - переносим пакетами, дожидаясь записи каждого
+            self.add(pattern, entries[start:start + self.batch_size])
+            self.flush()
+        return len(entries)
+
+# --- Командная строка ---
+def _parse_time(value: str) -> int:
+    return _to_ms(value) if ' ' in value else _to_ms(value + ' 00:00:00')
+
+def main():
+    parser = argparse.ArgumentParser(description="Просмотр истории паттернов и перенос старых CSV-логов.")
+    parser.add_argument('--db', default=PATTERN_DB_FILE, help="Файл базы SQLite")
+    parser.add_argument('--symbol', help="Символ, например BTC/USDT")
+    parser.add_argument('--pattern', help="Паттерн: brush, ladder")
+    parser.add_argument('--last', type=int, default=PATTERN_STORE_LAST_DEFAULT, help="Сколько последних срабатываний символа")
+    parser.add_argument('--start', help="Начало диапазона, UTC: 'YYYY-MM-DD' или 'YYYY-MM-DD HH:MM:SS'")
+    parser.add_argument('--end', help="Конец диапазона (не включительно), UTC")
+    parser.add_argument('--import-csv', nargs=2, metavar=('CSV', 'PATTERN'), help="Перенести CSV-лог в базу")
+    args = parser.parse_args()
+
+    store = PatternStore(args.db)
+    try:
+        if args.import_csv:
+            filename, pattern = args.import_csv
+            print(f"Перенесено {store.import_csv(filename, pattern)} записей из {filename}.")
+            return
+        if args.start or args.end:
+            start_ms = _parse_time(args.start) if args.start else 0
+            end_ms = _parse_time(args.end) if args.end else int(time.time() * 1000) + 1
+            hits = store.hits_between(start_ms, end_ms, args.symbol, args.pattern)
+        elif args.symbol:
+            hits = store.last_hits(args.symbol, args.last, args.pattern)
+        else:
+            print(f"Записей в базе: {store.count()}. Укажите --symbol или --start/--end.")
+            return
+        for hit in hits:
+            print(json.dumps(hit, ensure_ascii=False))
+        print(f"Найдено: {len(hits)}")
+    finally:
+        store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+# replay.py
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Запуск как скрипта: python utils/replay.py
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detectors.registry import detector_registry
+from utils.candle_frame import CandleFrame, FRAME_COLUMNS
+from utils.candle_store import CandleStore, CANDLE_STORE_DIR
+from utils.resample import resample_frame, timeframe_to_ms
+
+# --- НАСТРОЙКИ РЕПЛЕЯ ---
+REPLAY_CHUNK_WINDOWS = 20000          # Окон в одной пакетной оценке (ограничивает память)
+REPLAY_BASE_TIMEFRAME = '1m'          # Таймфрейм, в котором лежит история в хранилище
+REPLAY_OUTPUT_CSV = 'replay_hits.csv' # Файл с найденными паттернами
+# -------------------------
+
+class ReplayStats:
+    """Счетчики прогона: символы, свечи, окна и время."""
+
+    def __init__(self):
+        self.symbols = 0
+        self.candles = 0
+        self.windows = 0
+        self.hits = 0
+        self.duration = 0.0
+
+    def add(self, other: dict):
+        for key in ('symbols', 'candles', 'windows', 'hits'):
+            setattr(self, key, getattr(self, key) + other[key])
+
+    def as_dict(self) -> dict:
+        return {'symbols': self.symbols, 'candles': self.candles, 'windows': self.windows, 'hits': self.hits,
+                'duration': round(self.duration, 3),
+                'windows_per_second': round(self.windows / self.duration) if self.duration else None}
+
+    def __str__(self):
+        rate = f"{self.windows / self.duration:,.0f}" if self.duration else "-"
+        return (f"символов {self.symbols}, свечей {self.candles}, окон {self.windows}, паттернов {self.hits}, "
+                f"время {self.duration:.2f} сек., скорость {rate} окон/сек.")
+
+def load_history(store: CandleStore, symbol: str, timeframe: str, start_ms: int = None, end_ms: int = None) -> CandleFrame:
+    """История символа из хранилища; старшие таймфреймы собираются из REPLAY_BASE_TIMEFRAME."""
+    columns = store.read(symbol, REPLAY_BASE_TIMEFRAME, start_ms, end_ms)
+    if not columns:
+        return CandleFrame.empty()
+    frame = CandleFrame(*(columns[name] for name in FRAME_COLUMNS))
+    if timeframe != REPLAY_BASE_TIMEFRAME:
+        frame = resample_frame(frame, timeframe_to_ms(timeframe), drop_partial_head=True,
+                               base_ms=timeframe_to_ms(REPLAY_BASE_TIMEFRAME))
+    return frame
+
+def replay_frame(symbol: str, frame: CandleFrame, timeframe: str, chunk_windows: int = REPLAY_CHUNK_WINDOWS):
+    """
+    Прогоняет детекторы реестра по всем окнам истории символа.
+    Окна - sliding_window_view колонок (без копирования), оцениваются пакетами по chunk_windows.
+    Возвращает (список срабатываний, счетчики).
+    """
+    window = detector_registry.max_min_candles
+    n = len(frame)
+    stats = {'symbols': 1, 'candles': n, 'windows': max(0, n - window + 1), 'hits': 0}
+    if n < window:
+        return [], stats
+    timeframe_ms = timeframe_to_ms(timeframe)
+    views = {name: sliding_window_view(np.asarray(getattr(frame, name)), window) for name in FRAME_COLUMNS}
+    timestamps = np.asarray(frame.timestamp)
+    hits = []
+    for start in range(0, stats['windows'], chunk_windows):
+        stop = min(start + chunk_windows, stats['windows'])
+        matrices = CandleFrame(*(views[name][start:stop] for name in FRAME_COLUMNS))
+        found = detector_registry.run_batch(list(range(start, stop)), matrices, timeframe_ms)
+        for offset, patterns in found.items():
+            end_ts = int(timestamps[offset + window - 1]) # Последняя свеча окна
+            for pattern, details in patterns.items():
+                hits.append({
+                    'symbol': symbol, 'timeframe': timeframe, 'pattern': pattern, 'candle_ts': end_ts,
+                    'candle_time_utc': datetime.fromtimestamp(end_ts / 1000, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+                    **{k: (v.item() if isinstance(v, np.generic) else v) for k, v in details.items()},
+                })
+    stats['hits'] = len(hits)
+    return hits, stats
+
+def _replay_symbol(root: str, symbol: str, timeframe: str, start_ms: int, end_ms: int):
+    """Задача воркера: открывает хранилище сам (memmap не пересылается между процессами)."""
+    frame = load_history(CandleStore(root), symbol, timeframe, start_ms, end_ms)
+    return replay_frame(symbol, frame, timeframe)
+
+def run_replay(root: str = CANDLE_STORE_DIR, symbols: list = None, timeframe: str = REPLAY_BASE_TIMEFRAME,
+               start_ms: int = None, end_ms: int = None, workers: int = 1):
+    """
+    Реплей по хранилищу свечей. symbols=None - все символы хранилища.
+    workers > 1 - символы распределяются по процессам.
+    Возвращает (все срабатывания по времени, ReplayStats).
+    """
+    store = CandleStore(root)
+    symbols = symbols or store.symbols(REPLAY_BASE_TIMEFRAME)
+    stats = ReplayStats()
+    hits = []
+    started = time.perf_counter()
+    if workers > 1 and len(symbols) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_replay_symbol, root, s, timeframe, start_ms, end_ms) for s in symbols]
+            for future in futures:
+                symbol_hits, symbol_stats = future.result()
+                hits.extend(symbol_hits); stats.add(symbol_stats)
+    else:
+        for symbol in symbols:
+            symbol_hits, symbol_stats = replay_frame(symbol, load_history(store, symbol, timeframe, start_ms, end_ms), timeframe)
+            hits.extend(symbol_hits); stats.add(symbol_stats)
+    stats.duration = time.perf_counter() - started
+    hits.sort(key=lambda h: (h['candle_ts'], h['symbol'], h['pattern']))
+    return hits, stats
+
+def save_hits_csv(hits: list, filename: str):
+    """Сохраняет срабатывания в CSV (колонки - объединение ключей всех паттернов)."""
+    fieldnames = []
+    for hit in hits:
+        fieldnames.extend(k for k in hit if k not in fieldnames)
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(hits)
+
+def _parse_date_ms(value: str):
+    """'2024-05-01' или '2024-05-01 12:00' (UTC) -> мс."""
+    if not value:
+        return None
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+def main():
+    parser = argparse.ArgumentParser(description="Исторический реплей детекторов паттернов по хранилищу свечей.")
+    parser.add_argument('--store', default=CANDLE_STORE_DIR, help="Папка хранилища свечей")
+    parser.add_argument('--symbols', default='', help="Символы через запятую (по умолчанию - все из хранилища)")
+    parser.add_argument('--timeframe', default=REPLAY_BASE_TIMEFRAME, help="Таймфрейм детекции (старшие собираются из 1m)")
+    parser.add_argument('--start', default='', help="Начало периода (UTC), например 2024-05-01")
+    parser.add_argument('--end', default='', help="Конец периода (UTC)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Процессов для символов")
+    parser.add_argument('--output', default=REPLAY_OUTPUT_CSV, help="CSV с найденными паттернами")
+    parser.add_argument('--stats-json', default='', help="Сохранить счетчики прогона в JSON")
+    args = parser.parse_args()
+
+    symbols = [s.strip() for s in args.symbols.split(',') if s.strip()] or None
+    hits, stats = run_replay(args.store, symbols, args.timeframe, _parse_date_ms(args.start), _parse_date_ms(args.end),
+                             args.workers)
+    print(f"Реплей завершен: {stats}")
+    by_pattern = {}
+    for hit in hits:
+        by_pattern[hit['pattern']] = by_pattern.get(hit['pattern'], 0) + 1
+    for pattern, count in sorted(by_pattern.items()):
+        print(f"  {pattern}: {count}")
+    if hits:
+        save_hits_csv(hits, args.output)
+        print(f"Срабатывания сохранены в {args.output}")
+    if args.stats_json:
+        with open(args.stats_json, 'w', encoding='utf-8') as f:
+            json.dump({**stats.as_dict(), 'timeframe': args.timeframe, 'by_pattern': by_pattern}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# resample.py
+import ccxt
+import numpy as np
+
+from utils.candle_buffer import CandleBufferStore
+from utils.candle_frame import CandleFrame, FRAME_COLUMNS, as_candle_frame
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """
+    '1m' / '15m' / '4h' / '1d' / '1w' / '1M' -> миллисекунды (разбор ccxt, месяц - 30 дней).
+    Единый разбор таймфреймов для всего проекта; неизвестная единица - ValueError.
+    """
+    try: return ccxt.Exchange.parse_timeframe(timeframe) * 1000
+    except ccxt.NotSupported as e: raise ValueError(f"Неизвестный таймфрейм: {timeframe}") from e
+
+def resample_frame(ohlcv, timeframe_ms: int, closed_before_ms: int = None,
+                   drop_partial_head: bool = False, base_ms: int = 60 * 1000) -> CandleFrame:
+    """
+    Собирает свечи старшего таймфрейма из свечей base_ms одной векторной операцией.
+    Корзины выровнены по UTC от эпохи, как у биржи (начало корзины = ts // timeframe * timeframe):
+    open - первая свеча корзины, close - последняя, high/low - экстремумы, volume - сумма.
+    closed_before_ms - оставить только корзины, закрытые к этому моменту (по умолчанию - закрытие последней свечи).
+    drop_partial_head - отбросить первую корзину, если у нее нет начальных свечей (окно обрезало ее начало).
+    """
+    frame = as_candle_frame(ohlcv).sorted_unique()
+    if not len(frame):
+        return CandleFrame.empty()
+    buckets = frame.timestamp // timeframe_ms * timeframe_ms
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.append(starts[1:], len(frame)) - 1
+    resampled = CandleFrame(
+        buckets[starts],
+        frame.open[starts],
+        np.maximum.reduceat(frame.high, starts),
+        np.minimum.reduceat(frame.low, starts),
+        frame.close[ends],
+        np.add.reduceat(frame.volume, starts),
+    )
+    if closed_before_ms is None:
+        closed_before_ms = int(frame.timestamp[-1]) + base_ms
+    keep = resampled.timestamp + timeframe_ms <= closed_before_ms
+    if drop_partial_head and frame.timestamp[0] > buckets[0]:
+        keep[0] = False
+    return resampled[keep]
+
+class ResampledBuffers:
+    """
+    Кольцевые буферы свечей старшего таймфрейма по символам, собранные из 1m без запросов к бирже.
+    Первая сборка берет историю 1m из хранилища свечей (если есть), дальше при каждом обновлении
+    пересчитываются только 1m свечи после последней закрытой корзины.
+    """
+
+    def __init__(self, timeframe: str, capacity: int, store=None, base_timeframe: str = '1m'):
+        self.timeframe = timeframe
+        self.timeframe_ms = timeframe_to_ms(timeframe)
+        self.base_timeframe = base_timeframe
+        self.base_ms = timeframe_to_ms(base_timeframe)
+        self.capacity = capacity
+        self.store = store
+        self.buffers = CandleBufferStore(capacity)
+
+    def update(self, symbol: str, base_frame, now_ms: int = None):
+        """
+        Добавляет закрытые корзины из свежих 1m свечей символа (base_frame - CandleFrame из буфера).
+        now_ms - текущее время: корзина считается закрытой, только если ее время истекло
+        (последняя 1m свеча буфера обычно еще формируется).
+        Возвращает (свечи старшего таймфрейма, появилась ли новая закрытая свеча).
+        """
+        buffer = self.buffers.get(symbol)
+        base_frame = as_candle_frame(base_frame)
+        last_ts = buffer.last_timestamp
+        if last_ts is None:
+            history = base_frame
+            if self.store is not None:
+                stored = self.store.read_tail(symbol, self.base_timeframe, self.capacity * (self.timeframe_ms // self.base_ms))
+                if len(stored):
+                    # Склеиваем историю с диска и свежий буфер (при совпадении таймстемпов побеждает буфер)
+                    history = CandleFrame(*(np.concatenate((getattr(stored, name), getattr(base_frame, name)))
+                                            for name in FRAME_COLUMNS))
+            buffer.reset(resample_frame(history, self.timeframe_ms, now_ms, drop_partial_head=True, base_ms=self.base_ms))
+        else:
+            next_bucket = last_ts + self.timeframe_ms
+            fresh = base_frame[base_frame.timestamp >= next_bucket]
+            if len(fresh):
+                # Буфер 1m начинается позже следующей корзины - ее начало вытеснено из буфера
+                # (корзина длиннее буфера), а не пропущено биржей
+                truncated = int(base_frame.timestamp[0]) > next_bucket
+                if truncated and self.store is not None:
+                    # Начало корзины берем из хранилища
+                    stored = self.store.read(symbol, self.base_timeframe, next_bucket, int(fresh.timestamp[0]) - 1)
+                    if stored:
+                        fresh = CandleFrame(*(np.concatenate((np.asarray(stored[name]), getattr(fresh, name)))
+                                              for name in FRAME_COLUMNS))
+                        truncated = False
+                # Обрезанная корзина не считается закрытой - иначе open/low/volume были бы неверны
+                buffer.merge(resample_frame(fresh, self.timeframe_ms, now_ms, drop_partial_head=truncated,
+                                            base_ms=self.base_ms))
+        return buffer.view(), buffer.last_timestamp != last_ts
+
+    def prune_idle(self, max_idle_seconds: float):
+        self.buffers.prune_idle(max_idle_seconds)
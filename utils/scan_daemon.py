@@ -0,0 +1,118 @@
+# scan_daemon.py
+import asyncio
+import time
+import logging
+from datetime import datetime, timezone
+
+# --- НАСТРОЙКИ ДЕМОНА СКАНИРОВАНИЯ ---
+SCAN_CLOSE_DELAY_SECONDS = 3         # Запуск цикла через N секунд после закрытия свечи
+UNIVERSE_REFRESH_SECONDS = 15 * 60   # Как часто обновлять список символов
+# --------------------------------------
+
+logger = logging.getLogger(__name__)
+
+class ScanDaemon:
+    """
+    Долгоживущий цикл сканирования, привязанный к закрытию свечей.
+    Цикл стартует через close_delay секунд после каждой границы интервала.
+    Если цикл не уложился в интервал, пропущенные границы не догоняются:
+    следующий цикл начинается на ближайшей границе, а буферы догружают все пропущенные свечи.
+    Список символов обновляется в отдельной задаче по своему расписанию:
+    при старте load_universe(False) может взять кэш, плановое обновление вызывает load_universe(True).
+    """
+
+    def __init__(self, scan_cycle, load_universe, on_results=None, interval: float = 60,
+                 close_delay: float = SCAN_CLOSE_DELAY_SECONDS, universe_refresh: float = UNIVERSE_REFRESH_SECONDS):
+        self.scan_cycle = scan_cycle       # async (symbols) -> результаты цикла
+        self.load_universe = load_universe # async (reload) -> список символов; reload - сбросить кэши
+        self.on_results = on_results       # async (результаты) -> None
+        self.interval = interval
+        self.close_delay = close_delay
+        self.universe_refresh = universe_refresh
+        self.symbols = []
+        self._stopped = asyncio.Event()
+        # Статистика
+        self.cycles = 0
+        self.skipped = 0            # Сколько границ пропущено из-за долгих циклов
+        self.last_duration = 0.0
+        self.last_drift = 0.0       # Опоздание старта относительно расписания (сек)
+        self.max_drift = 0.0
+        self.last_lag = 0.0         # Задержка старта относительно закрытия свечи (сек)
+        self.universe_updated_at = None
+
+    def next_run_at(self, now: float) -> float:
+        """Ближайший момент запуска (граница интервала + close_delay) строго после now."""
+        boundary = (now - self.close_delay) // self.interval * self.interval + self.interval
+        return boundary + self.close_delay
+
+    def stop(self):
+        self._stopped.set()
+
+    async def _refresh_universe(self, reload: bool = False):
+        try:
+            symbols = await self.load_universe(reload)
+        except Exception as e:
+            logger.warning("Демон: ошибка обновления списка символов: %s. Используется прежний список.", e)
+            return
+        if symbols:
+            self.symbols = list(symbols)
+            self.universe_updated_at = time.time()
+            logger.info("Демон: список символов обновлен (%d шт.).", len(self.symbols))
+        else:
+            logger.warning("Демон: получен пустой список символов. Используется прежний список.")
+
+    async def _universe_loop(self):
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.universe_refresh)
+            except asyncio.TimeoutError:
+                await self._refresh_universe(reload=True)
+
+    async def _sleep_until(self, moment: float) -> bool:
+        """Спит до момента moment (по часам UTC). Возвращает False, если демон остановлен."""
+        delay = moment - time.time()
+        if delay > 0:
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=delay)
+                return False
+            except asyncio.TimeoutError:
+                pass
+        return not self._stopped.is_set()
+
+    async def run(self):
+        """Работает до вызова stop() или отмены задачи."""
+        await self._refresh_universe()
+        universe_task = asyncio.create_task(self._universe_loop())
+        next_at = self.next_run_at(time.time())
+        try:
+            while await self._sleep_until(next_at):
+                started = time.time()
+                self.last_drift = started - next_at
+                self.max_drift = max(self.max_drift, self.last_drift)
+                self.last_lag = self.last_drift + self.close_delay
+                try:
+                    if self.symbols:
+                        results = await self.scan_cycle(self.symbols)
+                        if self.on_results is not None:
+                            await self.on_results(results)
+                    else:
+                        logger.info("Демон: список символов пуст, цикл пропущен.")
+                except Exception as e:
+                    logger.exception("Демон: ошибка в цикле сканирования: %s", e)
+                self.cycles += 1
+                self.last_duration = time.time() - started
+
+                following = self.next_run_at(time.time())
+                missed = int(round((following - next_at) / self.interval)) - 1
+                if missed > 0:
+                    self.skipped += missed
+                    logger.warning("Демон: цикл длился %.1f сек. > интервала, пропущено границ: %d.", self.last_duration, missed)
+                logger.info("Демон: цикл #%d [%s] длительность %.2f сек., опоздание старта %.2f сек., "
+                            "задержка после закрытия свечи %.2f сек.", self.cycles,
+                            datetime.now(timezone.utc).strftime('%H:%M:%S'), self.last_duration, self.last_drift,
+                            self.last_lag)
+                next_at = following
+        finally:
+            self._stopped.set()
+            universe_task.cancel()
+            await asyncio.gather(universe_task, return_exceptions=True)
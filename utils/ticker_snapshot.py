@@ -0,0 +1,170 @@
+# ticker_snapshot.py
+import asyncio
+import logging
+import time
+import numpy as np
+import ccxt # Для типов ошибок
+
+# --- НАСТРОЙКИ СНИМКА ТИКЕРОВ ---
+TICKER_CHUNK_SIZE = 100        # Размер чанка, если биржа не отдает все тикеры одним запросом
+TICKER_CHUNK_CONCURRENCY = 4   # Сколько чанков запрашивать одновременно
+TICKER_CHUNK_RETRIES = 3       # Повторы неудачного чанка
+TICKER_RETRY_BASE_DELAY = 1.0  # Базовая задержка повтора (сек), растет экспоненциально
+# ---------------------------------
+
+logger = logging.getLogger(__name__)
+
+def _to_float_array(values) -> np.ndarray:
+    """Список чисел/строк/None -> float64, некорректные значения становятся NaN."""
+    try:
+        # Обычный случай: числа, числовые строки и None (становится NaN) - одно преобразование numpy
+        return np.array(values, dtype=np.float64)
+    except (ValueError, TypeError):
+        pass
+    # Есть нечисловые значения: преобразуем целиком все, кроме них
+    values = np.array(values, dtype=object)
+    out = np.full(len(values), np.nan, dtype=np.float64)
+    valid = np.array([_is_number(v) for v in values], dtype=bool)
+    out[valid] = values[valid].astype(np.float64)
+    return out
+
+def _is_number(value) -> bool:
+    try: float(value)
+    except (ValueError, TypeError): return False
+    return True
+
+class TickerSnapshot:
+    """
+    Колоночный снимок тикеров: массивы одинаковой длины вместо словаря словарей.
+    Фильтрация выполняется одной векторной операцией по всем символам.
+    """
+    __slots__ = ('symbols', 'last', 'high', 'low', 'quote_volume', 'created_at')
+
+    def __init__(self, symbols, last, high, low, quote_volume, created_at=None):
+        self.symbols = symbols
+        self.last = last
+        self.high = high
+        self.low = low
+        self.quote_volume = quote_volume
+        self.created_at = created_at if created_at is not None else time.time()
+
+    @classmethod
+    def from_tickers(cls, tickers: dict):
+        """Строит снимок из результата ccxt fetch_tickers()."""
+        items = [(s, t) for s, t in tickers.items() if isinstance(t, dict)]
+        return cls(
+            np.array([s for s, _ in items], dtype=str),
+            _to_float_array([t.get('last') for _, t in items]),
+            _to_float_array([t.get('high') for _, t in items]),
+            _to_float_array([t.get('low') for _, t in items]),
+            _to_float_array([t.get('quoteVolume') for _, t in items]),
+        )
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def take(self, mask: np.ndarray):
+        """Новый снимок из строк по булевой маске (или индексам)."""
+        return TickerSnapshot(self.symbols[mask], self.last[mask], self.high[mask], self.low[mask],
+                              self.quote_volume[mask], self.created_at)
+
+    def filter(self, allowed_symbols=None, quote: str = None, max_price: float = None, min_quote_volume: float = 0.0):
+        """
+        Векторный фильтр: разрешенные символы, котируемая валюта, цена 0 < last < max_price,
+        24h объем в котируемой валюте не ниже min_quote_volume. Строки отсортированы по символу.
+        """
+        mask = np.isfinite(self.last) & (self.last > 0)
+        if allowed_symbols is not None:
+            mask &= np.isin(self.symbols, np.array(list(allowed_symbols), dtype=str))
+        if quote:
+            mask &= np.char.endswith(self.symbols, '/' + quote)
+        if max_price is not None:
+            mask &= self.last < max_price
+        if min_quote_volume > 0:
+            mask &= self.quote_volume >= min_quote_volume # NaN объем не проходит
+        result = self.take(mask)
+        return result.take(np.argsort(result.symbols, kind='stable'))
+
+    def to_records(self, timestamp_utc: str) -> list:
+        """Список словарей в формате filtered_symbols.csv."""
+        def num(v): return None if np.isnan(v) else float(v)
+        return [{'symbol': str(s), 'price': float(p), 'high_24h': num(h), 'low_24h': num(l),
+                 'volume_24h_quote': num(q), 'timestamp_utc': timestamp_utc}
+                for s, p, h, l, q in zip(self.symbols, self.last, self.high, self.low, self.quote_volume)]
+
+class SnapshotStats:
+    """Статистика получения одного снимка тикеров (в стиле SchedulerStats планировщика OHLCV)."""
+
+    def __init__(self):
+        self.sent = 0             # Отправлено запросов (включая повторы)
+        self.retried = 0          # Повторов неудачных чанков
+        self.dropped = 0          # Чанков, так и не полученных после всех попыток
+        self.dropped_symbols = 0  # Символов в потерянных чанках
+        self.duration = 0.0
+
+    @property
+    def complete(self) -> bool:
+        """Снимок полный: ни один чанк не потерян (только такой снимок можно кэшировать)."""
+        return self.dropped == 0
+
+    def as_dict(self) -> dict:
+        return {'sent': self.sent, 'retried': self.retried, 'dropped': self.dropped,
+                'dropped_symbols': self.dropped_symbols, 'duration_sec': round(self.duration, 2)}
+
+    def __str__(self):
+        return (f"отправлено {self.sent}, повторов {self.retried}, "
+                f"потеряно чанков {self.dropped} ({self.dropped_symbols} символов), {self.duration:.2f} сек.")
+
+async def _fetch_chunk_with_retries(exchange, chunk: list, semaphore: asyncio.Semaphore, stats: SnapshotStats) -> dict:
+    for attempt in range(TICKER_CHUNK_RETRIES + 1):
+        try:
+            async with semaphore:
+                stats.sent += 1
+                return await exchange.fetch_tickers(chunk)
+        except Exception as e: # Любая ошибка чанка (не только ccxt) не должна обрывать весь снимок
+            if isinstance(e, ccxt.BadSymbol) or attempt == TICKER_CHUNK_RETRIES:
+                stats.dropped += 1
+                stats.dropped_symbols += len(chunk)
+                logger.warning("Чанк тикеров (%d символов) не получен после %d попыток (%s: %s)",
+                               len(chunk), attempt + 1, type(e).__name__, e)
+                return {}
+            stats.retried += 1
+            await asyncio.sleep(TICKER_RETRY_BASE_DELAY * (2 ** attempt))
+    return {}
+
+async def fetch_ticker_snapshot(exchange, symbols: list = None):
+    """
+    Получает тикеры одним общим запросом (все спотовые пары), если биржа это поддерживает.
+    Иначе - параллельными чанками по TICKER_CHUNK_SIZE с повтором неудачных чанков.
+    Возвращает tuple: (TickerSnapshot, SnapshotStats); stats.complete == False, если часть чанков потеряна.
+    """
+    stats = SnapshotStats()
+    started = time.monotonic()
+    if exchange.has.get('fetchTickers'):
+        try:
+            stats.sent += 1
+            tickers = await exchange.fetch_tickers()
+            stats.duration = time.monotonic() - started
+            logger.info("Получено %d тикеров одним запросом.", len(tickers))
+            return TickerSnapshot.from_tickers(tickers), stats
+        except (ccxt.NotSupported, ccxt.ArgumentsRequired) as e:
+            logger.info("Общий запрос тикеров не поддерживается (%s). Переход на чанки.", e)
+        except Exception as e:
+            logger.warning("Ошибка общего запроса тикеров (%s: %s). Переход на чанки.", type(e).__name__, e)
+    if not symbols:
+        stats.duration = time.monotonic() - started
+        return TickerSnapshot.from_tickers({}), stats
+
+    chunks = [symbols[i:i + TICKER_CHUNK_SIZE] for i in range(0, len(symbols), TICKER_CHUNK_SIZE)]
+    logger.info("Запрос тикеров чанками: %d шт. по %d символов...", len(chunks), TICKER_CHUNK_SIZE)
+    semaphore = asyncio.Semaphore(TICKER_CHUNK_CONCURRENCY)
+    parts = await asyncio.gather(*(_fetch_chunk_with_retries(exchange, chunk, semaphore, stats) for chunk in chunks))
+    tickers = {}
+    for part in parts:
+        tickers.update(part)
+    stats.duration = time.monotonic() - started
+    if stats.complete:
+        logger.info("Получено %d тикеров чанками. Статистика: %s", len(tickers), stats)
+    else:
+        logger.warning("Снимок тикеров неполный: получено %d тикеров. Статистика: %s", len(tickers), stats)
+    return TickerSnapshot.from_tickers(tickers), stats
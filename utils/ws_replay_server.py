@@ -0,0 +1,133 @@
+# ws_replay_server.py
+# Локальная замена WebSocket MEXC: проигрывает записанные свечи для проверки потокового режима.
+# Запуск: python -m utils.ws_replay_server klines.jsonl --port 8765 --interval 0.05
+# Затем: MEXC_WS_URL=ws://127.0.0.1:8765/ws SCAN_MODE=stream python main.py
+# Как и MEXC, сервер шлет свечи бинарными protobuf-кадрами (канал spot@public.kline.v3.api.pb),
+# которые ccxt.pro декодирует через google.protobuf. Без protobuf - JSON-кадры (--format json).
+import argparse
+import asyncio
+import json
+import logging
+import time
+from aiohttp import web, WSMsgType
+
+# --- НАСТРОЙКИ ---
+REPLAY_HOST = '127.0.0.1'
+REPLAY_PORT = 8765
+REPLAY_INTERVAL_SECONDS = 0.05 # Пауза между проигрываемыми сообщениями
+REPLAY_FORMAT = 'pb'           # 'pb' - protobuf, как у MEXC; 'json' - старый JSON-формат kline.v3.api
+# -----------------
+
+logger = logging.getLogger(__name__)
+
+def protobuf_available() -> bool:
+    try:
+        from google.protobuf.json_format import ParseDict  # noqa: F401
+        from ccxt.protobuf.mexc import PushDataV3ApiWrapper_pb2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def load_records(path: str) -> list:
+    """
+    Читает записанные свечи из JSONL. Каждая строка - одна kline MEXC:
+    {"s": "BTCUSDT", "i": "Min1", "t": 1678642260, "o": ..., "h": ..., "l": ..., "c": ..., "v": ..., "a": ..., "T": ...}
+    (t/T в секундах, как в потоке MEXC). Порядок строк = порядок проигрывания.
+    """
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+def kline_message(record: dict) -> dict:
+    """Формирует JSON push-сообщение в формате spot@public.kline.v3.api."""
+    market_id, interval = record['s'], record.get('i', 'Min1')
+    kline = {k: v for k, v in record.items() if k != 's'}
+    kline['i'] = interval
+    return {
+        'c': f"spot@public.kline.v3.api@{market_id}@{interval}",
+        'd': {'k': kline, 'e': 'spot@public.kline.v3.api'},
+        's': market_id,
+        't': int(time.time() * 1000),
+    }
+
+def kline_message_pb(record: dict) -> bytes:
+    """Формирует бинарный кадр PushDataV3ApiWrapper (spot@public.kline.v3.api.pb), как его шлет MEXC."""
+    from google.protobuf.json_format import ParseDict
+    from ccxt.protobuf.mexc import PushDataV3ApiWrapper_pb2
+    market_id, interval = record['s'], record.get('i', 'Min1')
+    message = {
+        'channel': f"spot@public.kline.v3.api.pb@{market_id}@{interval}",
+        'symbol': market_id,
+        'createTime': str(int(time.time() * 1000)),
+        'publicSpotKline': {
+            'interval': interval,
+            'windowStart': str(record['t']),
+            'openingPrice': str(record['o']),
+            'closingPrice': str(record['c']),
+            'highestPrice': str(record['h']),
+            'lowestPrice': str(record['l']),
+            'volume': str(record['v']),
+            'amount': str(record.get('a', 0)),
+            'windowEnd': str(record.get('T', record['t'] + 60)),
+        },
+    }
+    return ParseDict(message, PushDataV3ApiWrapper_pb2.PushDataV3ApiWrapper()).SerializeToString()
+
+def create_app(records: list, interval: float = REPLAY_INTERVAL_SECONDS, message_format: str = REPLAY_FORMAT) -> web.Application:
+    if message_format == 'pb' and not protobuf_available():
+        logger.warning("Replay-сервер: protobuf не установлен - свечи отправляются в JSON.")
+        message_format = 'json'
+
+    async def handle_ws(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        subscribed = set() # (market_id, interval)
+        started = asyncio.Event()
+
+        async def replay():
+            await started.wait()
+            for record in records:
+                if ws.closed: return
+                if (record['s'], record.get('i', 'Min1')) in subscribed:
+                    if message_format == 'pb': await ws.send_bytes(kline_message_pb(record))
+                    else: await ws.send_json(kline_message(record))
+                    await asyncio.sleep(interval)
+
+        replay_task = asyncio.create_task(replay())
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT: continue
+                data = json.loads(msg.data)
+                method = data.get('method', '').upper()
+                if method == 'PING':
+                    await ws.send_json({'id': 0, 'code': 0, 'msg': 'PONG'})
+                elif method == 'SUBSCRIPTION':
+                    for channel in data.get('params', []):
+                        # spot@public.kline.v3.api.pb@BTCUSDT@Min1
+                        parts = channel.split('@')
+                        if len(parts) == 4 and parts[1].startswith('public.kline'):
+                            subscribed.add((parts[2], parts[3]))
+                        await ws.send_json({'id': data.get('id', 0), 'code': 0, 'msg': channel})
+                    # Даем клиенту подписаться на все символы соединения до начала проигрывания
+                    asyncio.get_running_loop().call_later(0.5, started.set)
+        finally:
+            replay_task.cancel()
+        return ws
+
+    app = web.Application()
+    app.router.add_get('/ws', handle_ws)
+    return app
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Локальный replay-сервер свечей MEXC (WebSocket)')
+    parser.add_argument('records', help='JSONL-файл с записанными klines')
+    parser.add_argument('--host', default=REPLAY_HOST)
+    parser.add_argument('--port', type=int, default=REPLAY_PORT)
+    parser.add_argument('--interval', type=float, default=REPLAY_INTERVAL_SECONDS)
+    parser.add_argument('--format', choices=('pb', 'json'), default=REPLAY_FORMAT, help='Формат кадров свечей')
+    args = parser.parse_args()
+    web.run_app(create_app(load_records(args.records), args.interval, args.format), host=args.host, port=args.port)